@@ -10,6 +10,9 @@ sys.path.insert(0, "/usr/lib/entropy/client")
 sys.path.insert(0, "../lib")
 sys.path.insert(0, "../client")
 
+import solo.startup
+solo.startup.enable_from_argv(sys.argv)
+
 from solo.main import main
 sys.argv[0] = "equo"
 main()
@@ -8,6 +8,10 @@
 
     B{Entropy Command Line Client}.
 
+    Command modules are not imported here, they register their
+    SoloCommandDescriptor when imported through load_command()
+    (only the dispatched command) or load_all_commands().
+
 """
 import os
 import sys
@@ -15,17 +19,112 @@ import sys
 _cur_file = sys.modules[__name__].__file__
 _cur_dir = os.path.dirname(_cur_file)
 _excluded_mods = ["descriptor"]
-for py_file in os.listdir(_cur_dir):
-    if not py_file.endswith(".py"):
-        continue
-    if py_file.startswith("_"):
-        continue
-    # strip .py
-    _mod = "solo.commands." + py_file[:-3]
-    if _mod in _excluded_mods:
-        continue
+
+# Map command names and aliases to the module implementing them.
+# This must be kept in sync with the NAME and ALIASES attributes
+# of the SoloCommand subclasses. Commands not listed here are still
+# available through load_all_commands().
+COMMAND_MODULES = {
+    "cache": "cache",
+    "cleanup": "cleanup",
+    "conf": "conf",
+    "config": "config",
+    "daemon": "daemon",
+    "deptest": "deptest",
+    "dt": "deptest",
+    "download": "download",
+    "fetch": "download",
+    "help": "help",
+    "-h": "help",
+    "--help": "help",
+    "hop": "hop",
+    "install": "install",
+    "i": "install",
+    "libtest": "libtest",
+    "lt": "libtest",
+    "mask": "mask",
+    "unmask": "mask",
+    "match": "match",
+    "m": "match",
+    "moo": "moo",
+    "lxnay": "moo",
+    "notice": "notice",
+    "pkg": "pkg",
+    "smart": "pkg",
+    "query": "query",
+    "q": "query",
+    "remove": "remove",
+    "rm": "remove",
+    "repo": "repo",
+    "rescue": "rescue",
+    "search": "search",
+    "s": "search",
+    "security": "security",
+    "sec": "security",
+    "source": "source",
+    "src": "source",
+    "status": "status",
+    "st": "status",
+    "--info": "status",
+    "ugc": "ugc",
+    "unusedpackages": "unused",
+    "unused": "unused",
+    "update": "update",
+    "up": "update",
+    "upgrade": "upgrade",
+    "u": "upgrade",
+    "version": "version",
+    "--version": "version",
+    "yell": "yell",
+}
+
+# Module containing the catch-all (fallback) command.
+CATCH_ALL_MODULE = "help"
+
+
+def _import_command_module(mod_name):
+    """
+    Import the given solo.commands module, registering its commands.
+    """
+    _mod = "solo.commands." + mod_name
     try:
         __import__(_mod)
     except ValueError:
         # garbage
-        continue
+        return False
+    return True
+
+
+def load_command(name):
+    """
+    Import the module implementing the given command name or alias.
+    If the command is not known, all the command modules are loaded.
+
+    @param name: command name or alias
+    @type name: string
+    @return: True, if the command module has been found
+    @rtype: bool
+    """
+    mod_name = COMMAND_MODULES.get(name)
+    if mod_name is None:
+        load_all_commands()
+        return False
+    return _import_command_module(mod_name)
+
+
+def load_all_commands():
+    """
+    Import all the available command modules. This is required
+    by those commands listing the available ones (help, bash
+    completion).
+    """
+    for py_file in os.listdir(_cur_dir):
+        if not py_file.endswith(".py"):
+            continue
+        if py_file.startswith("_"):
+            continue
+        # strip .py
+        _mod = py_file[:-3]
+        if _mod in _excluded_mods:
+            continue
+        _import_command_module(_mod)
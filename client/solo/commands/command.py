@@ -19,13 +19,15 @@ from entropy.const import const_convert_to_unicode, \
 from entropy.output import darkgreen, teal, purple, print_error, \
     print_generic, bold, brown
 from entropy.exceptions import PermissionDenied
-from entropy.client.interfaces import Client
+from entropy.client.services.query import QueryClient, QueryServiceError
 from entropy.core.settings.base import SystemSettings
 
 import entropy.tools
 
 from solo.utils import enlightenatom
 
+import solo.startup as startup
+
 
 def _fix_argparse_print_help():
     """
@@ -51,6 +53,39 @@ def _fix_argparse_print_help():
 _fix_argparse_print_help()
 
 
+class _OutputBuffer(object):
+    """
+    Buffer the data written to the given stream object until flush_all()
+    is called. Everything else (fileno(), isatty(), encoding) is taken
+    from the stream, so that output formatting does not change.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(data)
+
+    def writelines(self, lines):
+        self._chunks.extend(lines)
+
+    def flush(self):
+        pass
+
+    def flush_all(self):
+        """
+        Write the buffered data to the stream.
+        """
+        for chunk in self._chunks:
+            self._stream.write(chunk)
+        del self._chunks[:]
+        self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
 class SoloCommand(object):
     """
     Base class for Solo commands
@@ -70,6 +105,10 @@ class SoloCommand(object):
     # If True, the command is not shown in the help output
     HIDDEN = False
 
+    # Entropy Query Server socket timeout (in seconds), the server may be
+    # waiting for the Entropy Resources Lock held by another process
+    QUERY_SERVER_TIMEOUT = 10.0
+
     # These two class variables are used in the man page
     # generation. You also need to override man()
     INTRODUCTION = "No introduction available"
@@ -285,7 +324,11 @@ class SoloCommand(object):
         Return the Entropy Client object.
         This method is not thread safe.
         """
-        return Client(*args, **kwargs)
+        # imported here, commands served by the Entropy Query
+        # Server do not need to pay the Client import cost.
+        from entropy.client.interfaces import Client
+        with startup.section("Client initialization"):
+            return Client(*args, **kwargs)
 
     def _entropy_bashcomp(self):
         """
@@ -295,6 +338,7 @@ class SoloCommand(object):
         Entropy object loaded by _entropy() at the cost
         of less consistency checks.
         """
+        from entropy.client.interfaces import Client
         return Client(indexing=False, repo_validation=False)
 
     def _entropy_ws(self, entropy_client, repository_id, tx_cb=False):
@@ -394,6 +438,41 @@ class SoloCommand(object):
                 if acquired:
                     entropy.tools.release_entropy_locks(client)
 
+    def _call_forwarded(self, func):
+        """
+        Execute the given read-only function at func through the
+        Entropy Query Server, if running, passing a QueryClient
+        object in place of the Entropy Client. If the server is not
+        running, fails or times out, fall back to _call_unlocked().
+        The output of func is buffered until it completes, so that
+        nothing is printed twice when falling back.
+        The signature of func is: int func(entropy_client).
+        """
+        query_client = QueryClient.connect(
+            timeout=self.QUERY_SERVER_TIMEOUT)
+        if query_client is None:
+            return self._call_unlocked(func)
+
+        startup.mark("forwarded to query server")
+        stdout = sys.stdout
+        output_buffer = _OutputBuffer(stdout)
+        sys.stdout = output_buffer
+        try:
+            try:
+                exit_st = func(query_client)
+            finally:
+                sys.stdout = stdout
+                query_client.close()
+        except QueryServiceError as err:
+            # socket timeouts are reported as QueryServiceError as well
+            print_error("%s: %s" % (
+                    _("Entropy Query Server error, running locally"),
+                    err,))
+            return self._call_unlocked(func)
+
+        output_buffer.flush_all()
+        return exit_st
+
     def _settings(self):
         """
         Return a SystemSettings instance.
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Command Line Client}.
+
+"""
+import signal
+import sys
+import argparse
+
+from entropy.i18n import _
+from entropy.output import blue, brown, darkgreen, darkred, print_error, \
+    print_generic
+from entropy.exceptions import PermissionDenied
+from entropy.client.services.query import QueryServer, QueryClient
+
+from solo.commands.descriptor import SoloCommandDescriptor
+from solo.commands.command import SoloCommand
+
+class SoloDaemon(SoloCommand):
+    """
+    Main Solo Daemon command.
+    """
+
+    NAME = "daemon"
+    ALIASES = []
+    ALLOW_UNPRIVILEGED = False
+
+    INTRODUCTION = """\
+Manage the Entropy Query Server, a local daemon keeping repositories
+and caches loaded in memory in order to serve read-only queries
+(like *equo match --quiet* and *equo search --quiet*) faster.
+If the daemon is not running, commands are executed in-process.
+"""
+    SEE_ALSO = "equo-match(1), equo-search(1)"
+
+    def __init__(self, args):
+        SoloCommand.__init__(self, args)
+        self._nsargs = None
+        self._commands = []
+
+    def man(self):
+        """
+        Overridden from SoloCommand.
+        """
+        return self._man()
+
+    def _get_parser(self):
+        """
+        Overridden from SoloCommand.
+        """
+        _commands = []
+
+        descriptor = SoloCommandDescriptor.obtain_descriptor(
+            SoloDaemon.NAME)
+        parser = argparse.ArgumentParser(
+            description=descriptor.get_description(),
+            formatter_class=argparse.RawDescriptionHelpFormatter,
+            prog="%s %s" % (sys.argv[0], SoloDaemon.NAME))
+
+        subparsers = parser.add_subparsers(
+            title="action", description=_("manage the query server"),
+            help=_("available commands"))
+
+        run_parser = subparsers.add_parser(
+            "run", help=_("run the query server in foreground"))
+        run_parser.set_defaults(func=self._run)
+        _commands.append("run")
+
+        status_parser = subparsers.add_parser(
+            "status", help=_("show whether the query server is running"))
+        status_parser.set_defaults(func=self._status)
+        _commands.append("status")
+
+        self._commands = _commands
+        return parser
+
+    def parse(self):
+        """
+        Parse command
+        """
+        parser = self._get_parser()
+        try:
+            nsargs = parser.parse_args(self._args)
+        except IOError as err:
+            sys.stderr.write("%s\n" % (err,))
+            return parser.print_help, []
+
+        # Python 3.3 bug #16308
+        if not hasattr(nsargs, "func"):
+            return parser.print_help, []
+
+        self._nsargs = nsargs
+        return nsargs.func, []
+
+    def bashcomp(self, last_arg):
+        """
+        Overridden from SoloCommand.
+        """
+        outcome = []
+        try:
+            command = self._args[0]
+        except IndexError:
+            command = None
+
+        if not self._args or command not in self._commands:
+            # return all the commands anyway
+            # last_arg will filter them
+            outcome += ["run", "status"]
+
+        return self._bashcomp(sys.stdout, last_arg, outcome)
+
+    def _run(self):
+        """
+        Solo Daemon Run command. Entropy Resources locks are acquired
+        in shared mode for each served request, not here.
+        """
+        try:
+            entropy_client = self._entropy()
+        except PermissionDenied as err:
+            print_error(err.value)
+            return 1
+
+        def _sigterm(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, _sigterm)
+
+        server = QueryServer(entropy_client)
+        entropy_client.output(
+            darkgreen(_("Entropy Query Server started")),
+            level="info", header=brown(" @@ "))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            entropy_client.shutdown()
+        return 0
+
+    def _status(self):
+        """
+        Solo Daemon Status command.
+        """
+        client = QueryClient.connect()
+        running = client is not None and client.ping()
+        if client is not None:
+            client.close()
+
+        if running:
+            client_msg = darkgreen(_("Entropy Query Server is running"))
+        else:
+            client_msg = darkred(_("Entropy Query Server is not running"))
+        print_generic("%s %s" % (blue(" @@"), client_msg,))
+        if running:
+            return 0
+        return 1
+
+
+SoloCommandDescriptor.register(
+    SoloCommandDescriptor(
+        SoloDaemon,
+        SoloDaemon.NAME,
+        _("manage the read-only query server"))
+    )
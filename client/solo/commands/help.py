@@ -15,6 +15,7 @@ from entropy.i18n import _
 from entropy.output import teal, purple, darkgreen
 
 from solo.colorful import ColorfulFormatter
+from solo.commands import load_all_commands
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.commands.command import SoloCommand
 
@@ -39,6 +40,7 @@ class SoloHelp(SoloCommand):
         """
         import sys
 
+        load_all_commands()
         descriptors = SoloCommandDescriptor.obtain()
         descriptors.sort(key = lambda x: x.get_name())
         outcome = []
@@ -75,7 +77,11 @@ class SoloHelp(SoloCommand):
         parser.add_argument(
             "--color", action="store_true",
             default=None, help=_("force colored output"))
+        parser.add_argument(
+            "--startup-profile", action="store_true",
+            default=None, help=_("print startup timing information"))
 
+        load_all_commands()
         descriptors = SoloCommandDescriptor.obtain()
         descriptors.sort(key = lambda x: x.get_name())
         group = parser.add_argument_group("command", "available commands")
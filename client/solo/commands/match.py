@@ -155,6 +155,10 @@ Match package names.
         self._showdesc = nsargs.showdesc
         self._showslot = nsargs.showslot
 
+        if self._quiet:
+            # quiet output only needs package metadata that the
+            # Entropy Query Server can provide, if running
+            return self._call_forwarded, [self.match]
         return self._call_unlocked, [self.match]
 
     def _match_string(self, entropy_client, string):
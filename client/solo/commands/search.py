@@ -102,6 +102,10 @@ Search for packages.
         self._installed = nsargs.installed
         self._available = nsargs.available
         self._packages = nsargs.string
+        if self._quiet:
+            # quiet output only needs package metadata that the
+            # Entropy Query Server can provide, if running
+            return self._call_forwarded, [self.search]
         return self._call_unlocked, [self.search]
 
     def bashcomp(self, last_arg):
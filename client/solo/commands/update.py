@@ -41,6 +41,7 @@ Update Entropy Repositories.
     def __init__(self, args):
         SoloCommand.__init__(self, args)
         self._force = False
+        self._parallel = False
         self._repositories = []
 
     def man(self):
@@ -65,6 +66,9 @@ Update Entropy Repositories.
         parser.add_argument("--force", action="store_true",
                             default=self._force,
                             help=_("force update"))
+        parser.add_argument("--parallel", action="store_true",
+                            default=self._parallel,
+                            help=_("update repositories in parallel"))
 
         return parser
 
@@ -80,6 +84,7 @@ Update Entropy Repositories.
             return parser.print_help, []
 
         self._force = nsargs.force
+        self._parallel = nsargs.parallel
         self._repositories += nsargs.repo
 
         return self._call_locked, [self._update]
@@ -92,7 +97,7 @@ Update Entropy Repositories.
 
         entropy_client = self._entropy_bashcomp()
         repos = entropy_client.repositories()
-        outcome = ["--force"] + repos
+        outcome = ["--force", "--parallel"] + repos
         return self._bashcomp(sys.stdout, last_arg, outcome)
 
     def _update(self, entropy_client):
@@ -222,7 +227,7 @@ Update Entropy Repositories.
         repo_conf = settings.get_setting_files_data()['repositories']
         try:
             repo_intf = entropy_client.Repositories(
-                repos, force=self._force)
+                repos, force=self._force, parallel=self._parallel)
         except AttributeError:
             entropy_client.output(
                 "%s%s %s" % (
@@ -25,9 +25,12 @@ from entropy.exceptions import SystemDatabaseError, OnlineMirrorError, \
 
 import entropy.tools
 
+from solo.commands import load_command, CATCH_ALL_MODULE
 from solo.commands.descriptor import SoloCommandDescriptor
 from solo.utils import read_client_release
 
+import solo.startup as startup
+
 def handle_exception(exc_class, exc_instance, exc_tb):
 
     # restore original exception handler, to avoid loops
@@ -248,6 +251,8 @@ def warn_live_system():
 
 def main():
 
+    startup.mark("main() entered")
+
     is_color = "--color" in sys.argv
     if is_color:
         sys.argv.remove("--color")
@@ -259,17 +264,6 @@ def main():
 
     install_exception_handler()
 
-    descriptors = SoloCommandDescriptor.obtain()
-    args_map = {}
-    catch_all = None
-    for descriptor in descriptors:
-        klass = descriptor.get_class()
-        if klass.CATCH_ALL:
-            catch_all = klass
-        args_map[klass.NAME] = klass
-        for alias in klass.ALIASES:
-            args_map[alias] = klass
-
     args = sys.argv[1:]
     # convert args to unicode, to avoid passing
     # raw string stuff down to entropy layers
@@ -299,6 +293,25 @@ def main():
         last_arg = args[-1]
         cmd = args[0]
         args = args[1:]
+
+    # only import the command modules that are actually needed
+    with startup.section("commands loading"):
+        if cmd is not None:
+            load_command(cmd)
+        load_command(CATCH_ALL_MODULE)
+        load_command("yell")
+
+    descriptors = SoloCommandDescriptor.obtain()
+    args_map = {}
+    catch_all = None
+    for descriptor in descriptors:
+        klass = descriptor.get_class()
+        if klass.CATCH_ALL:
+            catch_all = klass
+        args_map[klass.NAME] = klass
+        for alias in klass.ALIASES:
+            args_map[alias] = klass
+
     cmd_class = args_map.get(cmd)
     yell_class = args_map.get("yell")
 
@@ -329,7 +342,9 @@ def main():
                 warn_live_system()
 
         func, func_args = cmd_obj.parse()
+        startup.mark("command dispatched")
         exit_st = func(*func_args)
+        startup.mark("command executed")
         if exit_st == -10:
             # syntax error, yell at user
             func, func_args = yell_class(args).parse()
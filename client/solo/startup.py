@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Command Line Client}.
+    Startup time profiler, enabled through equo --startup-profile.
+
+    This module must not import anything from Entropy, since it is
+    loaded before any other module in order to account for their
+    import time.
+
+"""
+import atexit
+import os
+import sys
+import threading
+import time
+
+try:
+    import __builtin__ as builtins
+except ImportError:
+    import builtins
+
+ARGV_SWITCH = "--startup-profile"
+
+# Only modules whose name starts with these prefixes
+# are shown in the import time breakdown.
+_TRACKED_PREFIXES = ("entropy", "solo", "portage", "_entropy")
+
+_enabled = False
+_start_time = None
+_marks = []
+_imports = {}
+_import_stack = []
+_original_import = None
+
+
+def _timed_import(name, *args, **kwargs):
+    """
+    builtins.__import__ replacement recording per-module import
+    time, both cumulative and exclusive of nested imports.
+    """
+    # other threads may import concurrently, do not account them
+    if threading.current_thread().name != "MainThread":
+        return _original_import(name, *args, **kwargs)
+
+    first = name not in sys.modules
+    frame = [0.0]
+    _import_stack.append(frame)
+    t_start = time.time()
+    try:
+        return _original_import(name, *args, **kwargs)
+    finally:
+        elapsed = time.time() - t_start
+        _import_stack.pop()
+        if _import_stack:
+            _import_stack[-1][0] += elapsed
+        if first and name in sys.modules and name not in _imports:
+            _imports[name] = (elapsed, elapsed - frame[0])
+
+
+def is_enabled():
+    """
+    Return whether the startup profiler is enabled.
+    """
+    return _enabled
+
+
+def enable():
+    """
+    Enable the startup profiler. The report is written to stderr
+    at process exit.
+    """
+    global _enabled, _start_time, _original_import
+    if _enabled:
+        return
+    _enabled = True
+    _start_time = time.time()
+    _original_import = builtins.__import__
+    builtins.__import__ = _timed_import
+    atexit.register(report)
+
+
+def enable_from_argv(argv):
+    """
+    Enable the startup profiler if ARGV_SWITCH is in argv.
+    The switch is removed from argv.
+
+    @param argv: list of arguments (usually sys.argv)
+    @type argv: list
+    @return: True, if the profiler has been enabled
+    @rtype: bool
+    """
+    if ARGV_SWITCH not in argv:
+        return False
+    while ARGV_SWITCH in argv:
+        argv.remove(ARGV_SWITCH)
+    enable()
+    return True
+
+
+def mark(label):
+    """
+    Record a startup milestone.
+
+    @param label: milestone description
+    @type label: string
+    """
+    if not _enabled:
+        return
+    _marks.append((label, time.time()))
+
+
+class section(object):
+    """
+    Context manager recording the start and end milestones
+    of a startup phase.
+    """
+
+    def __init__(self, label):
+        self._label = label
+
+    def __enter__(self):
+        mark("%s (begin)" % (self._label,))
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        mark("%s (end)" % (self._label,))
+
+
+def report(stream = None, limit = 30):
+    """
+    Write the startup timing breakdown to the given stream.
+
+    @keyword stream: output stream, default is sys.stderr
+    @type stream: file object
+    @keyword limit: maximum number of modules to show
+    @type limit: int
+    """
+    if not _enabled:
+        return
+    if stream is None:
+        stream = sys.stderr
+
+    end_time = time.time()
+    write = stream.write
+
+    write("\n== startup profile (pid %d) ==\n" % (os.getpid(),))
+    write("total: %8.1f ms\n" % ((end_time - _start_time) * 1000,))
+
+    write("\n-- milestones --\n")
+    last_time = _start_time
+    for label, mark_time in _marks:
+        write("%8.1f ms  (+%7.1f ms)  %s\n" % (
+                (mark_time - _start_time) * 1000,
+                (mark_time - last_time) * 1000,
+                label))
+        last_time = mark_time
+
+    tracked = [(name, data) for name, data in _imports.items() \
+                   if name.startswith(_TRACKED_PREFIXES)]
+    other_self = sum(data[1] for name, data in _imports.items() \
+                         if not name.startswith(_TRACKED_PREFIXES))
+
+    write("\n-- imports (cumulative / self) --\n")
+    tracked.sort(key = lambda x: x[1][1], reverse = True)
+    for name, (cumulative, self_time) in tracked[:limit]:
+        write("%8.1f ms / %7.1f ms  %s\n" % (
+                cumulative * 1000, self_time * 1000, name))
+    write("%8s      %7.1f ms  %s\n" % (
+            "", other_self * 1000, "<other modules>"))
+    stream.flush()
@@ -50,6 +50,7 @@ class CacheMixin:
             # no data is written while holding self._cacher by the balls
             # drop all the buffers then remove on-disk data
             self._cacher.discard()
+            self._clear_dependency_memo()
             # clear repositories live cache
             if self._installed_repository is not None:
                 self._installed_repository.clearCache()
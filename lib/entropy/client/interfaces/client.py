@@ -14,7 +14,6 @@ import codecs
 import threading
 
 from entropy.core import Singleton
-from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
 from entropy.output import TextInterface, bold, red, darkred, blue
 from entropy.client.interfaces.loaders import LoadersMixin
 from entropy.client.interfaces.cache import CacheMixin
@@ -744,6 +743,8 @@ class Client(Singleton, TextInterface, LoadersMixin, CacheMixin,
         self._repodb_cache = {}
         self._repodb_cache_mutex = threading.RLock()
         self._memory_db_instances = {}
+        self._dependency_memo = {}
+        self._dependency_memo_generation_id = None
         self._installed_repository = None
         self._treeupdates_repos = set()
         self._can_run_sys_set_hooks = False
@@ -769,10 +770,13 @@ class Client(Singleton, TextInterface, LoadersMixin, CacheMixin,
 
         self._multiple_url_fetcher = multiple_url_fetcher
         self._url_fetcher = url_fetcher
-        if url_fetcher is None:
-            self._url_fetcher = UrlFetcher
-        if multiple_url_fetcher is None:
-            self._multiple_url_fetcher = MultipleUrlFetcher
+        if url_fetcher is None or multiple_url_fetcher is None:
+            # imported here, not needed at module import time
+            from entropy.fetchers import UrlFetcher, MultipleUrlFetcher
+            if url_fetcher is None:
+                self._url_fetcher = UrlFetcher
+            if multiple_url_fetcher is None:
+                self._multiple_url_fetcher = MultipleUrlFetcher
 
         self._cacher = EntropyCacher()
 
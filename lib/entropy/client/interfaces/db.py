@@ -13,7 +13,6 @@ import codecs
 import errno
 import os
 import shutil
-import subprocess
 import sys
 import threading
 import time
@@ -29,17 +28,12 @@ from entropy.cache import EntropyCacher
 from entropy.db import EntropyRepository
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     PermissionDenied
-from entropy.security import Repository as RepositorySecurity
 from entropy.misc import TimeScheduled, ParallelTask
-from entropy.fetchers import UrlFetcher
 from entropy.i18n import _
 from entropy.db.skel import EntropyRepositoryPlugin, EntropyRepositoryBase
 from entropy.db.exceptions import IntegrityError, OperationalError, Error, \
     DatabaseError
 from entropy.core.settings.base import SystemSettings
-from entropy.services.client import WebService
-from entropy.client.services.interfaces import RepositoryWebService, \
-    RepositoryWebServiceFactory
 
 import entropy.dep
 import entropy.tools
@@ -149,18 +143,48 @@ class InstalledPackagesRepository(CachedRepository):
             formatted_content = formattedContent)
 
 
+class _WebServiceSyncAbort(Exception):
+    """
+    Raised to abort the Web Service differential sync, status is the
+    value __handle_webserv_database_sync() returns.
+    """
+
+    def __init__(self, status):
+        Exception.__init__(self, status)
+        self.status = status
+
+
+class _FetchErrors(object):
+    """
+    Class-level descriptor computing the UrlFetcher error codes on first
+    access, so that entropy.fetchers is not loaded at import time.
+    """
+
+    _errors = None
+
+    def __get__(self, instance, owner):
+        if self._errors is None:
+            from entropy.fetchers import UrlFetcher
+            _FetchErrors._errors = (
+                UrlFetcher.GENERIC_FETCH_WARN,
+                UrlFetcher.TIMEOUT_FETCH_ERROR,
+                UrlFetcher.GENERIC_FETCH_ERROR)
+        return self._errors
+
+
 class AvailablePackagesRepositoryUpdater(object):
 
     """
     AvailablePackagesRepository update logic class.
     The required logic for updating a repository is stored here.
     """
-    WEBSERV_CACHE_ID = 'webserv_repo/segment_'
+    # minimum amount of added packages accepted by the differential
+    # sync, see __handle_webserv_database_sync()
+    WEBSERV_SYNC_THRESHOLD = 500
 
-    FETCH_ERRORS = (
-        UrlFetcher.GENERIC_FETCH_WARN,
-        UrlFetcher.TIMEOUT_FETCH_ERROR,
-        UrlFetcher.GENERIC_FETCH_ERROR)
+    # fetchers, security and web services modules are imported
+    # lazily, they are only needed when updating repositories
+    FETCH_ERRORS = _FetchErrors()
 
     def __init__(self, entropy_client, repository_id, force, gpg):
         self.__force = force
@@ -174,7 +198,7 @@ class AvailablePackagesRepositoryUpdater(object):
         self._supported_download_items = (
             "db", "dbck", "dblight", "ck", "cklight", "compck",
             "lock", "dbdump", "dbdumplight", "dbdumplightck", "dbdumpck",
-            "meta_file", "meta_file_gpg", "notice_board"
+            "meta_file", "meta_file_gpg", "notice_board", "dbdeltaindex"
         )
         self._developer_repo = \
             self._settings['repositories']['developer_repo']
@@ -209,6 +233,8 @@ class AvailablePackagesRepositoryUpdater(object):
             else:
                 # in case self._entropy is a simple TextInterface()
                 # like how it's called in remote_revision().
+                from entropy.client.services.interfaces import \
+                    RepositoryWebServiceFactory
                 self.__webservices = RepositoryWebServiceFactory(self._entropy)
                 # cross fingers!
 
@@ -222,6 +248,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return self.__webservice
 
     def __get_webserv_repository_metadata(self):
+        from entropy.services.client import WebService
         try:
             data = self._webservice.get_repository_metadata()
         except WebService.WebServiceException as err:
@@ -231,6 +258,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return data
 
     def __get_webserv_repository_revision(self):
+        from entropy.services.client import WebService
         try:
             revision = self._webservice.get_revision()
         except WebService.WebServiceException as err:
@@ -240,6 +268,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return revision
 
     def __check_webserv_availability(self):
+        from entropy.services.client import WebService
         try:
             webserv = self._webservices.new(self._repository_id)
         except WebService.UnsupportedService:
@@ -269,6 +298,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return dbconn
 
     def __get_webserv_database_differences(self, webserv, package_ids):
+        from entropy.services.client import WebService
 
         try:
             remote_package_ids = webserv.get_package_ids()
@@ -317,18 +347,29 @@ class AvailablePackagesRepositoryUpdater(object):
             level = "info",
             header = "\t"
         )
+        def _progress(read_size, dump_size):
+            mytxt = "%s: %s%%" % (
+                red(_("Injecting downloaded dump")),
+                darkgreen(str(int(read_size * 100 / max(dump_size, 1)))),
+            )
+            self._entropy.output(
+                mytxt,
+                importance = 0,
+                level = "info",
+                header = "\t",
+                back = True
+            )
+
         dbconn = self._entropy.open_generic_repository(dbfile,
             xcache = False, indexing_override = False)
-        rc = dbconn.importRepository(dumpfile, dbfile)
+        rc = dbconn.importRepository(dumpfile, dbfile,
+            data = {'progress': _progress})
         dbconn.close()
         return rc
 
     def __get_repo_eapi(self):
 
         eapi_env = os.getenv("FORCE_EAPI")
-        sqlite3_access = os.path.lexists("/usr/bin/sqlite3")
-        sqlite3_rc = subprocess.call("/usr/bin/sqlite3 -version > /dev/null",
-            shell = True)
         try:
             eapi_env_clear = int(eapi_env)
             if eapi_env_clear not in self._supported_apis:
@@ -340,11 +381,8 @@ class AvailablePackagesRepositoryUpdater(object):
         eapi_avail = self.__check_webserv_availability()
         if eapi_avail:
             repo_eapi = 3
-        else:
-            if not sqlite3_access or entropy.tools.islive():
-                repo_eapi = 1
-            elif sqlite3_rc != 0:
-                repo_eapi = 1
+        elif entropy.tools.islive():
+            repo_eapi = 1
 
         # if differential update is disabled and FORCE_EAPI is not overriding
         # we cannot use EAPI=3
@@ -599,15 +637,11 @@ class AvailablePackagesRepositoryUpdater(object):
 
             down_item = "dbdumplight"
 
-            down_status = self._download_item(
-                uri, down_item, cmethod,
-                disallow_redirect = True)
-            if down_status:
-                # get GPG file if available
-                sig_status = self._download_item(
-                    uri, down_item, cmethod,
-                    disallow_redirect = True,
-                    get_signature = True)
+            # get GPG file if available, together with the dump
+            down_status, sig_status = self._download_items(
+                uri, [(down_item, False), (down_item, True)],
+                cmethod = cmethod)
+            sig_status = down_status and sig_status
 
             downloaded_item = down_item
 
@@ -621,14 +655,10 @@ class AvailablePackagesRepositoryUpdater(object):
                 const_debug_write(__name__,
                     "__handle_database_download: developer repo mode enabled")
 
-            down_status = self._download_item(
-                uri, down_item, cmethod,
-                disallow_redirect = True)
-            if down_status:
-                sig_status = self._download_item(
-                    uri, down_item, cmethod,
-                    disallow_redirect = True,
-                    get_signature = True)
+            down_status, sig_status = self._download_items(
+                uri, [(down_item, False), (down_item, True)],
+                cmethod = cmethod)
+            sig_status = down_status and sig_status
 
             downloaded_item = down_item
 
@@ -848,8 +878,11 @@ class AvailablePackagesRepositoryUpdater(object):
 
     def __database_indexing(self):
 
-        # renice a bit, to avoid eating resources
-        old_prio = const_set_nice_level(15)
+        # renice a bit, to avoid eating resources. The nice level is per
+        # process, parallel updates are reniced once by their caller.
+        renice = not getattr(self._entropy, "parallel_update", False)
+        if renice:
+            old_prio = const_set_nice_level(15)
         mytxt = red("%s ...") % (_("Indexing Repository metadata"),)
         self._entropy.output(
             mytxt,
@@ -865,7 +898,8 @@ class AvailablePackagesRepositoryUpdater(object):
                 self._entropy.installed_repository().createAllIndexes()
             except (DatabaseError, OperationalError, IntegrityError,):
                 pass
-        const_set_nice_level(old_prio)
+        if renice:
+            const_set_nice_level(old_prio)
 
     def _construct_paths(self, uri, item, cmethod, get_signature = False):
         """
@@ -892,6 +926,7 @@ class AvailablePackagesRepositoryUpdater(object):
         meta_file = etpConst['etpdatabasemetafilesfile']
         meta_file_gpg = etpConst['etpdatabasemetafilesfile'] + \
             etpConst['etpgpgextension']
+        delta_index_file = etpConst['etpdatabasedeltaindexfile']
         md5_ext = etpConst['packagesmd5fileext']
         ec_cm2 = None
         ec_cm3 = None
@@ -968,6 +1003,10 @@ class AvailablePackagesRepositoryUpdater(object):
                 "%s/%s" % (uri, meta_file_gpg,),
                 "%s/%s" % (repo_dbpath, meta_file_gpg,),
             ),
+            'dbdeltaindex': (
+                "%s/%s" % (uri, delta_index_file,),
+                "%s/%s" % (repo_dbpath, delta_index_file,),
+            ),
         }
 
         url, path = mymap.get(item)
@@ -982,7 +1021,62 @@ class AvailablePackagesRepositoryUpdater(object):
 
         url, filepath = self._construct_paths(
             uri, item, cmethod, get_signature = get_signature)
+        return self._download_url(url, filepath,
+            disallow_redirect = disallow_redirect)
+
+    def _download_items(self, uri, items, cmethod = None):
+        """
+        Download the given supported resource items concurrently.
+
+        @param uri: repository mirror URI
+        @type uri: string
+        @param items: list of (item, get_signature) tuples
+        @type items: list
+        @keyword cmethod: compression method, if items need it
+        @type cmethod: tuple
+        @return: list of download statuses, in the same order of items
+        @rtype: list
+        """
+        from entropy.fetchers import UrlFetcher
+
+        url_path_list = []
+        paths = []
+        for item, get_signature in items:
+            url, filepath = self._construct_paths(
+                uri, item, cmethod, get_signature = get_signature)
+            temp_filepath = self.__setup_download_path(filepath)
+            url_path_list.append((url, temp_filepath))
+            paths.append((filepath, temp_filepath))
+
+        try:
+            # items are already announced by the callers
+            fetcher = self._entropy._multiple_url_fetcher(
+                url_path_list, resume = False, disallow_redirect = True,
+                url_fetcher_class = self._entropy._url_fetcher,
+                show_files_info = False)
+            fetch_data = fetcher.download()
+
+            statuses = []
+            for th_id, (filepath, temp_filepath) in enumerate(paths, 1):
+                rc = fetch_data.get(th_id, UrlFetcher.GENERIC_FETCH_ERROR)
+                statuses.append(
+                    self.__commit_download(rc, filepath, temp_filepath))
+            return statuses
+
+        finally:
+            for filepath, temp_filepath in paths:
+                # cleanup temp file
+                try:
+                    os.remove(temp_filepath)
+                except (OSError, IOError) as err:
+                    if err.errno != errno.ENOENT:
+                        raise
 
+    def __setup_download_path(self, filepath):
+        """
+        Prepare the download of filepath, returning the temporary path
+        the file has to be downloaded to.
+        """
         # See bug #3495, download the file to
         # a temporary location and then move it
         # if we are successful
@@ -1002,6 +1096,31 @@ class AvailablePackagesRepositoryUpdater(object):
             const_setup_perms(filepath_dir, etpConst['entropygid'],
                 f_perms = 0o644)
 
+        return temp_filepath
+
+    def __commit_download(self, rc, filepath, temp_filepath):
+        """
+        Move a downloaded file into place, given the fetcher return code.
+        """
+        if rc in self.FETCH_ERRORS:
+            return False
+        try:
+            os.rename(temp_filepath, filepath)
+        except (OSError, IOError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+            return False # not downloaded?
+
+        const_setup_file(filepath, etpConst['entropygid'], 0o644,
+            uid = etpConst['uid'])
+        return True
+
+    def _download_url(self, url, filepath, disallow_redirect = True):
+        """
+        Download the given URL to filepath, the file is moved into place
+        only if the download succeeded.
+        """
+        temp_filepath = self.__setup_download_path(filepath)
         try:
 
             fetcher = self._entropy._url_fetcher(
@@ -1012,18 +1131,7 @@ class AvailablePackagesRepositoryUpdater(object):
             )
 
             rc = fetcher.download()
-            if rc in self.FETCH_ERRORS:
-                return False
-            try:
-                os.rename(temp_filepath, filepath)
-            except (OSError, IOError) as err:
-                if err.errno != errno.ENOENT:
-                    raise
-                return False # not downloaded?
-
-            const_setup_file(filepath, etpConst['entropygid'], 0o644,
-                uid = etpConst['uid'])
-            return True
+            return self.__commit_download(rc, filepath, temp_filepath)
 
         finally:
             # cleanup temp file
@@ -1122,10 +1230,15 @@ class AvailablePackagesRepositoryUpdater(object):
 
         downloaded_files = []
 
+        # fetch them all at once, then check and unpack
         for item, myfile, ignorable, mytxt in download_items:
-
             my_show_info(mytxt)
-            mystatus = self._download_item(uri, item, disallow_redirect = True)
+        statuses = self._download_items(
+            uri, [(x[0], False) for x in download_items])
+
+        for (item, myfile, ignorable, mytxt), mystatus in zip(
+                download_items, statuses):
+
             mytype = 'info'
             myurl, mypath = self._construct_paths(uri, item, None)
 
@@ -1233,6 +1346,182 @@ class AvailablePackagesRepositoryUpdater(object):
 
         return downloaded_files
 
+    def __repository_delta_chain(self, index_path, from_revision,
+                                 to_revision):
+        """
+        Read the repository delta index and return the list of deltas
+        leading from from_revision to to_revision, or None if the
+        chain is broken.
+        """
+        deltas = {}
+        enc = etpConst['conf_encoding']
+        with codecs.open(index_path, "r", encoding=enc) as index_f:
+            for line in index_f.readlines():
+                entry = line.strip().split()
+                if len(entry) != 6:
+                    continue
+                from_rev, to_rev, cformat, delta_name, md5, checksum = entry
+                try:
+                    from_rev, to_rev = int(from_rev), int(to_rev)
+                except ValueError:
+                    continue
+                if os.path.basename(delta_name) != delta_name:
+                    continue # avoid lamerz
+                if cformat not in etpConst['etpdatabasecompressclasses']:
+                    continue
+                deltas[from_rev] = (from_rev, to_rev, cformat,
+                    delta_name, md5, checksum)
+
+        chain = []
+        revision = from_revision
+        while revision != to_revision:
+            delta = deltas.get(revision)
+            if delta is None:
+                return None
+            if delta[1] <= revision or delta[1] > to_revision:
+                return None
+            chain.append(delta)
+            revision = delta[1]
+        return chain
+
+    def _repository_delta_update(self, uri, revision, dbfile):
+        """
+        Update the local repository by applying the chain of deltas
+        published by the server, from the local revision to the remote
+        one. The outcome is verified against the repository data checksum
+        stored in the delta index.
+
+        @param uri: repository mirror URI
+        @type uri: string
+        @param revision: remote repository revision
+        @type revision: int
+        @param dbfile: local repository database file path
+        @type dbfile: string
+        @return: tuple composed by the update status, a bool telling
+            whether the repository publishes deltas and the list of
+            downloaded files
+        @rtype: tuple
+        """
+        local_revision = AvailablePackagesRepository.revision(
+            self._repository_id)
+        if local_revision < 1 or local_revision >= revision:
+            return False, False, []
+        if not const_file_readable(dbfile):
+            return False, False, []
+
+        down_status = self._download_item(
+            uri, "dbdeltaindex", disallow_redirect = True)
+        if not down_status:
+            return False, False, []
+
+        garbage, index_path = self._construct_paths(
+            uri, "dbdeltaindex", None)
+        downloaded_files = [index_path]
+        sig_status = self._download_item(
+            uri, "dbdeltaindex", disallow_redirect = True,
+            get_signature = True)
+        if sig_status:
+            downloaded_files.append(
+                self.__append_gpg_signature_to_path(index_path))
+
+        chain = self.__repository_delta_chain(
+            index_path, local_revision, revision)
+        if not chain:
+            mytxt = "%s: %s" % (
+                red(_("Repository deltas")),
+                darkred(_("not available, downloading the repository")),
+            )
+            self._entropy.output(
+                mytxt,
+                importance = 0,
+                level = "info",
+                header = "\t"
+            )
+            return False, True, downloaded_files
+
+        repo_dir = os.path.dirname(dbfile)
+        delta_dbfile = dbfile + ".delta"
+        delta_paths = []
+        updated = False
+        try:
+            shutil.copy2(dbfile, delta_dbfile)
+            dbconn = self._entropy.open_generic_repository(
+                delta_dbfile, xcache = False, indexing_override = False)
+            try:
+                for from_rev, to_rev, cformat, delta_name, md5, \
+                        checksum in chain:
+
+                    mytxt = "%s %s -> %s %s" % (
+                        red(_("Applying repository delta")),
+                        darkgreen(str(from_rev)),
+                        darkgreen(str(to_rev)),
+                        red("..."),
+                    )
+                    self._entropy.output(
+                        mytxt,
+                        importance = 0,
+                        level = "info",
+                        header = "\t",
+                        back = True
+                    )
+
+                    delta_path = os.path.join(repo_dir, delta_name)
+                    delta_paths.append(delta_path)
+                    down_status = self._download_url(
+                        uri + "/" + delta_name, delta_path,
+                        disallow_redirect = True)
+                    if not down_status:
+                        break
+                    if not entropy.tools.compare_md5(delta_path, md5):
+                        break
+
+                    opener = etpConst['etpdatabasecompressclasses'][
+                        cformat][0]
+                    delta_f = opener(delta_path, "rb")
+                    try:
+                        dbconn.importRepositoryDelta(delta_f)
+                    finally:
+                        delta_f.close()
+
+                else:
+                    updated = dbconn.dataChecksum() == chain[-1][5]
+
+            except (OperationalError, IntegrityError, DatabaseError,
+                    IOError, EOFError) as err:
+                const_debug_write(__name__,
+                    "_repository_delta_update: error: %s" % (err,))
+                updated = False
+            finally:
+                dbconn.close()
+
+            if updated:
+                os.rename(delta_dbfile, dbfile)
+
+        finally:
+            for path in [delta_dbfile] + delta_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+
+        if updated:
+            mytxt = "%s: %s" % (
+                red(_("Repository deltas applied")),
+                bold(_("OK")),
+            )
+        else:
+            mytxt = "%s: %s" % (
+                red(_("Repository deltas cannot be applied")),
+                darkred(_("downloading the repository")),
+            )
+        self._entropy.output(
+            mytxt,
+            importance = 1,
+            level = "info",
+            header = "\t"
+        )
+        return updated, True, downloaded_files
+
     def _check_downloaded_database(self, uri, cmethod):
 
         dbitem = "dblight"
@@ -1303,6 +1592,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return 0
 
     def _install_gpg_key_if_available(self):
+        from entropy.security import Repository as RepositorySecurity
 
         my_repos = self._settings['repositories']
         avail_data = my_repos['available']
@@ -1504,6 +1794,7 @@ class AvailablePackagesRepositoryUpdater(object):
         return True
 
     def _gpg_verify_downloaded_files(self, downloaded_files):
+        from entropy.security import Repository as RepositorySecurity
 
         try:
             repo_sec = self._entropy.RepositorySecurity()
@@ -1597,6 +1888,8 @@ class AvailablePackagesRepositoryUpdater(object):
         return False
 
     def __handle_webserv_database_sync(self, mydbconn):
+        from entropy.services.client import WebService
+        from entropy.client.services.interfaces import RepositoryWebService
 
         try:
             webserv = self._webservice
@@ -1617,8 +1910,11 @@ class AvailablePackagesRepositoryUpdater(object):
             # nothing to sync, it seems, if force is True, fallback to EAPI2
             return False
 
-        threshold = 100
-        # is it worth it?
+        # is it worth it? package metadata is streamed into the
+        # repository, so the differential sync is convenient as long
+        # as it is not a sizeable part of the repository.
+        threshold = max(self.WEBSERV_SYNC_THRESHOLD,
+                        len(myidpackages) // 4)
         if len(added_ids) > threshold:
             mytxt = "%s: %s (%s: %s/%s)" % (
                 blue(_("Web Service")),
@@ -1635,127 +1931,6 @@ class AvailablePackagesRepositoryUpdater(object):
             )
             return False
 
-        count = 0
-        chunk_size = RepositoryWebService.MAXIMUM_PACKAGE_REQUEST_SIZE
-        added_segments = []
-        mytmp = []
-
-        for package_id in added_ids:
-            count += 1
-            mytmp.append(package_id)
-            if count % chunk_size == 0:
-                added_segments.append(mytmp[:])
-                del mytmp[:]
-        if mytmp:
-            added_segments.append(mytmp[:])
-
-        def _do_fetch(fetch_sts_map, segment, count, maxcount):
-            try:
-                try:
-                    pkg_meta = webserv.get_packages_metadata(segment)
-                except WebService.WebServiceException as err:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: error: %s" % (err,))
-                    mytxt = "%s: %s" % (
-                        blue(_("Web Service communication error")),
-                        err,
-                    )
-                    self._entropy.output(
-                        mytxt, importance = 1, level = "info",
-                        header = "\t", count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-                except KeyboardInterrupt:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: keyboard interrupt")
-                    fetch_sts_map['error'] = True
-                    return
-
-                if not pkg_meta:
-                    const_debug_write(__name__,
-                        "__handle_webserv_database_sync: empty data: %s" % (
-                            pkg_meta,))
-                    self._entropy.output(
-                        _("Web Service data error"), importance = 1,
-                        level = "info", header = "\t",
-                        count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-
-                try:
-                    for package_id, pkg_data in pkg_meta.items():
-                        dumpobj(
-                            "%s%s" % (self.WEBSERV_CACHE_ID, package_id,),
-                            pkg_data,
-                            ignore_exceptions = False
-                        )
-                except (IOError, EOFError, OSError,) as e:
-                    mytxt = "%s: %s: %s." % (
-                        blue(_("Local status")),
-                        darkred("Error storing data"),
-                        e,
-                    )
-                    self._entropy.output(
-                        mytxt, importance = 1, level = "info",
-                        header = "\t", count = (count, maxcount,)
-                    )
-                    fetch_sts_map['error'] = True
-                    return
-
-                return
-            finally:
-                fetch_sts_map['sem'].release()
-
-        # do not exagerate or you're going to need a way to block
-        # further requests as long as some threads are still running
-        # to avoid timeout errors
-        max_threads = 4
-        fetch_sts_map = {
-            'sem': threading.Semaphore(max_threads),
-            'error': False,
-        }
-
-        # fetch and store
-        count = 0
-        maxcount = len(added_segments)
-        product = self._settings['repositories']['product']
-        segment = None
-        threads = []
-        for segment in added_segments:
-            count += 1
-            mytxt = "%s %s" % (blue(_("Fetching segments")), "...",)
-            self._entropy.output(
-                mytxt, importance = 0, level = "info",
-                header = "\t", back = True, count = (count, maxcount,)
-            )
-            fetch_sts_map['sem'].acquire()
-            if len(threads) >= max_threads:
-                const_debug_write(__name__,
-                    purple("joining all the parallel threads"))
-                # give them the chance to complete
-                # since long delays on socket could cause timeouts
-                for th in threads:
-                    th.join()
-                const_debug_write(__name__, purple("parallel threads joined"))
-                del threads[:]
-            if fetch_sts_map['error']:
-                return None
-            th = ParallelTask(_do_fetch, fetch_sts_map, segment, count,
-                maxcount)
-            th.daemon = True
-            th.start()
-            threads.append(th)
-
-        for th in threads:
-            th.join()
-
-        if fetch_sts_map['error']:
-            return None
-
-        del added_segments
-
         # get repository metadata
         repo_metadata = self.__get_webserv_repository_metadata()
         # this gives us the "checksum" data too
@@ -1779,6 +1954,7 @@ class AvailablePackagesRepositoryUpdater(object):
             mydbconn.bumpTreeUpdatesActions(
                 repo_metadata['treeupdates_actions'])
         except (Error,):
+            mydbconn.rollback()
             mytxt = "%s: %s" % (
                 blue(_("Web Service status")),
                 darkred(_("cannot update treeupdates data")),
@@ -1796,6 +1972,7 @@ class AvailablePackagesRepositoryUpdater(object):
             mydbconn.clearPackageSets()
             mydbconn.insertPackageSets(repo_metadata['sets'])
         except (Error,):
+            mydbconn.rollback()
             mytxt = "%s: %s" % (
                 blue(_("Web Service status")),
                 darkred(_("cannot update package sets data")),
@@ -1808,44 +1985,135 @@ class AvailablePackagesRepositoryUpdater(object):
             )
             return None
 
-        # now that we have all stored, add
-        for idpackage in added_ids:
-            mydata = self._cacher.pop("%s%s" % (self.WEBSERV_CACHE_ID,
-                idpackage,))
-            if mydata is None:
-                mytxt = "%s: %s" % (
-                    blue(_("Fetch error on segment while adding")),
-                    darkred(str(segment)),
-                )
+        chunk_size = RepositoryWebService.MAXIMUM_PACKAGE_REQUEST_SIZE
+        added_segments = [added_ids[x:x + chunk_size] for x in \
+                              range(0, len(added_ids), chunk_size)]
+
+        def _do_fetch(fetch_sts_map, segment):
+            pkg_meta = None
+            try:
+                if not fetch_sts_map['stop']:
+                    pkg_meta = webserv.get_packages_metadata(segment)
+            except WebService.WebServiceException as err:
+                const_debug_write(__name__,
+                    "__handle_webserv_database_sync: error: %s" % (err,))
+                fetch_sts_map['error'] = err
+            except KeyboardInterrupt:
+                const_debug_write(__name__,
+                    "__handle_webserv_database_sync: keyboard interrupt")
+            finally:
+                with fetch_sts_map['lock']:
+                    fetch_sts_map['fetched'].append((segment, pkg_meta))
+                fetch_sts_map['ready'].release()
+
+        # do not exagerate or you're going to need a way to block
+        # further requests as long as some threads are still running
+        # to avoid timeout errors. Segments are added to the repository
+        # as soon as they are fetched, while the next ones are fetched,
+        # at most max_threads segments are kept in memory.
+        max_threads = 4
+        fetch_sts_map = {
+            'lock': threading.Lock(),
+            'ready': threading.Semaphore(0),
+            'fetched': [],
+            'error': None,
+            'stop': False,
+        }
+        pending_segments = added_segments[:]
+
+        def _fetch_next():
+            if not pending_segments:
+                return
+            th = ParallelTask(_do_fetch, fetch_sts_map,
+                pending_segments.pop(0))
+            th.daemon = True
+            th.start()
+
+        def _fetched_packages():
+            maxcount = len(added_segments)
+            for count in range(1, maxcount + 1):
+                mytxt = "%s %s" % (blue(_("Fetching segments")), "...",)
                 self._entropy.output(
-                    mytxt, importance = 1, level = "warning",
-                    header = "  "
+                    mytxt, importance = 0, level = "info",
+                    header = "\t", back = True, count = (count, maxcount,)
                 )
-                return False
+                fetch_sts_map['ready'].acquire()
+                with fetch_sts_map['lock']:
+                    segment, pkg_meta = fetch_sts_map['fetched'].pop(0)
+                _fetch_next()
 
-            mytxt = "%s %s" % (
-                darkgreen("++"),
-                teal(mydata['atom']),
+                if fetch_sts_map['error'] is not None:
+                    mytxt = "%s: %s" % (
+                        blue(_("Web Service communication error")),
+                        fetch_sts_map['error'],
+                    )
+                    self._entropy.output(
+                        mytxt, importance = 1, level = "info",
+                        header = "\t", count = (count, maxcount,)
+                    )
+                    raise _WebServiceSyncAbort(None)
+
+                if not pkg_meta:
+                    const_debug_write(__name__,
+                        "__handle_webserv_database_sync: empty data: %s" % (
+                            pkg_meta,))
+                    self._entropy.output(
+                        _("Web Service data error"), importance = 1,
+                        level = "info", header = "\t",
+                        count = (count, maxcount,)
+                    )
+                    raise _WebServiceSyncAbort(None)
+
+                for package_id in segment:
+                    mydata = pkg_meta.get(package_id)
+                    if mydata is None:
+                        mytxt = "%s: %s" % (
+                            blue(_("Fetch error on segment while adding")),
+                            darkred(str(segment)),
+                        )
+                        self._entropy.output(
+                            mytxt, importance = 1, level = "warning",
+                            header = "  "
+                        )
+                        raise _WebServiceSyncAbort(False)
+
+                    mytxt = "%s %s" % (
+                        darkgreen("++"),
+                        teal(mydata['atom']),
+                    )
+                    self._entropy.output(
+                        mytxt, importance = 0, level = "info",
+                        header = "  ")
+                    yield package_id, mydata
+
+        for th_count in range(max_threads):
+            _fetch_next()
+
+        # fetch and add, in a single transaction. Packages of every
+        # fetched segment go through a single bulk insertion, so that
+        # indexes are rebuilt just once.
+        try:
+            mydbconn.addPackagesBulk(_fetched_packages(),
+                formatted_content = True)
+        except _WebServiceSyncAbort as err:
+            mydbconn.rollback()
+            return err.status
+        except (Error,) as err:
+            mydbconn.rollback()
+            if const_debug_enabled():
+                entropy.tools.print_traceback()
+            self._entropy.output("%s: %s" % (
+                blue(_("repository error while adding packages")),
+                err,),
+                importance = 1, level = "warning",
+                header = "  "
             )
-            self._entropy.output(
-                mytxt, importance = 0, level = "info",
-                header = "  ")
-            try:
-                mydbconn.addPackage(
-                    mydata, revision = mydata['revision'],
-                    package_id = idpackage,
-                    formatted_content = True
-                )
-            except (Error,) as err:
-                if const_debug_enabled():
-                    entropy.tools.print_traceback()
-                self._entropy.output("%s: %s" % (
-                    blue(_("repository error while adding packages")),
-                    err,),
-                    importance = 1, level = "warning",
-                    header = "  "
-                )
-                return False
+            return False
+        finally:
+            # on errors, tell the fetchers still around to stop
+            # and do not start new ones.
+            fetch_sts_map['stop'] = True
+            del pending_segments[:]
 
         # now remove
         # preload atoms names to improve speed during removePackage
@@ -1862,6 +2130,7 @@ class AvailablePackagesRepositoryUpdater(object):
             try:
                 mydbconn.removePackage(idpackage)
             except (Error,):
+                mydbconn.rollback()
                 self._entropy.output(
                     blue(_("repository error while removing packages")),
                     importance = 1, level = "warning",
@@ -1979,6 +2248,52 @@ class AvailablePackagesRepositoryUpdater(object):
 
         return rev
 
+    def _remote_cformat(self, uri, cformat):
+        """
+        Return the compression format the repository should be downloaded
+        with, picking the preferred one among those published at the given
+        uri. If the list is not available (older servers), the configured
+        cformat is returned.
+        """
+        sep = const_convert_to_unicode("/")
+        url = uri + sep + etpConst['etpdatabasecformatsfile']
+
+        tmp_fd, tmp_path = None, None
+        published = []
+        try:
+            tmp_fd, tmp_path = const_mkstemp(
+                prefix = "AvailableEntropyRepository.remote_cformat")
+            fetcher = self._entropy._url_fetcher(
+                url, tmp_path, resume = False)
+            fetch_rc = fetcher.download()
+            if fetch_rc not in self.FETCH_ERRORS:
+                with codecs.open(tmp_path, "r") as tmp_f:
+                    published = [x.strip() for x in tmp_f.readlines()]
+        except (IOError, OSError):
+            # ignore any errors, especially read ones
+            pass
+        finally:
+            if tmp_fd is not None:
+                try:
+                    os.close(tmp_fd)
+                except OSError:
+                    pass
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+        if cformat not in published:
+            # no list, or the configured format is not published
+            # anyway, keep the configured one
+            return cformat
+        supported = etpConst['etpdatabasecompressclasses']
+        for pref_cformat in etpConst['etpdatabasecformatspreference']:
+            if pref_cformat in published and pref_cformat in supported:
+                return pref_cformat
+        return cformat
+
     def update(self):
 
         # disallow unprivileged update
@@ -2021,6 +2336,9 @@ class AvailablePackagesRepositoryUpdater(object):
             )
             return EntropyRepositoryBase.REPOSITORY_NOT_AVAILABLE
 
+        # only pay the extra request when actually downloading
+        cformat = self._remote_cformat(uri, cformat)
+
         # clear database interface cache belonging to this repository
         self._ensure_repository_path()
 
@@ -2043,6 +2361,8 @@ class AvailablePackagesRepositoryUpdater(object):
         cmethod = etpConst['etpdatabasecompressclasses'].get(
             cformat)
 
+        delta_updated = False
+        delta_files = []
         while True:
 
             downloaded_db_item = None
@@ -2050,6 +2370,17 @@ class AvailablePackagesRepositoryUpdater(object):
             db_checksum_down_status = False
             if self._repo_eapi < 3:
 
+                if not self.__force:
+                    delta_updated, delta_available, delta_files = \
+                        self._repository_delta_update(uri, revision, dbfile)
+                    if delta_updated:
+                        break
+                    if delta_available:
+                        # keep an exact copy of the published repository,
+                        # aligning the old one would break the next
+                        # delta chain.
+                        do_db_update_transfer = None
+
                 down_status, sig_down_status, downloaded_db_item = \
                     self.__database_download(uri, cmethod)
                 if not down_status:
@@ -2082,6 +2413,7 @@ class AvailablePackagesRepositoryUpdater(object):
                 break
 
         downloaded_files = self._standard_items_download(uri)
+        downloaded_files.extend(delta_files)
         # also add db file to downloaded item
         # and md5 check repository
         if downloaded_db_item is not None:
@@ -2115,7 +2447,7 @@ class AvailablePackagesRepositoryUpdater(object):
 
         # Now we can unpack
         files_to_remove = []
-        if self._repo_eapi in (1, 2,):
+        if self._repo_eapi in (1, 2,) and not delta_updated:
 
             # if do_db_update_transfer == False and not None
             if (do_db_update_transfer is not None) and not \
@@ -18,7 +18,7 @@ from entropy.const import etpConst, const_debug_write, const_isstring, \
     const_debug_enabled, const_file_readable
 from entropy.exceptions import RepositoryError, SystemDatabaseError, \
     DependenciesNotFound, DependenciesNotRemovable, DependenciesCollision
-from entropy.graph import Graph
+from entropy.graph import IndexedGraph
 from entropy.misc import Lifo
 from entropy.cache import EntropyCacher
 from entropy.output import bold, darkgreen, darkred, blue, purple, teal, brown
@@ -1143,11 +1143,111 @@ class CalculatorsMixin:
 
     DISABLE_AUTOCONFLICT = os.getenv("ETP_DISABLE_AUTOCONFLICT")
 
-    def __generate_dependency_tree_analyze_deplist(self, pkg_match, repo_db,
-        stack, graph, deps_not_found, conflicts, unsat_cache, relaxed_deps,
-        build_deps, deep_deps, empty_deps, recursive, selected_matches,
-        elements_cache, selected_matches_cache):
+    DEPENDENCY_MEMO_SIZE = 50000
+
+    def _dependency_memo_generation(self):
+        """
+        Return a hash describing the state the dependency memoization map
+        (see _get_dependency_memo()) depends on: installed packages,
+        available repositories and package masking settings.
+
+        @return: the generation hash, or None if the state cannot be
+            described (the installed packages repository has no checksum)
+        @rtype: string
+        """
+        inst_checksum = self._installed_repository.checksum()
+        if inst_checksum is None:
+            return None
+
+        sys_settings = self._settings
+        cl_settings = sys_settings[self.sys_settings_client_plugin_id]
+        ignore_spm_downgrades = cl_settings['misc']['ignore_spm_downgrades']
+
+        # package masking settings, on-disk and live
+        masking = []
+        setting_files = sys_settings.get_setting_files_data()
+        for setting_id in ("keywords", "unmask", "mask", "license_mask",
+                           "license_accept", "system_mask"):
+            setting_file = setting_files.get(setting_id)
+            try:
+                mtime = os.path.getmtime(setting_file)
+            except (OSError, IOError, TypeError):
+                mtime = 0.0
+            masking.append((setting_id, mtime))
+
+        setting_dirs = sys_settings.get_setting_dirs_data()
+        for setting_id in ("mask_d", "unmask_d", "license_mask_d",
+                           "license_accept_d", "system_mask_d"):
+            setting_data = setting_dirs.get(setting_id)
+            if setting_data is None:
+                continue
+            for conf_file, _mtime_file in setting_data[1]:
+                try:
+                    mtime = os.path.getmtime(conf_file)
+                except (OSError, IOError):
+                    mtime = 0.0
+                masking.append((conf_file, mtime))
+
+        live_masking = sys_settings['live_packagemasking']
+        c_hash = "%s|%s|%s|%s|%s|%s|%s|%s|v1" % (
+            inst_checksum,
+            self._all_repositories_hash(),
+            self._enabled_repos,
+            sys_settings['repositories']['branch'],
+            ignore_spm_downgrades,
+            masking,
+            sorted(live_masking['mask_matches']),
+            sorted(live_masking['unmask_matches']),
+        )
+        sha = hashlib.sha1()
+        sha.update(const_convert_to_rawstring(repr(c_hash)))
+        return sha.hexdigest()
+
+    def _get_dependency_memo(self):
+        """
+        Return the in-memory map used to memoize the dependency list
+        analysis of single package matches across dependency tree
+        calculations (get_install_queue() and friends). The map is
+        emptied when installed packages, repositories or masking
+        settings change, so that keys are just package matches and
+        dependency calculation flags. If the state cannot be described,
+        nothing is memoized and a new, empty, map is returned.
+
+        @return: the dependency memoization map
+        @rtype: dict
+        """
+        generation = self._dependency_memo_generation()
+        if generation is None:
+            self._clear_dependency_memo()
+            return {}
+        memo = self._dependency_memo
+        if generation != self._dependency_memo_generation_id or \
+                len(memo) > self.DEPENDENCY_MEMO_SIZE:
+            memo.clear()
+            self._dependency_memo_generation_id = generation
+        return memo
+
+    def _clear_dependency_memo(self):
+        """
+        Clear the in-memory dependency memoization map.
+        """
+        self._dependency_memo.clear()
+        self._dependency_memo_generation_id = None
 
+    def __generate_dependency_tree_expand_deplist(self, pkg_match, repo_db,
+        unsat_cache, relaxed_deps, build_deps, deep_deps, empty_deps,
+        selected_matches, selected_matches_cache):
+        """
+        Expand the dependency list of the given package match. This is
+        the part of the dependency list analysis that does not depend on
+        the graph being built.
+
+        @return: tuple composed by (conflict dependency strings, dependency
+            matches, dependencies not found, post dependency strings,
+            memoizable), where memoizable is True if the outcome does
+            not depend on selected_matches.
+        @rtype: tuple
+        """
         pkg_id, repo_id = pkg_match
         # exclude build dependencies
         excluded_deptypes = [etpConst['dependency_type_ids']['pdepend_id']]
@@ -1158,6 +1258,16 @@ class CalculatorsMixin:
             exclude_deptypes = excluded_deptypes,
             resolve_conditional_deps = False)
 
+        # conditional and or dependencies are resolved against
+        # selected_matches, the outcome cannot be reused.
+        or_dep_question = etpConst['entropyordepquestion']
+        memoizable = True
+        for dependency in myundeps:
+            if dependency.startswith("(") or \
+                    dependency.endswith(or_dep_question):
+                memoizable = False
+                break
+
         # this solves some conditional dependencies using selected_matches.
         # also expands all the conditional dependencies using
         # entropy.dep.expand_dependencies()
@@ -1179,14 +1289,7 @@ class CalculatorsMixin:
         auto_conflicts = self._generate_dependency_inverse_conflicts(
             pkg_match)
         my_conflicts |= auto_conflicts
-
-        # check conflicts
-        if my_conflicts:
-            myundeps -= my_conflicts
-            for my_conflict in my_conflicts:
-                self.__generate_dependency_tree_analyze_conflict(
-                    pkg_match, my_conflict,
-                    conflicts, stack, graph, deep_deps)
+        myundeps -= my_conflicts
 
         if const_debug_enabled():
             const_debug_write(__name__,
@@ -1204,6 +1307,53 @@ class CalculatorsMixin:
                     "__generate_dependency_tree_analyze_deplist " + \
                         "filtered UNSATISFIED dependencies => %s" % (myundeps,))
 
+        # PDEPENDs support
+        myundeps, post_deps = self._lookup_post_dependencies(repo_db,
+            pkg_id, myundeps)
+
+        deps = set()
+        deps_not_found = set()
+        for unsat_dep in myundeps:
+            match_pkg_id, match_repo_id = self.atom_match(unsat_dep)
+            if match_pkg_id == -1:
+                # dependency not found !
+                deps_not_found.add(unsat_dep)
+                continue
+            deps.add((match_pkg_id, match_repo_id))
+
+        return my_conflicts, deps, deps_not_found, post_deps, memoizable
+
+    def __generate_dependency_tree_analyze_deplist(self, pkg_match, repo_db,
+        stack, graph, deps_not_found, conflicts, unsat_cache, relaxed_deps,
+        build_deps, deep_deps, empty_deps, recursive, selected_matches,
+        elements_cache, selected_matches_cache, dependency_memo):
+
+        memo_key = (pkg_match, relaxed_deps, build_deps, deep_deps,
+                    empty_deps)
+        expanded = None
+        if dependency_memo is not None:
+            expanded = dependency_memo.get(memo_key)
+        if expanded is None:
+            expanded = self.__generate_dependency_tree_expand_deplist(
+                pkg_match, repo_db, unsat_cache, relaxed_deps, build_deps,
+                deep_deps, empty_deps, selected_matches,
+                selected_matches_cache)
+            if dependency_memo is not None and expanded[4]:
+                dependency_memo[memo_key] = expanded
+        elif const_debug_enabled():
+            const_debug_write(__name__,
+                "__generate_dependency_tree_analyze_deplist "
+                "memoized %s => %s" % (pkg_match, expanded,))
+
+        my_conflicts, deps, my_deps_not_found, post_deps, _memoizable = \
+            expanded
+
+        # check conflicts
+        for my_conflict in my_conflicts:
+            self.__generate_dependency_tree_analyze_conflict(
+                pkg_match, my_conflict,
+                conflicts, stack, graph, deep_deps)
+
         def _post_deps_filter(post_dep):
             pkg_matches, rc = self.atom_match(post_dep,
                 multi_match = True, multi_repo = True)
@@ -1212,10 +1362,6 @@ class CalculatorsMixin:
                 return False
             return True
 
-        post_deps = []
-        # PDEPENDs support
-        myundeps, post_deps = self._lookup_post_dependencies(repo_db,
-            pkg_id, myundeps)
         if (not empty_deps) and post_deps:
             # validate post dependencies, make them not contain matches already
             # pulled in, this cuts potential circular dependencies:
@@ -1233,18 +1379,11 @@ class CalculatorsMixin:
                 "generate_dependency_tree POST dependencies ADDED => %s" % (
                     post_deps,))
 
-        deps = set()
-        for unsat_dep in myundeps:
-            match_pkg_id, match_repo_id = self.atom_match(unsat_dep)
-            if match_pkg_id == -1:
-                # dependency not found !
-                deps_not_found.add(unsat_dep)
-                continue
-
-            deps.add((match_pkg_id, match_repo_id))
-            if recursive:
-                # push to stack only if recursive
-                stack.push((match_pkg_id, match_repo_id))
+        deps_not_found |= my_deps_not_found
+        if recursive:
+            # push to stack only if recursive
+            for dep_match in deps:
+                stack.push(dep_match)
 
         post_deps_matches = set()
         for post_dep in post_deps:
@@ -1258,7 +1397,8 @@ class CalculatorsMixin:
                 # push to stack only if recursive
                 stack.push((match_pkg_id, match_repo_id))
 
-        return deps, post_deps_matches
+        # deps may be shared with dependency_memo
+        return set(deps), post_deps_matches
 
     def _generate_dependency_inverse_conflicts(self, package_match,
                                                just_id = False):
@@ -1322,7 +1462,8 @@ class CalculatorsMixin:
         empty_deps = False, relaxed_deps = False, build_deps = False,
         only_deps = False, deep_deps = False, unsatisfied_deps_cache = None,
         elements_cache = None, post_deps_cache = None, recursive = True,
-        selected_matches = None, selected_matches_cache = None):
+        selected_matches = None, selected_matches_cache = None,
+        dependency_memo = None):
 
         pkg_id, pkg_repo = matched_atom
         if (pkg_id == -1) or (pkg_repo == 1):
@@ -1430,7 +1571,8 @@ class CalculatorsMixin:
                     pkg_match, repo_db, stack, graph, deps_not_found,
                     conflicts, unsatisfied_deps_cache, relaxed_deps,
                     build_deps, deep_deps, empty_deps, recursive,
-                    selected_matches, elements_cache, selected_matches_cache)
+                    selected_matches, elements_cache, selected_matches_cache,
+                    dependency_memo)
 
             if post_dep_matches:
                 obj = post_deps_cache.setdefault(pkg_match, set())
@@ -2094,6 +2236,10 @@ class CalculatorsMixin:
         deep_deps = False, relaxed_deps = False, build_deps = False,
         only_deps = False, quiet = False, recursive = True):
 
+        inst_checksum = self._installed_repository.checksum()
+        # without a checksum, the cache key cannot be trusted
+        use_cache = self.xcache and inst_checksum is not None
+
         sha = hashlib.sha1()
         c_hex = "%s|%s|%s|%s|%s|%s|%s|%s|%s|v3" % (
                 repr(sorted(package_matches)),
@@ -2103,7 +2249,7 @@ class CalculatorsMixin:
                 build_deps,
                 only_deps,
                 recursive,
-                self._installed_repository.checksum(),
+                inst_checksum,
                 # needed when users do bogus things like editing config files
                 # manually (branch setting)
                 self._settings['repositories']['branch'],
@@ -2112,12 +2258,12 @@ class CalculatorsMixin:
         c_hash = "%s_%s" % (EntropyCacher.CACHE_IDS['dep_tree'],
             sha.hexdigest())
 
-        if self.xcache:
+        if use_cache:
             cached = self._cacher.pop(c_hash)
             if cached is not None:
                 return cached
 
-        graph = Graph()
+        graph = IndexedGraph()
         deptree_conflicts = set()
         atomlen = len(package_matches)
         count = 0
@@ -2139,6 +2285,7 @@ class CalculatorsMixin:
                 raise AttributeError("unsupported package_matches type")
 
         sort_dep_text = _("Sorting dependencies")
+        dependency_memo = self._get_dependency_memo()
         unsat_deps_cache = {}
         elements_cache = set()
         selected_matches_cache = {}
@@ -2177,7 +2324,8 @@ class CalculatorsMixin:
                     unsatisfied_deps_cache = unsat_deps_cache,
                     post_deps_cache = post_deps_cache,
                     recursive = recursive, selected_matches = package_matches,
-                    selected_matches_cache = selected_matches_cache
+                    selected_matches_cache = selected_matches_cache,
+                    dependency_memo = dependency_memo
                 )
             except DependenciesNotFound as err:
                 deps_not_found |= err.value
@@ -2189,9 +2337,7 @@ class CalculatorsMixin:
             graph.destroy()
             raise DependenciesNotFound(deps_not_found)
 
-        # get adjacency map before it gets destroyed by solve()
-        adj_map = dict((x.item(), set(k.item() for k in y)) \
-            for x, y in graph.get_adjacency_map().items())
+        adj_map = graph.get_adjacency_map()
         # solve depgraph and append conflicts
         deptree = graph.solve()
         if 0 in deptree:
@@ -2233,7 +2379,7 @@ class CalculatorsMixin:
         graph.destroy()
         reverse_tree[0] = deptree_conflicts
 
-        if self.xcache:
+        if use_cache:
             self._cacher.push(c_hash, reverse_tree)
 
         return reverse_tree
@@ -2340,7 +2486,7 @@ class CalculatorsMixin:
         count = 0
         match_cache = set()
         stack = Lifo()
-        graph = Graph()
+        graph = IndexedGraph()
         not_removable_deps = set()
         deep_dep_map = {}
         filter_multimatch_cache = {}
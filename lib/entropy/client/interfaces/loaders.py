@@ -13,9 +13,6 @@ from entropy.spm.plugins.factory import get_default_instance as get_spm, \
     get_default_class as get_spm_default_class
 
 from entropy.const import etpConst
-from entropy.qa import QAInterface
-from entropy.security import System
-from entropy.security import Repository as RepositorySecurity
 
 class LoadersMixin:
 
@@ -28,16 +25,12 @@ class LoadersMixin:
         from entropy.client.interfaces.package import Package
         from entropy.client.interfaces.sets import Sets
         from entropy.client.misc import FileUpdates, ConfigurationUpdates
-        from entropy.client.services.interfaces import \
-            ClientWebServiceFactory, RepositoryWebServiceFactory
         self.__package_loader = Package
         self.__repository_loader = Repository
         self.__trigger_loader = Trigger
         self.__sets_loader = Sets
         self.__package_files_loader = FileUpdates
         self.__configuration_updates_loader = ConfigurationUpdates
-        self.__webservice_factory = ClientWebServiceFactory
-        self.__repo_webservice_factory = RepositoryWebServiceFactory
 
     def Sets(self):
         """
@@ -55,6 +48,8 @@ class LoadersMixin:
         @return: Repository Security instance object
         @rtype: entropy.security.System
         """
+        # lazily loaded, not needed by the most common code paths
+        from entropy.security import System
         return System(self)
 
     def RepositorySecurity(self, keystore_dir = None):
@@ -66,6 +61,8 @@ class LoadersMixin:
         @raise RepositorySecurity.GPGError: GPGError based instances in case
             of problems.
         """
+        # lazily loaded, not needed by the most common code paths
+        from entropy.security import Repository as RepositorySecurity
         if keystore_dir is None:
             keystore_dir = etpConst['etpclientgpgdir']
         return RepositorySecurity(keystore_dir = keystore_dir)
@@ -76,6 +73,8 @@ class LoadersMixin:
 
         @rtype: entropy.qa.QAInterface
         """
+        # lazily loaded, not needed by the most common code paths
+        from entropy.qa import QAInterface
         qa_intf = QAInterface()
         qa_intf.output = self.output
         qa_intf.ask_question = self.ask_question
@@ -107,7 +106,10 @@ class LoadersMixin:
         @return: WebServicesFactory instance object
         @rtype: entropy.client.services.interfaces.WebServicesFactory
         """
-        return self.__webservice_factory(self)
+        # lazily loaded, not needed by the most common code paths
+        from entropy.client.services.interfaces import \
+            ClientWebServiceFactory
+        return ClientWebServiceFactory(self)
 
     def RepositoryWebServices(self):
         """
@@ -119,7 +121,10 @@ class LoadersMixin:
         @return: RepositoryWebServiceFactory instance object
         @rtype: entropy.client.services.interfaces.RepositoryWebServiceFactory
         """
-        return self.__repo_webservice_factory(self)
+        # lazily loaded, not needed by the most common code paths
+        from entropy.client.services.interfaces import \
+            RepositoryWebServiceFactory
+        return RepositoryWebServiceFactory(self)
 
     def Spm(self):
         """
@@ -35,7 +35,6 @@ from entropy.db.skel import EntropyRepositoryBase
 from entropy.db.exceptions import Error as EntropyRepositoryError
 from entropy.cache import EntropyCacher
 from entropy.misc import FlockFile
-from entropy.fetchers import UrlFetcher
 from entropy.client.interfaces.db import ClientEntropyRepositoryPlugin, \
     InstalledPackagesRepository, AvailablePackagesRepository, GenericRepository
 from entropy.client.mirrors import StatusInterface
@@ -1751,6 +1750,36 @@ class MiscMixin:
                 ref_obj.close()
                 mapped['ref'] = None
 
+    def _suspend_resource(self, lock_path):
+        """
+        Internal function that temporarily releases a lock file, whatever
+        its reentrancy count, see _resume_resource().
+        """
+        with MiscMixin._FILE_LOCK_MUTEX:
+            mapped = self._file_lock_setup(lock_path)
+            flock_f = mapped['ref']
+        if flock_f is None:
+            return False
+        flock_f.release()
+        return True
+
+    def _resume_resource(self, lock_path, shared):
+        """
+        Internal function that re-acquires, in blocking mode, a lock file
+        previously released by _suspend_resource().
+        """
+        with MiscMixin._FILE_LOCK_MUTEX:
+            mapped = self._file_lock_setup(lock_path)
+            flock_f = mapped['ref']
+        if flock_f is None:
+            # wtf ?
+            raise IOError("not acquired")
+        if shared:
+            flock_f.acquire_shared()
+        else:
+            flock_f.acquire_exclusive()
+        self._clear_resources_after_lock()
+
     def _file_lock_create(self, pidfile, blocking = False, shared = False):
         """
         Create and allocate the lock file pointed by lock_data structure.
@@ -1897,6 +1926,65 @@ class MiscMixin:
         lock_path = etpConst['locks']['using_resources']
         return self._unlock_resource(lock_path)
 
+    def suspend_resources(self):
+        """
+        Temporarily release the Entropy Resources lock held by this
+        process, letting other processes acquire it, without touching
+        its reentrancy count. Other threads of this process still see the
+        lock as acquired, so it must only be used when they are not going
+        to alter the resources the lock protects.
+        It must be paired with resume_resources().
+
+        @return: True, if the lock was held and has been released
+        @rtype: bool
+        """
+        lock_path = etpConst['locks']['using_resources']
+        return self._suspend_resource(lock_path)
+
+    def resume_resources(self, shared = False):
+        """
+        Re-acquire, in blocking mode, the Entropy Resources lock released
+        by suspend_resources(). Cached data that could have become stale
+        in the meantime is dropped.
+
+        @keyword shared: acquire a shared lock? (default is False)
+        @type shared: bool
+        """
+        lock_path = etpConst['locks']['using_resources']
+        return self._resume_resource(lock_path, shared)
+
+    def lock_repository(self, repository_id, blocking = False,
+                        shared = False):
+        """
+        Acquire the lock of a single Available Packages Repository, used
+        to serialize its updates. Unlike lock_resources(), it does not
+        prevent other repositories from being updated concurrently.
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @keyword blocking: execute in blocking mode?
+        @type blocking: bool
+        @keyword shared: acquire a shared lock? (default is False)
+        @type shared: bool
+        @return: True, if lock has been acquired. False otherwise.
+        @rtype: bool
+        """
+        lock_path = etpConst['locks']['using_repository'] % (
+            repository_id,)
+        return self._lock_resource(lock_path, blocking, shared)
+
+    def unlock_repository(self, repository_id):
+        """
+        Release a previously acquired repository lock, see
+        lock_repository().
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        """
+        lock_path = etpConst['locks']['using_repository'] % (
+            repository_id,)
+        return self._unlock_resource(lock_path)
+
     def wait_resources(self, sleep_seconds = 1.0, max_lock_count = 300,
                        shared = False, spinner = False):
         """
@@ -2058,6 +2146,7 @@ class MiscMixin:
                 )
 
                 download_speeds = []
+                from entropy.fetchers import UrlFetcher
                 fetch_errors = (
                     UrlFetcher.TIMEOUT_FETCH_ERROR,
                     UrlFetcher.GENERIC_FETCH_ERROR)
@@ -2317,8 +2406,8 @@ class MiscMixin:
         @type edb: bool
         @keyword fake: create a fake package (empty)
         @type fake: bool
-        @keyword compression: supported compressions: "gz", "bz2" or "" (no
-            compression)
+        @keyword compression: supported compressions: "gz", "bz2", "xz",
+            "zst" (if available) or "" (no compression)
         @type compression: string
         @keyword shiftpath: if package files are stored into an alternative
             root directory.
@@ -2326,8 +2415,8 @@ class MiscMixin:
         @return: path to generated package file or None (if error)
         @rtype: string or None
         """
-        import tarfile
-        if compression not in ("bz2", "", "gz"):
+        if compression and compression not in \
+                etpConst['etpdatabasesupportedcformats']:
             compression = "bz2"
         if shiftpath is None:
             shiftpath = os.path.sep
@@ -2351,7 +2440,7 @@ class MiscMixin:
         if os.path.isfile(pkg_path):
             os.remove(pkg_path)
 
-        tar = tarfile.open(pkg_path, "w:"+compression)
+        tar = entropy.tools.open_tarfile(pkg_path, "w:"+compression)
 
         if not fake:
 
@@ -15,12 +15,15 @@ import sys
 import subprocess
 import errno
 import time
+import threading
 
-from entropy.const import const_debug_write, etpConst, const_file_readable
+from entropy.const import const_debug_write, etpConst, const_file_readable, \
+    const_set_nice_level
 from entropy.i18n import _, ngettext
 from entropy.exceptions import RepositoryError, PermissionDenied
 from entropy.output import blue, darkred, red, darkgreen, bold, purple, teal, \
     brown
+from entropy.misc import ParallelTask
 
 from entropy.db.exceptions import Error
 from entropy.db.skel import EntropyRepositoryBase
@@ -28,15 +31,87 @@ from entropy.core.settings.base import SystemSettings
 
 import entropy.tools
 
+
+class _ParallelUpdateClient(object):
+
+    """
+    Entropy Client proxy handed to repository updates running in
+    parallel. Output is buffered and printed as a whole, through the
+    real Entropy Client, once the update is done, so that messages
+    of different repositories do not get interleaved. Download progress
+    is not shown.
+    """
+
+    # tells the updater that it is running in a worker thread, process
+    # wide settings (like the nice level) are handled by the caller
+    parallel_update = True
+
+    def __init__(self, entropy_client):
+        self._entropy_client = entropy_client
+        self._messages = []
+
+        url_fetcher = entropy_client._url_fetcher
+        multiple_url_fetcher = entropy_client._multiple_url_fetcher
+
+        class QuietUrlFetcher(url_fetcher):
+
+            def _push_progress_to_output(self, *args, **kwargs):
+                return
+
+        class QuietMultipleUrlFetcher(multiple_url_fetcher):
+
+            def output(self, *args, **kwargs):
+                return
+
+            def _push_progress_to_output(self, *args, **kwargs):
+                return
+
+        self._url_fetcher = QuietUrlFetcher
+        self._multiple_url_fetcher = QuietMultipleUrlFetcher
+
+    def __getattr__(self, name):
+        return getattr(self._entropy_client, name)
+
+    def output(self, text, header = "", footer = "", back = False,
+        importance = 0, level = "info", count = None, percent = False):
+        """
+        Buffer output, see entropy.output.TextInterface.
+        """
+        if back:
+            # transient message, meaningless once buffered
+            return
+        self._messages.append((text, {
+            'header': header,
+            'footer': footer,
+            'importance': importance,
+            'level': level,
+            'count': count,
+            'percent': percent,
+        }))
+
+    def flush(self):
+        """
+        Print the buffered output through the real Entropy Client.
+        """
+        messages = self._messages[:]
+        del self._messages[:]
+        for text, kwargs in messages:
+            self._entropy_client.output(text, **kwargs)
+
+
 class Repository:
 
     """
     Entropy Client Repositories management interface.
     """
 
+    # maximum amount of repositories updated at the same time
+    # in parallel mode
+    PARALLEL_UPDATES = 4
+
     def __init__(self, entropy_client, repo_identifiers = None,
         force = False, entropy_updates_alert = True, fetch_security = True,
-        gpg = True):
+        gpg = True, parallel = False):
         """
         Entropy Client Repositories management interface constructor.
 
@@ -46,7 +121,9 @@ class Repository:
         @keyword repo_identifiers: list of repository identifiers you want to
             take into consideration
         @type repo_identifiers: list
-        @
+        @keyword parallel: update repositories in parallel, up to
+            PARALLEL_UPDATES at the same time
+        @type parallel: bool
         """
 
         if repo_identifiers is None:
@@ -66,6 +143,7 @@ class Repository:
         self.already_updated = 0
         self.not_available = 0
         self._gpg_feature = gpg
+        self._parallel = parallel
         env_gpg = os.getenv('ETP_DISBLE_GPG')
         if env_gpg is not None:
             self._gpg_feature = False
@@ -110,17 +188,79 @@ class Repository:
 
         return br_rc
 
+    def _update_repository(self, repo, entropy_client):
+        """
+        Update the given repository holding its lock, return the
+        update status.
+        """
+        acquired = self._entropy.lock_repository(repo, blocking = True)
+        try:
+            return self._entropy.get_repository(repo).update(
+                entropy_client, repo, self.force, self._gpg_feature)
+        except PermissionDenied:
+            return EntropyRepositoryBase.REPOSITORY_PERMISSION_DENIED_ERROR
+        finally:
+            if acquired:
+                self._entropy.unlock_repository(repo)
+
+    def _parallel_update_repositories(self):
+        """
+        Update the repositories in parallel, return a dict mapping
+        each repository to its update status. The Entropy Resources lock,
+        if held, is released while the repositories are being updated,
+        each of them is protected by its own lock, see
+        _update_repository().
+        """
+        statuses = {}
+        output_mutex = threading.Lock()
+        slots = threading.Semaphore(Repository.PARALLEL_UPDATES)
+
+        def _update(repo):
+            client = _ParallelUpdateClient(self._entropy)
+            try:
+                statuses[repo] = self._update_repository(repo, client)
+            finally:
+                with output_mutex:
+                    client.flush()
+                slots.release()
+
+        # the nice level is per process, set it once for all the workers
+        old_prio = const_set_nice_level(15)
+        suspended = self._entropy.suspend_resources()
+        try:
+            threads = []
+            for repo in self.repo_ids:
+                slots.acquire()
+                th = ParallelTask(_update, repo)
+                th.name = "RepositoryUpdate{%s}" % (repo,)
+                th.daemon = True
+                th.start()
+                threads.append(th)
+
+            for th in threads:
+                th.join()
+        finally:
+            if suspended:
+                self._entropy.resume_resources()
+            const_set_nice_level(old_prio)
+
+        return statuses
+
     def _run_sync(self, _unlocked = False):
 
         self.updated = False
+        parallel = self._parallel and len(self.repo_ids) > 1
+        if parallel:
+            statuses = self._parallel_update_repositories()
+
         for repo in self.repo_ids:
 
             # handle
-            try:
-                status = self._entropy.get_repository(repo).update(self._entropy,
-                    repo, self.force, self._gpg_feature)
-            except PermissionDenied:
-                status = EntropyRepositoryBase.REPOSITORY_PERMISSION_DENIED_ERROR
+            if parallel:
+                status = statuses.get(repo,
+                    EntropyRepositoryBase.REPOSITORY_GENERIC_ERROR)
+            else:
+                status = self._update_repository(repo, self._entropy)
 
             if status == EntropyRepositoryBase.REPOSITORY_ALREADY_UPTODATE:
                 self.already_updated = True
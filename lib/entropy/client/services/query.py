@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+
+    @author: Fabio Erculiani <lxnay@sabayon.org>
+    @contact: lxnay@sabayon.org
+    @copyright: Fabio Erculiani
+    @license: GPL-2
+
+    B{Entropy Client Query Service}.
+
+    This module implements a local, read-only query server keeping an
+    Entropy Client instance (and thus its repositories and caches) warm
+    across requests, and its client counterpart. The server listens on
+    a Unix socket and exposes a small subset of the Client and repository
+    APIs. QueryClient mimics the same API subset, making it possible to
+    run read-only code against the server without instantiating Client.
+
+    The wire protocol is made of newline separated JSON objects.
+    Requests have the form:
+        {"method": <string>, "args": <list>, "kwargs": <dict>}
+    while responses are either:
+        {"result": <object>} or {"error": <string>}
+
+"""
+__all__ = ["QueryServer", "QueryClient", "QueryServiceError"]
+
+import errno
+import json
+import os
+import socket
+import threading
+
+from entropy.const import etpConst, const_debug_write, const_setup_file, \
+    const_is_python3
+
+if const_is_python3():
+    import socketserver
+else:
+    import SocketServer as socketserver
+
+from entropy.exceptions import EntropyException
+from entropy.output import TextInterface
+
+import entropy.tools
+
+
+class QueryServiceError(EntropyException):
+    """
+    Raised when the Query Server reports an error or cannot be reached.
+    """
+
+
+def _socket_path():
+    """
+    Return the default Query Server Unix socket path.
+    """
+    return os.path.join(etpConst['entropyworkdir'], ".query_server.socket")
+
+
+def _encode(obj):
+    """
+    Make obj JSON serializable, preserving tuples and sets.
+    """
+    if isinstance(obj, tuple):
+        return {"__tuple__": [_encode(x) for x in obj]}
+    if isinstance(obj, (set, frozenset)):
+        return {"__set__": [_encode(x) for x in obj]}
+    if isinstance(obj, list):
+        return [_encode(x) for x in obj]
+    if isinstance(obj, dict):
+        return dict((k, _encode(v)) for k, v in obj.items())
+    return obj
+
+
+def _decode_hook(obj):
+    """
+    json object_hook rebuilding what _encode() serialized.
+    """
+    if "__tuple__" in obj:
+        return tuple(obj["__tuple__"])
+    if "__set__" in obj:
+        return set(obj["__set__"])
+    return obj
+
+
+def _dumps(obj):
+    return (json.dumps(_encode(obj)) + "\n").encode("utf-8")
+
+
+def _loads(line):
+    return json.loads(line.decode("utf-8"), object_hook = _decode_hook)
+
+
+class QueryServer(object):
+    """
+    Entropy Client read-only query server.
+
+    Sample code:
+
+    >>> from entropy.client.interfaces import Client
+    >>> from entropy.client.services.query import QueryServer
+    >>> server = QueryServer(Client())
+    >>> server.serve_forever()
+
+    Requests are served one at a time, the Client instance is shared.
+    Before serving a request, the server checks whether the repositories
+    or the configuration files changed on disk, and reloads them if so.
+    """
+
+    # Client methods that can be called remotely.
+    CLIENT_METHODS = ("atom_match", "atom_search", "calculate_updates",
+        "repositories", "get_meant_packages")
+
+    # Repository methods that can be called remotely, they are all
+    # read-only.
+    REPOSITORY_METHODS = ("repository_id", "atomMatch", "isInjected",
+        "listAllPackageIds", "searchPackages", "searchName",
+        "searchDescription", "searchProvidedVirtualPackage",
+        "retrieveAtom", "retrieveBranch", "retrieveCategory",
+        "retrieveChangelog", "retrieveConflicts", "retrieveCreationDate",
+        "retrieveDependencies", "retrieveDependenciesList",
+        "retrieveDescription", "retrieveDigest", "retrieveDownloadURL",
+        "retrieveHomepage", "retrieveKeySlot", "retrieveKeySplit",
+        "retrieveKeywords", "retrieveLicense", "retrieveName",
+        "retrieveOnDiskSize", "retrieveProvide", "retrieveRevision",
+        "retrieveReverseDependencies", "retrieveSize", "retrieveSlot",
+        "retrieveSpmRepository", "retrieveTag", "retrieveUseflags",
+        "retrieveVersion")
+
+    class _Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            query_server = self.server.query_server
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                try:
+                    request = _loads(line)
+                    response = {
+                        "result": query_server.dispatch(
+                            request["method"],
+                            request.get("args", []),
+                            request.get("kwargs", {})),
+                    }
+                except Exception as err:
+                    response = {"error": "%s: %s" % (
+                            err.__class__.__name__, err,)}
+                self.wfile.write(_dumps(response))
+                self.wfile.flush()
+
+    class _Server(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+
+        daemon_threads = True
+
+    def __init__(self, entropy_client, socket_path = None):
+        """
+        QueryServer constructor.
+
+        @param entropy_client: Entropy Client instance, it will be
+            kept open for the whole server lifetime
+        @type entropy_client: entropy.client.interfaces.Client
+        @keyword socket_path: Unix socket path, default is inside
+            etpConst['entropyworkdir']
+        @type socket_path: string
+        """
+        if socket_path is None:
+            socket_path = _socket_path()
+        self._entropy = entropy_client
+        self._socket_path = socket_path
+        self._mutex = threading.Lock()
+        self._signature = None
+        self._server = None
+
+    def _state_signature(self):
+        """
+        Return an object describing the on-disk state of the
+        repositories and configuration files. If it changes,
+        the cached state must be thrown away.
+        """
+        paths = [self._entropy.installed_repository_path()]
+        settings = self._entropy.Settings()
+        avail_data = settings['repositories']['available']
+        for repository_id in sorted(avail_data):
+            dbpath = avail_data[repository_id].get('dbpath')
+            if dbpath is None:
+                continue
+            paths.append(os.path.join(dbpath, etpConst['etpdatabasefile']))
+
+        for value in settings.get_setting_files_data().values():
+            if isinstance(value, dict):
+                paths.extend(value.values())
+            else:
+                paths.append(value)
+        for value in settings.get_setting_dirs_data().values():
+            conf_dir, conf_files, _skipped, _auto = value
+            paths.append(conf_dir)
+            paths.extend(x for x, _mtime_file in conf_files)
+
+        signature = []
+        for path in paths:
+            try:
+                signature.append((path, os.path.getmtime(path)))
+            except (OSError, IOError):
+                signature.append((path, None))
+        return tuple(signature)
+
+    def _validate(self):
+        """
+        Reload repositories and settings if they changed on disk.
+        """
+        signature = self._state_signature()
+        if self._signature is None:
+            self._signature = signature
+            return
+        if signature == self._signature:
+            return
+
+        const_debug_write(__name__, "QueryServer: state changed, reloading")
+        self._entropy.close_repositories()
+        self._entropy.reopen_installed_repository()
+        self._entropy._validate_repositories(quiet = True)
+        self._signature = self._state_signature()
+
+    def dispatch(self, method, args, kwargs):
+        """
+        Execute the given method, return its outcome.
+
+        @param method: method name, either one in CLIENT_METHODS or
+            "repository" (in this case, the first argument is the
+            repository identifier and the second the name of a method
+            in REPOSITORY_METHODS)
+        @type method: string
+        @param args: method arguments
+        @type args: list
+        @param kwargs: method keyword arguments
+        @type kwargs: dict
+        @raise QueryServiceError: if method is not supported
+        """
+        # JSON keys are unicode, python 2 does not like them as kwargs
+        kwargs = dict((str(k), v) for k, v in kwargs.items())
+
+        if method == "ping":
+            return True
+
+        with self._mutex:
+            acquired = entropy.tools.acquire_entropy_locks(
+                self._entropy, blocking = True, shared = True)
+            if not acquired:
+                raise QueryServiceError("cannot acquire Entropy locks")
+            try:
+                self._validate()
+
+                if method == "installed_repository_id":
+                    return self._entropy.installed_repository(
+                        ).repository_id()
+
+                if method == "repository":
+                    repository_id, repo_method = args[0], args[1]
+                    if repo_method not in QueryServer.REPOSITORY_METHODS:
+                        raise QueryServiceError(
+                            "unsupported method: %s" % (repo_method,))
+                    repo = self._entropy.open_repository(repository_id)
+                    return getattr(repo, repo_method)(*args[2:], **kwargs)
+
+                if method not in QueryServer.CLIENT_METHODS:
+                    raise QueryServiceError(
+                        "unsupported method: %s" % (method,))
+                return getattr(self._entropy, method)(*args, **kwargs)
+
+            finally:
+                entropy.tools.release_entropy_locks(self._entropy)
+
+    def serve_forever(self):
+        """
+        Bind the Unix socket and serve requests until shutdown()
+        is called.
+        """
+        try:
+            os.remove(self._socket_path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+        self._server = QueryServer._Server(
+            self._socket_path, QueryServer._Handler)
+        self._server.query_server = self
+        # only root and the entropy group can query the server
+        const_setup_file(self._socket_path, etpConst['entropygid'], 0o660)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            try:
+                os.remove(self._socket_path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """
+        Stop serving requests. Must be called from another thread.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+
+
+class QueryClient(TextInterface):
+    """
+    Query Server client. It exposes the subset of the Client API
+    available through QueryServer, repositories are returned as
+    QueryClient.Repository proxy objects.
+
+    Sample code:
+
+    >>> from entropy.client.services.query import QueryClient
+    >>> client = QueryClient.connect()
+    >>> if client is not None:
+    ...     pkg_id, repository_id = client.atom_match("app-foo/bar")
+    ...     repo = client.open_repository(repository_id)
+    ...     repo.retrieveAtom(pkg_id)
+    ...     client.close()
+    """
+
+    class Repository(object):
+        """
+        Read-only repository proxy.
+        """
+
+        def __init__(self, query_client, repository_id):
+            self._client = query_client
+            self._repository_id = repository_id
+
+        def repository_id(self):
+            """
+            Return the repository identifier.
+            """
+            return self._repository_id
+
+        def __getattr__(self, name):
+            if name not in QueryServer.REPOSITORY_METHODS:
+                raise AttributeError(name)
+
+            def _method(*args, **kwargs):
+                return self._client.call(
+                    "repository", self._repository_id, name, *args,
+                    **kwargs)
+            return _method
+
+    class InstalledRepository(Repository):
+        """
+        Read-only installed packages repository proxy.
+        """
+
+    def __init__(self, sock):
+        self._socket = sock
+        self._rfile = sock.makefile("rb")
+        self._installed_repository = None
+
+    @classmethod
+    def connect(cls, socket_path = None, timeout = None):
+        """
+        Connect to a running Query Server.
+
+        @keyword socket_path: Unix socket path
+        @type socket_path: string
+        @keyword timeout: socket timeout in seconds
+        @type timeout: float
+        @return: a QueryClient instance or None, if the server
+            is not running
+        @rtype: QueryClient or None
+        """
+        if socket_path is None:
+            socket_path = _socket_path()
+        if not os.path.exists(socket_path):
+            return None
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if timeout is not None:
+            sock.settimeout(timeout)
+        try:
+            sock.connect(socket_path)
+        except socket.error as err:
+            const_debug_write(__name__,
+                "QueryClient.connect: %s: %s" % (socket_path, err,))
+            sock.close()
+            return None
+        return cls(sock)
+
+    def close(self):
+        """
+        Close the connection to the server.
+        """
+        self._rfile.close()
+        self._socket.close()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call a method on the server, return its result.
+
+        @raise QueryServiceError: if the server reports an error or
+            the connection is broken
+        """
+        request = {"method": method, "args": list(args), "kwargs": kwargs}
+        try:
+            self._socket.sendall(_dumps(request))
+            line = self._rfile.readline()
+        except (socket.error, IOError) as err:
+            raise QueryServiceError("connection error: %s" % (err,))
+        if not line:
+            raise QueryServiceError("connection closed by server")
+
+        response = _loads(line)
+        if "error" in response:
+            raise QueryServiceError(response["error"])
+        return response["result"]
+
+    def ping(self):
+        """
+        Return True if the server is alive.
+        """
+        try:
+            return self.call("ping")
+        except QueryServiceError:
+            return False
+
+    def atom_match(self, *args, **kwargs):
+        """
+        See Client.atom_match().
+        """
+        return self.call("atom_match", *args, **kwargs)
+
+    def atom_search(self, *args, **kwargs):
+        """
+        See Client.atom_search().
+        """
+        return self.call("atom_search", *args, **kwargs)
+
+    def calculate_updates(self, *args, **kwargs):
+        """
+        See Client.calculate_updates().
+        """
+        return self.call("calculate_updates", *args, **kwargs)
+
+    def get_meant_packages(self, *args, **kwargs):
+        """
+        See Client.get_meant_packages().
+        """
+        return self.call("get_meant_packages", *args, **kwargs)
+
+    def repositories(self):
+        """
+        See Client.repositories().
+        """
+        return self.call("repositories")
+
+    def installed_repository(self):
+        """
+        See Client.installed_repository().
+        """
+        if self._installed_repository is None:
+            self._installed_repository = QueryClient.InstalledRepository(
+                self, self.call("installed_repository_id"))
+        return self._installed_repository
+
+    def open_repository(self, repository_id):
+        """
+        See Client.open_repository().
+        """
+        inst_repo = self.installed_repository()
+        if repository_id == inst_repo.repository_id():
+            return inst_repo
+        return QueryClient.Repository(self, repository_id)
@@ -49,6 +49,21 @@ try:
 except ImportError:
     # python 3.x
     import _thread as thread
+try:
+    import lzma
+except ImportError:
+    try:
+        # python 2.x
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import zstandard
+    if not hasattr(zstandard, "open"):
+        # zstandard < 0.13 has no file object API
+        zstandard = None
+except ImportError:
+    zstandard = None
 from entropy.i18n import _, ENCODING, RAW_ENCODING
 
 # Setup debugger hook on SIGUSR1
@@ -388,6 +403,28 @@ def const_default_settings(rootdir):
         'etpdatabasedumpgzip': default_etp_dbfile+".dump.gz",
         'etpdatabasedumphashfilegzip': default_etp_dbfile+".dump.gz.md5",
 
+        # Entropy sqlite database file (xz)
+        'etpdatabasefilexz': default_etp_dbfile+".xz",
+        'etpdatabasefilexzhash': default_etp_dbfile+".xz.md5",
+        'etpdatabasefilexzlight': default_etp_dbfile+".light.xz",
+        'etpdatabasefilehashxzlight': default_etp_dbfile+".light.xz.md5",
+        # Entropy sqlite database dump file (xz)
+        'etpdatabasedumpxz': default_etp_dbfile+".dump.xz",
+        'etpdatabasedumphashfilexz': default_etp_dbfile+".dump.xz.md5",
+        'etpdatabasedumplightxz': default_etp_dbfile+".dumplight.xz",
+        'etpdatabasedumplighthashfilexz': default_etp_dbfile+".dumplight.xz.md5",
+
+        # Entropy sqlite database file (zstd)
+        'etpdatabasefilezst': default_etp_dbfile+".zst",
+        'etpdatabasefilezsthash': default_etp_dbfile+".zst.md5",
+        'etpdatabasefilezstlight': default_etp_dbfile+".light.zst",
+        'etpdatabasefilehashzstlight': default_etp_dbfile+".light.zst.md5",
+        # Entropy sqlite database dump file (zstd)
+        'etpdatabasedumpzst': default_etp_dbfile+".dump.zst",
+        'etpdatabasedumphashfilezst': default_etp_dbfile+".dump.zst.md5",
+        'etpdatabasedumplightzst': default_etp_dbfile+".dumplight.zst",
+        'etpdatabasedumplighthashfilezst': default_etp_dbfile+".dumplight.zst.md5",
+
         # Entropy sqlite database dump file
         'etpdatabasedump': default_etp_dbfile+".dump",
 
@@ -399,6 +436,24 @@ def const_default_settings(rootdir):
         'etpdatabasedumplighthashfilebz2': default_etp_dbfile+".dumplight.bz2.md5",
         'etpdatabasedumplighthashfilegzip': default_etp_dbfile+".dumplight.gz.md5",
         'etpdatabasedumplight': default_etp_dbfile+".dumplight",
+
+        # repository delta index file, listing the available
+        # revision to revision light repository deltas
+        'etpdatabasedeltaindexfile': default_etp_dbfile+".deltas",
+        # repository delta file name, formatted with
+        # from revision, to revision, compression format
+        'etpdatabasedeltafile': default_etp_dbfile+".delta.%s-%s.%s",
+        # server-side copy of the last published light repository,
+        # used to generate the next delta
+        'etpdatabasedeltasnapshotfile': default_etp_dbfile+".delta_snapshot",
+        # default amount of repository deltas kept available
+        'etpdatabasedeltahistory': 10,
+
+        # remote packages manifest, listing path, size, md5 and mtime
+        # of the files stored on a packages mirror, formatted with
+        # arch and branch
+        'etpdatabasepkgmanifestfile': "packages.%s.%s.manifest",
+
         # expiration based server-side packages removal
 
         'etpdatabaseexpbasedpkgsrm': default_etp_dbfile+".fatscope",
@@ -419,6 +474,12 @@ def const_default_settings(rootdir):
                 "etpdatabasefilegziplight", "etpdatabasefilehashgziplight",
                 "etpdatabasefilegziphash",)
         },
+        # compressed databases formats published by the server, one per
+        # line, Entropy Clients pick the one they prefer among them
+        'etpdatabasecformatsfile': default_etp_dbfile+".cformats",
+        # Entropy Client compressed databases format preference, fastest
+        # to decompress first
+        'etpdatabasecformatspreference': ["zst", "xz", "gz", "bz2"],
         # Distribution website URL
         'distro_website_url': "http://www.sabayon.org",
         'packages_website_url': "https://packages.sabayon.org",
@@ -481,6 +542,9 @@ def const_default_settings(rootdir):
         'packagemtimefileext': ".mtime",
         # Extension of the file that "contains" expiration mtime
         'packagesexpirationfileext': ".expired",
+        # local index of the packages expiration timestamps, stored
+        # inside the repository base directory
+        'packagesexpirationindexfile': "packages.expiration_index",
         # Extension of the file that contains package file
         # information, replacing the real tarballs to save space.
         'packagesweakfileext': ".weak",
@@ -557,6 +621,9 @@ def const_default_settings(rootdir):
         'officialrepositoryid': "sabayonlinux.org",
         # tag to append to .tbz2 file before entropy database (must be 32bytes)
         'databasestarttag': "|ENTROPY:PROJECT:DB:MAGIC:START|",
+        # tag closing the fixed size trailer appended to .tbz2 files after
+        # entropy database, which stores database offset, length and md5
+        'databasetrailertag': "|ENTROPY:PROJECT:DB:TRAILER|",
         # option to keep a backup of config files after
         # being overwritten by equo conf update
         'filesbackup': True,
@@ -709,8 +776,68 @@ def const_default_settings(rootdir):
     except OSError:
         pass
 
+    if lzma is not None:
+        my_const['etpdatabasesupportedcformats'].append("xz")
+        my_const['etpdatabasecompressclasses']["xz"] = (
+            const_xz_open, "unpack_xz", "etpdatabasefilexz",
+            "etpdatabasedumpxz", "etpdatabasedumphashfilexz",
+            "etpdatabasedumplightxz", "etpdatabasedumplighthashfilexz",
+            "etpdatabasefilexzlight", "etpdatabasefilehashxzlight",
+            "etpdatabasefilexzhash",)
+    if zstandard is not None:
+        my_const['etpdatabasesupportedcformats'].append("zst")
+        my_const['etpdatabasecompressclasses']["zst"] = (
+            const_zstd_open, "unpack_zstd", "etpdatabasefilezst",
+            "etpdatabasedumpzst", "etpdatabasedumphashfilezst",
+            "etpdatabasedumplightzst", "etpdatabasedumplighthashfilezst",
+            "etpdatabasefilezstlight", "etpdatabasefilehashzstlight",
+            "etpdatabasefilezsthash",)
+
     etpConst.update(my_const)
 
+def const_xz_open(file_path, mode = "rb", compresslevel = None):
+    """
+    Open a xz compressed file, with an interface compatible with
+    bz2.BZ2File and gzip.GzipFile.
+
+    @param file_path: path to file
+    @type file_path: string
+    @keyword mode: open mode
+    @type mode: string
+    @keyword compresslevel: compression level, from 0 to 9
+    @type compresslevel: int
+    @return: file object
+    @rtype: file object
+    @raise AttributeError: if xz support is not available
+    """
+    if lzma is None:
+        raise AttributeError("xz support is not available")
+    if compresslevel is None or "r" in mode:
+        return lzma.LZMAFile(file_path, mode)
+    return lzma.LZMAFile(file_path, mode, preset = compresslevel)
+
+def const_zstd_open(file_path, mode = "rb", compresslevel = None):
+    """
+    Open a zstd compressed file, with an interface compatible with
+    bz2.BZ2File and gzip.GzipFile.
+
+    @param file_path: path to file
+    @type file_path: string
+    @keyword mode: open mode
+    @type mode: string
+    @keyword compresslevel: compression level
+    @type compresslevel: int
+    @return: file object
+    @rtype: file object
+    @raise AttributeError: if zstd support is not available
+    """
+    if zstandard is None:
+        raise AttributeError("zstd support is not available")
+    if compresslevel is None or "r" in mode:
+        return zstandard.open(file_path, mode)
+    cctx = zstandard.ZstdCompressor(level = compresslevel)
+    return zstandard.open(file_path, mode, cctx = cctx)
+
 def const_is_python3():
     """
     Return whether Python3 is interpreting this code.
@@ -929,6 +1056,9 @@ def const_configure_lock_paths():
     etpConst['locks'] = {
         'using_resources': os.path.join(etpConst['entropyworkdir'],
             '.using_resources'),
+        # per-repository lock, formatted with the repository identifier
+        'using_repository': os.path.join(etpConst['entropyworkdir'],
+            '.using_repository_%s'),
     }
 
 def const_setup_perms(mydir, gid, f_perms = None, recursion = True, uid = -1):
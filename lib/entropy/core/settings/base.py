@@ -33,6 +33,7 @@ from entropy.core.settings.plugins.skel import SystemSettingsPlugin
 from entropy.output import nocolor
 from entropy.i18n import _
 
+import entropy.dump
 import entropy.tools
 
 
@@ -452,14 +453,27 @@ class SystemSettings(Singleton, EntropyPluginStore):
             self.__cache = cache_obj
 
     # If set to True, enable in-RAM cache usage if
-    # configuration files have the same mtime of
-    # the last time they were read, during the same
-    # process lifecycle. Any race condition between
-    # reading the mtime and actually reading the file
-    # content can be trascurable as long as the cache
-    # data is stored in ram and not on-disk.
+    # configuration files have the same signature (mtime, size
+    # and inode number, see __file_signature()) of the last time
+    # they were read. Since the cache can be persisted on-disk
+    # (see SNAPSHOT_CACHE) and reused by other processes, the
+    # mtime alone is not enough: files rewritten within the mtime
+    # granularity, or replaced by rename(), are caught by the size
+    # and inode number.
     DISK_DATA_CACHE = True
 
+    # If set to True (and DISK_DATA_CACHE is enabled), the in-RAM
+    # cache above is serialized to disk at the end of every scan
+    # and loaded back by the next process, in one read. Since every
+    # cache entry is bound to the path and signature of the parsed
+    # file, only configuration files modified in the meantime get
+    # parsed again.
+    SNAPSHOT_CACHE = True
+
+    # On-disk snapshot object name, bump the version every time
+    # the layout of the parsers metadata changes.
+    _SNAPSHOT_ID = "settings/snapshot_v2"
+
     def init_singleton(self):
 
         """
@@ -488,6 +502,8 @@ class SystemSettings(Singleton, EntropyPluginStore):
         self.__setting_dirs = {}
         self.__mtime_files = {}
         self.__mtime_cache = {}
+        self.__volatile_cache_keys = set()
+        self.__snapshot_dirty = False
         self.__persistent_settings = {
             'pkg_masking_reasons': etpConst['pkg_masking_reasons'].copy(),
             'pkg_masking_reference': etpConst['pkg_masking_reference'].copy(),
@@ -500,6 +516,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
         }
 
         self.__setup_const()
+        self.__load_snapshot()
         self.__scan()
 
     def __enter__(self):
@@ -791,6 +808,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             self.__data.update(self.__persistent_settings['backed_up'].copy())
 
         self.__parse()
+        self.__save_snapshot()
         enforce_persistent()
 
         # plugins support
@@ -972,6 +990,109 @@ class SystemSettings(Singleton, EntropyPluginStore):
         del self.__persistent_settings[persistent_key]
         del self.__data[persistent_key]
 
+    def __snapshot_enabled(self):
+        """
+        Return whether the on-disk settings snapshot can be used.
+        """
+        return SystemSettings.DISK_DATA_CACHE and \
+            SystemSettings.SNAPSHOT_CACHE
+
+    def __load_snapshot(self):
+        """
+        Internal method. Load the on-disk settings snapshot, if any,
+        into the in-RAM mtime cache. Stale entries are discarded by
+        the parsers themselves through the file signature comparison.
+
+        @return: None
+        @rtype: None
+        """
+        if not self.__snapshot_enabled():
+            return
+
+        snapshot = entropy.dump.loadobj(
+            SystemSettings._SNAPSHOT_ID,
+            dump_dir = etpConst['dumpstoragedir'])
+        if not isinstance(snapshot, dict):
+            return
+
+        root = etpConst['systemroot']
+        for cache_key, cache_obj in snapshot.items():
+            try:
+                key_root, _path = cache_key
+                _signature = cache_obj['signature']
+                _data = cache_obj['data']
+            except (TypeError, ValueError, KeyError):
+                # corrupted or from an incompatible version
+                const_debug_write(__name__,
+                    "__load_snapshot: invalid entry %s" % (cache_key,))
+                continue
+            if key_root != root:
+                continue
+            self.__mtime_cache.setdefault(cache_key, cache_obj)
+
+    def __save_snapshot(self):
+        """
+        Internal method. Write the in-RAM mtime cache to the on-disk
+        settings snapshot if any configuration file has been parsed
+        again since the last write.
+
+        @return: None
+        @rtype: None
+        """
+        if not self.__snapshot_enabled():
+            return
+        if not self.__snapshot_dirty:
+            return
+
+        snapshot = {}
+        for cache_key, cache_obj in self.__mtime_cache.items():
+            if cache_key in self.__volatile_cache_keys:
+                continue
+            snapshot[cache_key] = cache_obj
+
+        entropy.dump.dumpobj(
+            SystemSettings._SNAPSHOT_ID, snapshot,
+            dump_dir = etpConst['dumpstoragedir'])
+        self.__snapshot_dirty = False
+
+    def __set_mtime_cache(self, cache_key, cache_obj, persistent = True):
+        """
+        Internal method. Store parsed metadata into the in-RAM mtime
+        cache.
+
+        @param cache_key: cache key, a (root, path) tuple
+        @type cache_key: tuple
+        @param cache_obj: dict containing "signature" and "data" keys
+        @type cache_obj: dict
+        @keyword persistent: if False, the entry is never written to
+            the on-disk snapshot. This is required for parsers having
+            side effects on the running process.
+        @type persistent: bool
+        """
+        self.__mtime_cache[cache_key] = cache_obj
+        if persistent:
+            self.__volatile_cache_keys.discard(cache_key)
+            self.__snapshot_dirty = True
+        else:
+            self.__volatile_cache_keys.add(cache_key)
+
+    def __file_signature(self, path):
+        """
+        Internal method. Return the signature of the file at path used
+        to validate mtime cache entries: a (mtime, size, inode number)
+        tuple, or (0.0, 0, 0) if the file is not available.
+
+        @param path: file path
+        @type path: string
+        @return: file signature
+        @rtype: tuple
+        """
+        try:
+            st = os.stat(path)
+        except (OSError, IOError):
+            return (0.0, 0, 0)
+        return (st.st_mtime, st.st_size, st.st_ino)
+
     def __setup_package_sets_vars(self):
 
         """
@@ -1076,18 +1197,19 @@ class SystemSettings(Singleton, EntropyPluginStore):
         """
         keywords_conf = self.__setting_files['keywords']
         root = etpConst['systemroot']
-        try:
-            mtime = os.path.getmtime(keywords_conf)
-        except (OSError, IOError):
-            mtime = 0.0
+        signature = self.__file_signature(keywords_conf)
 
         cache_key = (root, keywords_conf)
         cache_obj = self.__mtime_cache.get(cache_key)
         if cache_obj is not None:
-            if cache_obj['mtime'] == mtime:
-                return cache_obj['data']
+            if cache_obj['signature'] == signature:
+                data = cache_obj['data']
+                # cached data may come from the on-disk snapshot,
+                # global keywords must be merged back in any case
+                self.__merge_universal_keywords(data)
+                return data
 
-        cache_obj = {'mtime': mtime,}
+        cache_obj = {'signature': signature,}
 
         # merge universal keywords
         data = {
@@ -1153,16 +1275,21 @@ class SystemSettings(Singleton, EntropyPluginStore):
                         data['packages'][keywordinfo[0]] = set()
                     data['packages'][keywordinfo[0]].add(items[0])
 
-        # merge universal keywords
-        etpConst['keywords'].clear()
-        etpConst['keywords'].update(etpSys['keywords'])
-        for keyword in data['universal']:
-            etpConst['keywords'].add(keyword)
+        self.__merge_universal_keywords(data)
 
         cache_obj['data'] = data
-        self.__mtime_cache[cache_key] = cache_obj
+        self.__set_mtime_cache(cache_key, cache_obj)
         return data
 
+    def __merge_universal_keywords(self, data):
+        """
+        Merge universal keywords parsed by _keywords_parser() into
+        etpConst['keywords'].
+        """
+        etpConst['keywords'].clear()
+        etpConst['keywords'].update(etpSys['keywords'])
+        for keyword in data['universal']:
+            etpConst['keywords'].add(keyword)
 
     def _unmask_parser(self):
         """
@@ -1485,18 +1612,15 @@ class SystemSettings(Singleton, EntropyPluginStore):
         """
         hw_hash_file = self.__setting_files['hw_hash']
         root = etpConst['systemroot']
-        try:
-            mtime = os.path.getmtime(hw_hash_file)
-        except (OSError, IOError):
-            mtime = 0.0
+        signature = self.__file_signature(hw_hash_file)
 
         cache_key = (root, hw_hash_file)
         cache_obj = self.__mtime_cache.get(cache_key)
         if cache_obj is not None:
-            if cache_obj['mtime'] == mtime:
+            if cache_obj['signature'] == signature:
                 return cache_obj['data']
 
-        cache_obj = {'mtime': mtime,}
+        cache_obj = {'signature': signature,}
 
         enc = etpConst['conf_encoding']
         hash_data = None
@@ -1510,7 +1634,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
 
         if hash_data is not None:
             cache_obj['data'] = hash_data
-            self.__mtime_cache[cache_key] = cache_obj
+            self.__set_mtime_cache(cache_key, cache_obj)
             return hash_data
 
         hash_file_dir = os.path.dirname(hw_hash_file)
@@ -1529,7 +1653,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
 
             if sts is not None:
                 cache_obj['data'] = None
-                self.__mtime_cache[cache_key] = cache_obj
+                self.__set_mtime_cache(cache_key, cache_obj)
                 return None
 
             # expecting ascii cruft, don't worry about hash_data type
@@ -1538,7 +1662,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
                 hash_f.flush()
 
             cache_obj['data'] = hash_data
-            self.__mtime_cache[cache_key] = cache_obj
+            self.__set_mtime_cache(cache_key, cache_obj)
             return hash_data
 
         finally:
@@ -1579,18 +1703,15 @@ class SystemSettings(Singleton, EntropyPluginStore):
         """
         etp_conf = self.__setting_files['system']
         root = etpConst['systemroot']
-        try:
-            mtime = os.path.getmtime(etp_conf)
-        except (OSError, IOError):
-            mtime = 0.0
+        signature = self.__file_signature(etp_conf)
 
         cache_key = (root, etp_conf)
         cache_obj = self.__mtime_cache.get(cache_key)
         if cache_obj is not None:
-            if cache_obj['mtime'] == mtime:
+            if cache_obj['signature'] == signature:
                 return cache_obj['data']
 
-        cache_obj = {'mtime': mtime,}
+        cache_obj = {'signature': signature,}
 
         data = {
             'proxy': etpConst['proxy'].copy(),
@@ -1601,7 +1722,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
 
         if const_file_readable(etp_conf):
             cache_obj['data'] = data
-            self.__mtime_cache[cache_key] = cache_obj
+            self.__set_mtime_cache(cache_key, cache_obj, persistent = False)
             return data
 
         const_secure_config_file(etp_conf)
@@ -1688,7 +1809,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
             func(value)
 
         cache_obj['data'] = data
-        self.__mtime_cache[cache_key] = cache_obj
+        self.__set_mtime_cache(cache_key, cache_obj, persistent = False)
         return data
 
     def _analyze_client_repo_string(self, repostring, branch = None,
@@ -2057,36 +2178,18 @@ class SystemSettings(Singleton, EntropyPluginStore):
         disabled_candidate_inis = [x for x, y in skipped_files]
 
         for inis in (candidate_inis, disabled_candidate_inis):
-            ini_parser = RepositoryConfigParser(encoding = enc)
-            try:
-                ini_parser.read(inis)
-            except (IOError, OSError) as err:
-                sys.stderr.write("Cannot parse %s: %s\n" % (
-                        " ".join(inis),
-                        err))
-                ini_parser = None
-
-            if ini_parser:
+            ini_repositories = self.__ini_repositories_parser(inis)
+
+            if ini_repositories:
                 ini_conf_excluded = inis is disabled_candidate_inis
-                ini_repositories = ini_parser.repositories()
-                for ini_repository in ini_repositories:
+                for (ini_repository, ini_desc, ini_pkgs, ini_dbs,
+                     ini_enabled) in ini_repositories:
                     if ini_repository in repoids:
                         # double syntax is not supported.
                         continue
 
                     repoids.add(ini_repository)
-                    ini_dbs = ini_parser.repo(ini_repository)
-                    try:
-                        ini_pkgs = ini_parser.pkgs(ini_repository)
-                    except KeyError:
-                        ini_pkgs = []
-
-                    try:
-                        ini_desc = ini_parser.desc(ini_repository)
-                    except KeyError:
-                        ini_desc = _("No description")
-
-                    ini_excluded = not ini_parser.enabled(ini_repository)
+                    ini_excluded = not ini_enabled
                     ini_data = self._generate_repository_metadata(
                         ini_repository, ini_desc, ini_pkgs, ini_dbs,
                         data['product'], data['branch'])
@@ -2237,6 +2340,62 @@ class SystemSettings(Singleton, EntropyPluginStore):
 
         return data
 
+    def __ini_repositories_parser(self, ini_files):
+        """
+        Internal method. Parse the given .ini-like repositories.conf.d
+        files. The result is stored into the mtime cache, bound to the
+        signature of every file, and reused until any of them changes.
+
+        @param ini_files: list of .ini-like repository configuration files
+        @type ini_files: list
+        @return: list of (repository id, description, packages urls,
+            database urls, enabled) tuples, None in case of errors
+        @rtype: list or None
+        """
+        if not ini_files:
+            return []
+
+        root = etpConst['systemroot']
+        signature = tuple(
+            (x, self.__file_signature(x)) for x in ini_files)
+        cache_key = (root, tuple(ini_files))
+        cache_obj = self.__mtime_cache.get(cache_key)
+        if cache_obj is not None:
+            if cache_obj['signature'] == signature:
+                return cache_obj['data']
+
+        cache_obj = {'signature': signature,}
+
+        ini_parser = RepositoryConfigParser(
+            encoding = etpConst['conf_encoding'])
+        try:
+            ini_parser.read(ini_files)
+        except (IOError, OSError) as err:
+            sys.stderr.write("Cannot parse %s: %s\n" % (
+                    " ".join(ini_files),
+                    err))
+            return None
+
+        data = []
+        for ini_repository in ini_parser.repositories():
+            ini_dbs = ini_parser.repo(ini_repository)
+            try:
+                ini_pkgs = ini_parser.pkgs(ini_repository)
+            except KeyError:
+                ini_pkgs = []
+
+            try:
+                ini_desc = ini_parser.desc(ini_repository)
+            except KeyError:
+                ini_desc = _("No description")
+
+            data.append((ini_repository, ini_desc, ini_pkgs, ini_dbs,
+                         ini_parser.enabled(ini_repository)))
+
+        cache_obj['data'] = data
+        self.__set_mtime_cache(cache_key, cache_obj)
+        return data
+
     def _clear_repository_cache(self, repoid = None):
         """
         Internal method, go away!
@@ -2262,18 +2421,15 @@ class SystemSettings(Singleton, EntropyPluginStore):
         @rtype: list
         """
         root = etpConst['systemroot']
-        try:
-            mtime = os.path.getmtime(filepath)
-        except (OSError, IOError):
-            mtime = 0.0
+        signature = self.__file_signature(filepath)
 
         cache_key = (root, filepath)
         cache_obj = self.__mtime_cache.get(cache_key)
         if cache_obj is not None:
-            if cache_obj['mtime'] == mtime:
+            if cache_obj['signature'] == signature:
                 return SystemSettings.CachingList(cache_obj['data'])
 
-        cache_obj = {'mtime': mtime,}
+        cache_obj = {'signature': signature,}
 
         enc = etpConst['conf_encoding']
         lines = []
@@ -2297,7 +2453,7 @@ class SystemSettings(Singleton, EntropyPluginStore):
         # do not cache CachingList, because it contains cache that
         # shouldn't survive a clear()
         cache_obj['data'] = lines
-        self.__mtime_cache[cache_key] = cache_obj
+        self.__set_mtime_cache(cache_key, cache_obj)
         return data
 
     def __remove_repo_cache(self, repoid = None):
@@ -834,6 +834,28 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
                     "[add_package_hook] %s: status: %s" % (
                         plug_inst.get_id(), exec_rc,))
 
+    def addPackagesBulk(self, packages, formatted_content = False):
+        """
+        Add many packages to this Entropy repository at once, this is
+        meant to be used when (re)building a repository from scratch.
+        Subclasses can speed it up, for example by dropping the indexes
+        and recreating them at the end. Since indexes may not be available
+        while packages are added, providing identifiers of packages that
+        are already in the repository is going to be slow.
+        Changes are not committed.
+
+        @param packages: iterable of (package_id, pkg_data) tuples, where
+            package_id can be None, see I{addPackage()}
+        @type packages: iterable
+        @keyword formatted_content: see I{addPackage()}
+        @type formatted_content: bool
+        @return: list of new package identifiers, in the same order
+        @rtype: list
+        """
+        return [self.addPackage(pkg_data, package_id = package_id,
+                    formatted_content = formatted_content)
+                for package_id, pkg_data in packages]
+
     def removePackage(self, package_id, from_add_package = False):
         """
         Remove package from this Entropy repository using it's identifier
@@ -4210,30 +4232,34 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
 
             self.removePackage(package_id)
 
-        maxcount = len(added_ids)
-        mycount = 0
-        for package_id in added_ids:
-            mycount += 1
-            mytxt = "%s: %s" % (
-                red(_("Adding entry")),
-                blue(str(dbconn.retrieveAtom(package_id))),
-            )
-            self.output(
-                mytxt,
-                importance = 0,
-                level = "info",
-                header = output_header,
-                back = True,
-                count = (mycount, maxcount)
-            )
-            mydata = dbconn.getPackageData(package_id, get_content = True,
-                content_insert_formatted = True)
-            self.addPackage(
-                mydata,
-                revision = mydata['revision'],
-                package_id = package_id,
-                formatted_content = True
-            )
+        def _added_packages():
+            maxcount = len(added_ids)
+            mycount = 0
+            for package_id in added_ids:
+                mycount += 1
+                mytxt = "%s: %s" % (
+                    red(_("Adding entry")),
+                    blue(str(dbconn.retrieveAtom(package_id))),
+                )
+                self.output(
+                    mytxt,
+                    importance = 0,
+                    level = "info",
+                    header = output_header,
+                    back = True,
+                    count = (mycount, maxcount)
+                )
+                mydata = dbconn.getPackageData(package_id,
+                    get_content = True, content_insert_formatted = True)
+                yield package_id, mydata
+
+        if len(added_ids) > align_limit:
+            # forced, big alignment, rebuilding indexes pays off
+            self.addPackagesBulk(_added_packages(), formatted_content = True)
+        else:
+            for package_id, mydata in _added_packages():
+                self.addPackage(mydata, package_id = package_id,
+                    formatted_content = True)
 
         # do some cleanups
         self.clean()
@@ -4275,6 +4301,47 @@ class EntropyRepositoryBase(TextInterface, EntropyRepositoryPluginStore):
         """
         raise NotImplementedError()
 
+    def exportRepositoryDelta(self, old_db, deltafile):
+        """
+        Export the row-level changes required to turn the given (older)
+        repository database into this one. Rows are compared as a whole,
+        the resulting delta contains the DELETE statements of the rows
+        that disappeared followed by the INSERT statements of the new ones.
+
+        @param old_db: older repository database file path
+        @type old_db: string
+        @param deltafile: delta file object to write to
+        @type deltafile: file object (hint: open())
+        @return: True, if the delta has been written, False if the two
+            repositories cannot be compared (different schema)
+        @rtype: bool
+        @raise AttributeError: if given path is invalid
+        """
+        raise NotImplementedError()
+
+    def importRepositoryDelta(self, deltafile):
+        """
+        Apply a delta generated by exportRepositoryDelta() to this
+        repository. The whole delta is applied in a single transaction,
+        use dataChecksum() to verify the outcome.
+
+        @param deltafile: delta file object to read from
+        @type deltafile: file object (hint: open())
+        """
+        raise NotImplementedError()
+
+    def dataChecksum(self):
+        """
+        Get a checksum of the raw content of every table of this
+        repository. Unlike checksum(), the result only depends on the
+        stored rows and it is suitable to verify that two repository
+        databases contain exactly the same data.
+
+        @return: repository data checksum
+        @rtype: string
+        """
+        raise NotImplementedError()
+
     def checksum(self, do_order = False, strict = True,
                  include_signatures = False, include_dependencies = False):
         """
@@ -607,6 +607,22 @@ class EntropySQLRepository(EntropyRepositoryBase):
 
     _MAIN_THREAD = _get_main_thread()
 
+    # Reference tables kept in memory by addPackagesBulk(),
+    # table name -> (identifier column, value columns).
+    _BULK_REFERENCE_TABLES = {
+        "categories": ("idcategory", ("category",)),
+        "licenses": ("idlicense", ("license",)),
+        "flags": ("idflags", ("chost", "cflags", "cxxflags")),
+        "configprotectreference": ("idprotect", ("protect",)),
+        "sourcesreference": ("idsource", ("source",)),
+        "dependenciesreference": ("iddependency", ("dependency",)),
+        "keywordsreference": ("idkeyword", ("keywordname",)),
+        "useflagsreference": ("idflag", ("flagname",)),
+        "neededreference": ("idneeded", ("library",)),
+    }
+    # Reference tables not available with _baseinfo_extrainfo_2010.
+    _BULK_REFERENCE_TABLES_2010 = ("categories", "licenses", "flags")
+
     # Generic repository name to use when none is given.
     GENERIC_NAME = "__generic__"
 
@@ -627,6 +643,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if name is None:
             name = self.GENERIC_NAME
         self._live_cacher = EntropyRepositoryCacher()
+        self._bulk_references = None
 
         EntropyRepositoryBase.__init__(self, read_only, xcache,
                                        temporary, name)
@@ -1054,6 +1071,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO flags VALUES (NULL,?,?,?)
         """, (chost, cflags, cxxflags,))
+        self._setBulkReference(
+            "flags", (chost, cflags, cxxflags), cur.lastrowid)
         return cur.lastrowid
 
     def _areCompileFlagsAvailable(self, chost, cflags, cxxflags):
@@ -1070,6 +1089,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: availability (True if available)
         @rtype: bool
         """
+        bulk_id = self._getBulkReference("flags", (chost, cflags, cxxflags))
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idflags FROM flags WHERE chost = (?)
         AND cflags = (?) AND cxxflags = (?) LIMIT 1
@@ -1097,6 +1119,10 @@ class EntropySQLRepository(EntropyRepositoryBase):
         if not entropy.tools.is_valid_string(pkglicense):
             pkglicense = ' '
 
+        bulk_id = self._getBulkReference("licenses", pkglicense)
+        if bulk_id is not None:
+            return bulk_id
+
         cur = self._cursor().execute("""
         SELECT idlicense FROM licenses WHERE license = (?) LIMIT 1
         """, (pkglicense,))
@@ -1123,6 +1149,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO licenses VALUES (NULL,?)
         """, (pkglicense,))
+        self._setBulkReference("licenses", pkglicense, cur.lastrowid)
         return cur.lastrowid
 
     def _isCategoryAvailable(self, category):
@@ -1135,6 +1162,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: availability (True if available)
         @rtype: bool
         """
+        bulk_id = self._getBulkReference("categories", category)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idcategory FROM categories WHERE category = (?) LIMIT 1
         """, (category,))
@@ -1158,6 +1188,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO categories VALUES (NULL,?)
         """, (category,))
+        self._setBulkReference("categories", category, cur.lastrowid)
         return cur.lastrowid
 
     def _addPackage(self, pkg_data, revision = -1, package_id = None,
@@ -1401,6 +1432,96 @@ class EntropySQLRepository(EntropyRepositoryBase):
             self._connection().rollback()
             raise
 
+    def addPackagesBulk(self, packages, formatted_content = False):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Indexes are dropped during the whole operation and recreated
+        at the end, reference tables identifiers (categories, licenses,
+        USE flags, keywords, dependencies, etc) are kept in memory, so
+        that no SELECT is required to resolve them.
+        """
+        indexing = self._indexing
+        if indexing:
+            self.dropAllIndexes()
+
+        self._bulk_references = self._loadBulkReferences()
+        try:
+            package_ids = []
+            for package_id, pkg_data in packages:
+                package_ids.append(
+                    self.addPackage(
+                        pkg_data, package_id = package_id,
+                        formatted_content = formatted_content))
+            return package_ids
+        finally:
+            self._bulk_references = None
+            if indexing:
+                self.createAllIndexes()
+            self.clearCache()
+
+    def _loadBulkReferences(self):
+        """
+        Load the reference tables used by addPackagesBulk() into memory.
+
+        @return: a dictionary composed by table name as key and
+            a value -> identifier map as value
+        @rtype: dict
+        """
+        tables = list(self._BULK_REFERENCE_TABLES.keys())
+        if self._isBaseinfoExtrainfo2010():
+            tables = [x for x in tables if x not in \
+                          self._BULK_REFERENCE_TABLES_2010]
+
+        references = {}
+        for table in tables:
+            id_column, columns = self._BULK_REFERENCE_TABLES[table]
+            cur = self._cursor().execute("""
+            SELECT %s, %s FROM %s
+            """ % (id_column, ", ".join(columns), table,))
+
+            refs = references.setdefault(table, {})
+            if len(columns) == 1:
+                for row in cur:
+                    refs[row[1]] = row[0]
+            else:
+                for row in cur:
+                    refs[tuple(row[1:])] = row[0]
+        return references
+
+    def _getBulkReference(self, table, value):
+        """
+        Return the in-memory identifier of a reference table value,
+        only available during addPackagesBulk().
+
+        @param table: reference table name
+        @type table: string
+        @param value: reference value (a tuple for multi-column tables)
+        @type value: string or tuple
+        @return: the identifier, -1 if not found or None if
+            addPackagesBulk() is not running
+        @rtype: int or None
+        """
+        references = self._bulk_references
+        if references is None:
+            return None
+        return references[table].get(value, -1)
+
+    def _setBulkReference(self, table, value, ref_id):
+        """
+        Store a newly added reference table value identifier, if
+        addPackagesBulk() is running.
+
+        @param table: reference table name
+        @type table: string
+        @param value: reference value (a tuple for multi-column tables)
+        @type value: string or tuple
+        @param ref_id: the reference identifier
+        @type ref_id: int
+        """
+        references = self._bulk_references
+        if references is not None:
+            references[table][value] = ref_id
+
     def removePackage(self, package_id, from_add_package = False):
         """
         Reimplemented from EntropyRepositoryBase.
@@ -1466,6 +1587,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO configprotectreference VALUES (NULL, ?)
         """, (protect,))
+        self._setBulkReference(
+            "configprotectreference", protect, cur.lastrowid)
         return cur.lastrowid
 
     def _addSource(self, source):
@@ -1481,6 +1604,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO sourcesreference VALUES (NULL, ?)
         """, (source,))
+        self._setBulkReference("sourcesreference", source, cur.lastrowid)
         return cur.lastrowid
 
     def _addDependency(self, dependency):
@@ -1496,6 +1620,8 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO dependenciesreference VALUES (NULL, ?)
         """, (dependency,))
+        self._setBulkReference(
+            "dependenciesreference", dependency, cur.lastrowid)
         return cur.lastrowid
 
     def _addKeyword(self, keyword):
@@ -1511,6 +1637,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO keywordsreference VALUES (NULL, ?)
         """, (keyword,))
+        self._setBulkReference("keywordsreference", keyword, cur.lastrowid)
         return cur.lastrowid
 
     def _addUseflag(self, useflag):
@@ -1526,6 +1653,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO useflagsreference VALUES (NULL, ?)
         """, (useflag,))
+        self._setBulkReference("useflagsreference", useflag, cur.lastrowid)
         return cur.lastrowid
 
     def _addNeeded(self, needed):
@@ -1541,6 +1669,7 @@ class EntropySQLRepository(EntropyRepositoryBase):
         cur = self._cursor().execute("""
         INSERT INTO neededreference VALUES (NULL, ?)
         """, (needed,))
+        self._setBulkReference("neededreference", needed, cur.lastrowid)
         return cur.lastrowid
 
     def _setSystemPackage(self, package_id):
@@ -3833,6 +3962,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: availability (True if available)
         @rtype: bool
         """
+        bulk_id = self._getBulkReference("configprotectreference", protect)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idprotect FROM configprotectreference WHERE protect = ?
         LIMIT 1
@@ -3886,6 +4018,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: source package URL identifier (idsource) or -1 if not found
         @rtype: int
         """
+        bulk_id = self._getBulkReference("sourcesreference", source)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idsource FROM sourcesreference WHERE source = ? LIMIT 1
         """, (source,))
@@ -3904,6 +4039,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: dependency identifier (iddependency) or -1 if not found
         @rtype: int
         """
+        bulk_id = self._getBulkReference("dependenciesreference", dependency)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT iddependency FROM dependenciesreference WHERE dependency = ?
         LIMIT 1
@@ -3923,6 +4061,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: keyword identifier (idkeyword) or -1 if not found
         @rtype: int
         """
+        bulk_id = self._getBulkReference("keywordsreference", keyword)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idkeyword FROM keywordsreference WHERE keywordname = ? LIMIT 1
         """, (keyword,))
@@ -3941,6 +4082,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         @return: USE flag identifier or -1 if not found
         @rtype: int
         """
+        bulk_id = self._getBulkReference("useflagsreference", useflag)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idflag FROM useflagsreference WHERE flagname = ? LIMIT 1
         """, (useflag,))
@@ -3953,6 +4097,9 @@ class EntropySQLRepository(EntropyRepositoryBase):
         """
         Reimplemented from EntropyRepositoryBase.
         """
+        bulk_id = self._getBulkReference("neededreference", needed)
+        if bulk_id is not None:
+            return bulk_id
         cur = self._cursor().execute("""
         SELECT idneeded FROM neededreference WHERE library = ? LIMIT 1
         """, (needed,))
@@ -10,6 +10,7 @@
     the repository interface.
 
 """
+import errno
 import os
 import hashlib
 import time
@@ -18,7 +19,6 @@ try:
 except ImportError:
     import _thread as thread
 import threading
-import subprocess
 
 from entropy.const import etpConst, const_convert_to_unicode, \
     const_get_buffer, const_convert_to_rawstring, const_pid_exists, \
@@ -1641,11 +1641,20 @@ class EntropySQLiteRepository(EntropySQLRepository):
             raise SystemDatabaseError(
                 "sqlite3 reports database being corrupted")
 
+    # amount of dump data executed per transaction by importRepository()
+    _IMPORT_CHUNK_SIZE = 8 * 1024 * 1024
+
     @staticmethod
     def importRepository(dumpfile, db, data = None):
         """
         Reimplemented from EntropyRepositoryBase.
-        @todo: remove /usr/bin/sqlite3 dependency
+        The dump is parsed incrementally and executed in-process into
+        a temporary database file (without journal and fsync), in large
+        transactions. Index creation is deferred after the data load.
+        If data contains an "opener" callable (like bz2.BZ2File), it is
+        used to open compressed dumps. If data contains a "progress"
+        callable, it is called with the amount of bytes read and the
+        dump size (None if the dump is compressed).
         """
         dbfile = os.path.realpath(db)
         tmp_dbfile = dbfile + ".import_repository"
@@ -1654,27 +1663,133 @@ class EntropySQLiteRepository(EntropySQLRepository):
             raise AttributeError("dbfile value is invalid")
         if not entropy.tools.is_valid_path_string(dumpfile):
             raise AttributeError("dumpfile value is invalid")
-        with open(dumpfile, "rb") as in_f:
+
+        progress = None
+        opener = open
+        if data is not None:
+            progress = data.get("progress")
+            opener = data.get("opener", open)
+
+        try:
+            os.remove(tmp_dbfile)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise
+
+        sqlite = EntropySQLiteRepository.ModuleProxy.get()
+        chunk_size = EntropySQLiteRepository._IMPORT_CHUNK_SIZE
+        transaction_sts = ("BEGIN", "COMMIT", "END", "ROLLBACK")
+        index_sts = ("CREATE INDEX", "CREATE UNIQUE INDEX")
+
+        rc = 0
+        conn = sqlite.connect(tmp_dbfile, isolation_level = None)
+        try:
+            conn.execute("PRAGMA journal_mode = OFF").fetchall()
+            conn.execute("PRAGMA synchronous = OFF").fetchall()
+
+            def _flush(statements):
+                conn.executescript(
+                    "BEGIN TRANSACTION;\n%sCOMMIT;\n" % (
+                        "".join(statements),))
+
+            dump_size = None
+            if opener is open:
+                dump_size = os.path.getsize(dumpfile)
+            read_size = 0
+            chunk = []
+            chunk_len = 0
+            indexes = []
+            statement = const_convert_to_unicode("")
+
+            in_f = opener(dumpfile, "rb")
             try:
-                proc = subprocess.Popen(("/usr/bin/sqlite3", tmp_dbfile,),
-                    bufsize = -1, stdin = in_f)
+                for line in in_f:
+                    read_size += len(line)
+                    # quoted values can contain newlines
+                    statement += const_convert_to_unicode(line)
+                    if not sqlite.complete_statement(statement):
+                        continue
+
+                    sql = statement.lstrip()
+                    statement = const_convert_to_unicode("")
+                    head = sql[:20].upper()
+                    if head.startswith(transaction_sts):
+                        continue
+                    if head.startswith(index_sts):
+                        indexes.append(sql)
+                        continue
+
+                    chunk.append(sql)
+                    chunk_len += len(sql)
+                    if chunk_len >= chunk_size:
+                        _flush(chunk)
+                        chunk = []
+                        chunk_len = 0
+                        if progress is not None:
+                            progress(read_size, dump_size)
+            finally:
+                in_f.close()
+
+            if statement.strip():
+                raise sqlite.DatabaseError("incomplete repository dump")
+
+            _flush(chunk + indexes)
+            if progress is not None:
+                progress(read_size, dump_size)
+
+        except (sqlite.Error, IOError, OSError, EOFError,
+                UnicodeDecodeError) as err:
+            const_debug_write(__name__,
+                "importRepository: cannot import %s: %s" % (
+                    dumpfile, repr(err)))
+            rc = 1
+        finally:
+            conn.close()
+
+        if rc == 0:
+            os.rename(tmp_dbfile, dbfile)
+        else:
+            try:
+                os.remove(tmp_dbfile)
             except OSError:
-                # ouch ! wtf!
-                return 1
-            rc = proc.wait()
-            if rc == 0:
-                os.rename(tmp_dbfile, dbfile)
+                pass
         return rc
 
+    # rows per INSERT statement written by exportRepository(), statements
+    # are kept well below the default SQLITE_MAX_SQL_LENGTH and
+    # SQLITE_MAX_COMPOUND_SELECT limits
+    _EXPORT_BATCH_ROWS = 256
+    _EXPORT_BATCH_SIZE = 256 * 1024
+    # amount of dump data buffered before writing to the dump file
+    _EXPORT_BUFFER_SIZE = 1024 * 1024
+
     def exportRepository(self, dumpfile):
         """
         Reimplemented from EntropyRepositoryBase.
+        Table rows are exported as multi-row INSERT statements and
+        data is written to dumpfile in large blocks, which is
+        considerably faster with compressing file objects.
         """
         exclude_tables = []
         gentle_with_tables = True
         toraw = const_convert_to_rawstring
+        batch_rows = self._EXPORT_BATCH_ROWS
+        batch_size = self._EXPORT_BATCH_SIZE
+        buffer_size = self._EXPORT_BUFFER_SIZE
+        out_buffer = []
+        out_buffer_len = [0]
 
-        dumpfile.write(toraw("BEGIN TRANSACTION;\n"))
+        def _write(data, flush = False):
+            if data:
+                out_buffer.append(toraw(data))
+                out_buffer_len[0] += len(data)
+            if flush or out_buffer_len[0] >= buffer_size:
+                dumpfile.write(const_convert_to_rawstring("").join(
+                    out_buffer))
+                del out_buffer[:]
+                out_buffer_len[0] = 0
+
+        _write("BEGIN TRANSACTION;\n")
         cur = self._cursor().execute("""
         SELECT name, type, sql FROM sqlite_master
         WHERE sql NOT NULL AND type=='table'
@@ -1696,29 +1811,39 @@ class EntropySQLiteRepository(EntropySQLRepository):
             t_cmd = "CREATE TABLE"
             if sql.startswith(t_cmd) and gentle_with_tables:
                 sql = "CREATE TABLE IF NOT EXISTS"+sql[len(t_cmd):]
-            dumpfile.write(toraw("%s;\n" % sql))
+            _write("%s;\n" % sql)
 
             if name in exclude_tables:
                 continue
 
-            cur2 = self._cursor().execute("PRAGMA table_info('%s')" % name)
-            cols = [r[1] for r in cur2.fetchall()]
-            q = "SELECT 'INSERT INTO \"%(tbl_name)s\" VALUES("
-            q += ", ".join(["'||quote(" + x + ")||'" for x in cols])
-            q += ")' FROM '%(tbl_name)s'"
+            cols = self._listTableColumns(name)
+            q = "SELECT %s FROM '%s'" % (
+                " || ',' || ".join(["quote(\"%s\")" % (x,) for x in cols]),
+                name)
+            insert = "INSERT INTO \"%s\" VALUES(" % (name,)
             self._connection().unicode()
-            cur3 = self._cursor().execute(q % {'tbl_name': name})
+            cur3 = self._cursor().execute(q)
+
+            rows = []
+            rows_len = 0
             for row in cur3:
-                dumpfile.write(toraw("%s;\n" % (row[0],)))
+                rows.append(row[0])
+                rows_len += len(row[0])
+                if len(rows) >= batch_rows or rows_len >= batch_size:
+                    _write("%s%s);\n" % (insert, "),(".join(rows)))
+                    rows = []
+                    rows_len = 0
+            if rows:
+                _write("%s%s);\n" % (insert, "),(".join(rows)))
 
         cur4 = self._cursor().execute("""
         SELECT name, type, sql FROM sqlite_master
         WHERE sql NOT NULL AND type!='table' AND type!='meta'
         """)
         for name, x, sql in cur4.fetchall():
-            dumpfile.write(toraw("%s;\n" % sql))
+            _write("%s;\n" % sql)
 
-        dumpfile.write(toraw("COMMIT;\n"))
+        _write("COMMIT;\n", flush = True)
         if hasattr(dumpfile, 'flush'):
             dumpfile.flush()
 
@@ -1730,6 +1855,137 @@ class EntropySQLiteRepository(EntropySQLRepository):
         )
         # remember to close the file
 
+    def _listTableColumns(self, table, db_name = "main"):
+        """
+        List the columns of the given table, in their declaration order.
+        """
+        cur = self._cursor().execute(
+            "PRAGMA %s.table_info('%s')" % (db_name, table))
+        return [x[1] for x in cur.fetchall()]
+
+    def exportRepositoryDelta(self, old_db, deltafile):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Rows are grouped (with their multiplicity) and compared through
+        an ATTACHed copy of the old database, so this method must not be
+        called while a transaction is in progress.
+        """
+        old_db = os.path.realpath(old_db)
+        if not entropy.tools.is_valid_path_string(old_db):
+            raise AttributeError("old_db value is invalid")
+        toraw = const_convert_to_rawstring
+
+        tables_sql = """
+        SELECT name, sql FROM %s.sqlite_master
+        WHERE type = "table" AND NOT name LIKE "sqlite_%%"
+        """
+        cur = self._cursor()
+        cur.execute("ATTACH DATABASE ? AS delta_old", (old_db,))
+        try:
+            tables = dict(cur.execute(tables_sql % ("main",)).fetchall())
+            old_tables = dict(
+                cur.execute(tables_sql % ("delta_old",)).fetchall())
+            if tables != old_tables:
+                # schema changed, a full download is required
+                return False
+
+            self._connection().unicode()
+            table_columns = {}
+            for name in tables:
+                table_columns[name] = self._listTableColumns(name)
+
+            def _changed_rows(name, from_db, to_db):
+                cols = ", ".join(['"%s"' % (x,) for x in table_columns[name]])
+                grouped = "SELECT %s, COUNT(*) AS delta_count " \
+                    "FROM %%s.\"%s\" GROUP BY %s" % (cols, name, cols)
+                return "(%s EXCEPT %s)" % (
+                    grouped % (to_db,), grouped % (from_db,))
+
+            # DELETEs first, a row whose multiplicity changed is
+            # deleted entirely and inserted again.
+            for name in sorted(tables):
+                where = " || ' AND ' || ".join([
+                    "(CASE WHEN \"%(col)s\" IS NULL "
+                    "THEN '\"%(col)s\" IS NULL' "
+                    "ELSE '\"%(col)s\" = ' || quote(\"%(col)s\") END)" % {
+                        'col': x, } for x in table_columns[name]])
+                q = "SELECT 'DELETE FROM \"%s\" WHERE ' || %s FROM %s" % (
+                    name, where, _changed_rows(name, "main", "delta_old"))
+                for row in cur.execute(q):
+                    deltafile.write(toraw("%s;\n" % (row[0],)))
+
+            for name in sorted(tables):
+                values = " || ', ' || ".join([
+                    "quote(\"%s\")" % (x,) for x in table_columns[name]])
+                q = "SELECT 'INSERT INTO \"%s\" VALUES(' || %s || ')', " \
+                    "delta_count FROM %s" % (
+                        name, values,
+                        _changed_rows(name, "delta_old", "main"))
+                for row, count in cur.execute(q):
+                    statement = toraw("%s;\n" % (row,))
+                    for _count in range(count):
+                        deltafile.write(statement)
+
+        finally:
+            cur.execute("DETACH DATABASE delta_old")
+
+        if hasattr(deltafile, 'flush'):
+            deltafile.flush()
+        return True
+
+    def importRepositoryDelta(self, deltafile):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Foreign keys are disabled while applying the delta, since it
+        already contains every row change, ON DELETE CASCADE would
+        drop rows that are not going to be inserted back.
+        """
+        cur = self._cursor()
+        cur.execute("pragma foreign_keys = 0").fetchall()
+        try:
+            statement = const_convert_to_unicode("")
+            for line in deltafile:
+                # quoted values can contain newlines
+                statement += const_convert_to_unicode(line)
+                if not self._sqlite.complete_statement(statement):
+                    continue
+                cur.execute(statement)
+                statement = const_convert_to_unicode("")
+
+            if statement.strip():
+                raise DatabaseError("incomplete repository delta")
+            self.commit(force = True)
+
+        except:
+            self.rollback()
+            raise
+        finally:
+            cur.execute("pragma foreign_keys = 1").fetchall()
+            self.clearCache()
+
+    def dataChecksum(self):
+        """
+        Reimplemented from EntropyRepositoryBase.
+        Rows are hashed through their SQL representation, this
+        guarantees platform and interpreter independent results.
+        """
+        toraw = const_convert_to_rawstring
+        m = hashlib.sha1()
+        self._connection().unicode()
+        cur = self._cursor()
+
+        for name in sorted(self._listAllTables()):
+            columns = self._listTableColumns(name)
+            cols = ", ".join(['"%s"' % (x,) for x in columns])
+            values = " || ', ' || ".join([
+                "quote(\"%s\")" % (x,) for x in columns])
+            m.update(toraw("%s(%s)\n" % (name, cols)))
+            q = "SELECT %s FROM \"%s\" ORDER BY %s" % (values, name, cols)
+            for row in cur.execute(q):
+                m.update(toraw("%s\n" % (row[0],)))
+
+        return m.hexdigest()
+
     def _listAllTables(self):
         """
         List all available tables in this repository database.
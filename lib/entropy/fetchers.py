@@ -924,7 +924,8 @@ class MultipleUrlFetcher(TextInterface):
     def __init__(self, url_path_list, checksum = True,
             show_speed = True, resume = True,
             abort_check_func = None, disallow_redirect = False,
-            url_fetcher_class = None, timeout = None):
+            url_fetcher_class = None, timeout = None,
+            show_files_info = True):
         """
         @param url_path_list: list of tuples composed by url and
             path to save, for eg. [(url,path_to_save,),...]
@@ -950,9 +951,12 @@ class MultipleUrlFetcher(TextInterface):
         @keyword timeout: custom request timeout value (in seconds), if None
             the value is read from Entropy configuration files.
         @type timeout: int
+        @keyword show_files_info: print the list of files being downloaded
+        @type show_files_info: bool
         """
         self.__system_settings = SystemSettings()
         self.__url_path_list = url_path_list
+        self.__show_files_info = show_files_info
         self.__resume = resume
         self.__checksum = checksum
         self.__show_speed = show_speed
@@ -1064,7 +1068,8 @@ class MultipleUrlFetcher(TextInterface):
             t.start()
 
         self._push_progress_to_output(force = True)
-        self.__show_download_files_info()
+        if self.__show_files_info:
+            self.__show_download_files_info()
         self.__show_progress = True
 
         # wait until all the threads are done
@@ -10,10 +10,11 @@
 
     Entropy Graph implementation.
     This module implements a Graph object and a topological sorting algorithm
-    based on Tarjan's.
+    based on Tarjan's. Sorting is done on integer indexed adjacency arrays,
+    IndexedGraph uses them directly and is meant for big dependency graphs.
 
 """
-from entropy.misc import Lifo
+from array import array
 
 class GraphNode(object):
 
@@ -215,6 +216,160 @@ class GraphArchSet(object):
         return frozenset(self.__endpoints)
 
 
+def _build_csr(successors):
+    """
+    Build a compressed adjacency representation (offsets, targets) out of
+    a list of successor id sequences, indexed by node id. Successors of
+    node "n" are stored in targets[offsets[n]:offsets[n + 1]].
+
+    @param successors: list of iterables of node ids
+    @type successors: list
+    @return: tuple composed by (offsets, targets) arrays
+    @rtype: tuple
+    """
+    offsets = array("l", [0]) * (len(successors) + 1)
+    targets = array("l")
+    for node_id, node_successors in enumerate(successors):
+        targets.extend(node_successors)
+        offsets[node_id + 1] = len(targets)
+    return offsets, targets
+
+
+def _strongly_connected_components(offsets, targets):
+    """
+    Find the strongly connected components of the graph stored in
+    (offsets, targets) form using an iterative version of Tarjan's
+    algorithm (no Python recursion, deep graphs are supported).
+
+    @param offsets: adjacency offsets array, see _build_csr()
+    @type offsets: array.array
+    @param targets: adjacency targets array, see _build_csr()
+    @type targets: array.array
+    @return: tuple composed by (list of components (lists of node ids),
+        array mapping node id to component id)
+    @rtype: tuple
+    """
+    node_count = len(offsets) - 1
+    index = array("l", [-1]) * node_count
+    low = array("l", [0]) * node_count
+    component_of = array("l", [-1]) * node_count
+    on_stack = bytearray(node_count)
+    stack = []
+    components = []
+    counter = 0
+
+    for root in range(node_count):
+        if index[root] != -1:
+            continue
+
+        index[root] = counter
+        low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = 1
+        # work stacks: visited node and next successor position
+        work_nodes = [root]
+        work_pos = [offsets[root]]
+
+        while work_nodes:
+            node = work_nodes[-1]
+            pos = work_pos[-1]
+
+            if pos < offsets[node + 1]:
+                work_pos[-1] = pos + 1
+                successor = targets[pos]
+                if index[successor] == -1:
+                    index[successor] = counter
+                    low[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack[successor] = 1
+                    work_nodes.append(successor)
+                    work_pos.append(offsets[successor])
+                elif on_stack[successor] and index[successor] < low[node]:
+                    low[node] = index[successor]
+                continue
+
+            work_nodes.pop()
+            work_pos.pop()
+
+            if low[node] == index[node]:
+                component_id = len(components)
+                component = []
+                while True:
+                    item = stack.pop()
+                    on_stack[item] = 0
+                    component_of[item] = component_id
+                    component.append(item)
+                    if item == node:
+                        break
+                components.append(component)
+
+            if work_nodes:
+                parent = work_nodes[-1]
+                if low[node] < low[parent]:
+                    low[parent] = low[node]
+
+    return components, component_of
+
+
+def _sort_components(offsets, targets, components, component_of):
+    """
+    Topologically sort the graph of strongly connected components using
+    Kahn's algorithm. Components no other component depends on come first.
+
+    @param offsets: adjacency offsets array, see _build_csr()
+    @type offsets: array.array
+    @param targets: adjacency targets array, see _build_csr()
+    @type targets: array.array
+    @param components: list of components, see
+        _strongly_connected_components()
+    @type components: list
+    @param component_of: node id to component id map, see
+        _strongly_connected_components()
+    @type component_of: array.array
+    @return: list of component ids in dependency order
+    @rtype: list
+    """
+    in_degree = array("l", [0]) * len(components)
+    for component_id, component in enumerate(components):
+        for node in component:
+            for pos in range(offsets[node], offsets[node + 1]):
+                successor_c = component_of[targets[pos]]
+                if successor_c != component_id:
+                    in_degree[successor_c] += 1
+
+    ready_stack = [x for x in range(len(components)) if in_degree[x] == 0]
+    result = []
+    while ready_stack:
+        component_id = ready_stack.pop()
+        result.append(component_id)
+        for node in components[component_id]:
+            for pos in range(offsets[node], offsets[node + 1]):
+                successor_c = component_of[targets[pos]]
+                if successor_c == component_id:
+                    continue
+                in_degree[successor_c] -= 1
+                if in_degree[successor_c] == 0:
+                    ready_stack.append(successor_c)
+
+    return result
+
+
+def _solve_csr(offsets, targets):
+    """
+    Identify the strongly connected components of the graph stored
+    in (offsets, targets) form and sort them topologically.
+
+    @return: list of components (lists of node ids) in dependency order
+    @rtype: list
+    """
+    components, component_of = _strongly_connected_components(
+        offsets, targets)
+    return [components[x] for x in _sort_components(
+            offsets, targets, components, component_of)]
+
+
 class TopologicalSorter(object):
 
     """
@@ -231,80 +386,6 @@ class TopologicalSorter(object):
         """
         object.__init__(self)
         self.__adjacency_map = adjacency_map
-        self.__stack = Lifo()
-
-    def __topological_sort_visit_node(self, node, low, result):
-        """
-        Internal method, visits a node ad push to stack.
-        """
-        if node in low:
-            return
-
-        num = len(low)
-        low[node] = num
-        stack_pos = len(self.__stack)
-        self.__stack.push(node)
-
-        for successor in self.__adjacency_map[node]:
-            self.__topological_sort_visit_node(successor, low, result)
-            low[node] = min(low[node], low[successor])
-
-        if num == low[node]:
-            component = tuple()
-            while len(self.__stack) > stack_pos:
-                component += (self.__stack.pop(),)
-            result.append(component)
-            for item in component:
-                low[item] = len(self.__adjacency_map)
-
-    def __strongly_connected_nodes(self):
-        """
-        Find the strongly connected nodes in a adjacency_map using
-        Tarjan's algorithm.
-
-        adjacency_map should be a dictionary mapping node names to
-        lists of successor nodes.
-        """
-        result = []
-        low = {}
-
-        for node in self.__adjacency_map:
-            self.__topological_sort_visit_node(node, low, result)
-
-        return result
-
-
-    def __topological_sort(self, graph):
-        """
-        Effectively executes topological sorting on given graph.
-        """
-
-        # initialize count map
-        count = dict((node, 0) for node in graph)
-
-        for node in graph:
-            for successor in graph[node]:
-                count[successor] += 1
-
-        ready_stack = Lifo()
-        for node in graph:
-            if count[node] == 0:
-                ready_stack.push(node)
-
-        dep_level = 1
-        result = {}
-        while ready_stack.is_filled():
-
-            node = ready_stack.pop()
-            result[dep_level] = node
-            dep_level += 1
-
-            for successor in graph[node]:
-                count[successor] -= 1
-                if count[successor] == 0:
-                    ready_stack.push(successor)
-
-        return result
 
     def get_stored_adjacency_map(self):
         """
@@ -323,26 +404,27 @@ class TopologicalSorter(object):
         @return: sorted graph representation
         @rtype: dict
         """
-        # clear stack
-        self.__stack.clear()
-
-        components = self.__strongly_connected_nodes()
-
-        node_component = {}
-        for component in components:
-            for node in component:
-                node_component[node] = component
+        nodes = list(self.__adjacency_map.keys())
+        node_ids = dict((node, node_id) for node_id, node in enumerate(nodes))
 
-        component_graph = {}
-        for node in self.__adjacency_map:
-            node_c = node_component[node]
-            obj = component_graph.setdefault(node_c, [])
+        successors = []
+        for node in nodes[:]:
+            node_successors = []
             for successor in self.__adjacency_map[node]:
-                successor_c = node_component[successor]
-                if node_c != successor_c:
-                    obj.append(successor_c)
-
-        return self.__topological_sort(component_graph)
+                successor_id = node_ids.get(successor)
+                if successor_id is None:
+                    successor_id = len(nodes)
+                    node_ids[successor] = successor_id
+                    nodes.append(successor)
+                node_successors.append(successor_id)
+            successors.append(node_successors)
+        # successors not listed as keys have no successors
+        successors.extend([] for x in range(len(nodes) - len(successors)))
+
+        offsets, targets = _build_csr(successors)
+        sorted_components = _solve_csr(offsets, targets)
+        return dict((dep_level, tuple(nodes[x] for x in component)) \
+            for dep_level, component in enumerate(sorted_components, 1))
 
 
 class Graph(object):
@@ -498,4 +580,117 @@ class Graph(object):
         return self.__graph
 
 
-__all__ = ["Graph"]
+class IndexedGraph(object):
+
+    """
+    Compact Graph implementation, API compatible with Graph for what
+    concerns add(), solve(), raw() and destroy(). Items (usually package
+    matches) are mapped to dense integer identifiers and dependencies
+    are stored as sets of identifiers, turned into adjacency arrays when
+    the graph is solved. No per-item objects are allocated, making it
+    suitable for graphs with several thousands of nodes.
+    Unlike Graph, get_adjacency_map() returns items, not GraphNode objects.
+    """
+
+    def __init__(self):
+        """
+        IndexedGraph constructor.
+        """
+        object.__init__(self)
+        self.__item_ids = {}
+        self.__items = []
+        self.__successors = []
+        self.__csr_cache = None
+
+    def destroy(self):
+        """
+        Cleanup any reference.
+        """
+        self.__item_ids.clear()
+        del self.__items[:]
+        del self.__successors[:]
+        self.__csr_cache = None
+
+    def __len__(self):
+        """
+        Return the number of items in the graph.
+        """
+        return len(self.__items)
+
+    def __contains__(self, item):
+        """
+        Return whether item is in the graph.
+        """
+        return item in self.__item_ids
+
+    def __item_id(self, item):
+        """
+        Return the integer identifier bound to item, allocating
+        a new one if not in the graph.
+        """
+        item_id = self.__item_ids.get(item)
+        if item_id is None:
+            item_id = len(self.__items)
+            self.__item_ids[item] = item_id
+            self.__items.append(item)
+            self.__successors.append(set())
+        return item_id
+
+    def add(self, item, dependency_items):
+        """
+        Add arbitrary (hashable) object to Graph, specifying its
+        dependencies.
+
+        @param item: Python object to be added to the graph
+        @type item: Python object
+        @param dependency_items: list of items which are dependencies of
+            the given item object
+        @type dependency_items: set
+        """
+        self.__csr_cache = None
+        successors = self.__successors[self.__item_id(item)]
+        for dep_item in dependency_items:
+            successors.add(self.__item_id(dep_item))
+
+    def get_adjacency_map(self):
+        """
+        Return an adjacency map given the current items in Graph.
+
+        @return: adjacency map (item -> set of dependency items)
+        @rtype: dict
+        """
+        items = self.__items
+        return dict((items[item_id], set(items[x] for x in successors)) \
+            for item_id, successors in enumerate(self.__successors))
+
+    def solve(self):
+        """
+        Serialize the graph and spit out a dependency order.
+        Data is returned in map form, where key represents the dependency
+        level and value a tuple of items at that dependency level.
+        Items part of dependency cycles share the same level.
+
+        @return: sorted graph representation
+        @rtype: dict
+        """
+        if self.__csr_cache is None:
+            self.__csr_cache = _build_csr(self.__successors)
+        offsets, targets = self.__csr_cache
+
+        items = self.__items
+        sorted_components = _solve_csr(offsets, targets)
+        return dict((dep_level, tuple(items[x] for x in component)) \
+            for dep_level, component in enumerate(sorted_components, 1))
+
+    def raw(self):
+        """
+        Return all items stored in the graph in raw form (list) without sorting
+        them.
+
+        @return: list of items added to Graph
+        @rtype: list
+        """
+        return self.__items[:]
+
+
+__all__ = ["Graph", "IndexedGraph"]
@@ -1386,6 +1386,215 @@ Name:    %s
                 f_out.flush()
             f_out.close()
 
+    def _create_light_repository(self, light_dbfile):
+        """
+        Create the light version of the repository (without content and
+        changelog metadata) at the given path. This is what Entropy
+        Clients get.
+        """
+        dbfile = self._entropy._get_local_repository_file(
+            self._repository_id)
+        shutil.copy2(dbfile, light_dbfile)
+        dbconn = self._entropy.open_generic_repository(
+            light_dbfile, indexing_override = False, xcache = False)
+        try:
+            dbconn.dropContent()
+            dbconn.dropChangelog()
+            dbconn.commit()
+        finally:
+            dbconn.close()
+
+    def _read_repository_delta_index(self, index_path):
+        """
+        Read the repository delta index file, returning a list of
+        (from revision, to revision, compression format, delta file name,
+        delta md5, repository data checksum) tuples.
+        """
+        entries = []
+        enc = etpConst['conf_encoding']
+        try:
+            with codecs.open(index_path, "r", encoding=enc) as index_f:
+                for line in index_f.readlines():
+                    entry = line.strip().split()
+                    if len(entry) != 6:
+                        continue
+                    try:
+                        entry[0], entry[1] = int(entry[0]), int(entry[1])
+                    except ValueError:
+                        continue
+                    entries.append(tuple(entry))
+        except (OSError, IOError) as err:
+            if err.errno != errno.ENOENT:
+                raise
+        return entries
+
+    def _update_repository_deltas(self, light_dbfile, upload_data, critical,
+                                  gpg_to_sign_files, cmethod):
+        """
+        Generate the delta between the previously published light
+        repository and the one at light_dbfile, then add the last
+        deltas and their index to the upload queue.
+
+        @param light_dbfile: light repository about to be published
+        @type light_dbfile: string
+        @param upload_data: upload data map, as returned by
+            _get_files_to_sync()
+        @type upload_data: dict
+        @param critical: list of files that must be uploaded
+        @type critical: list
+        @param gpg_to_sign_files: list of files that will be GPG signed
+        @type gpg_to_sign_files: list
+        @param cmethod: compression method tuple, see
+            etpConst['etpdatabasecompressclasses']
+        @type cmethod: tuple
+        """
+        plg_id = self._entropy.SYSTEM_SETTINGS_PLG_ID
+        srv_set = self._settings[plg_id]['server']
+        history = srv_set['database_delta_history']
+        db_format = srv_set['database_file_format']
+        enc = etpConst['conf_encoding']
+
+        repo_dir = self._entropy._get_local_repository_dir(
+            self._repository_id)
+        index_path = os.path.join(
+            repo_dir, etpConst['etpdatabasedeltaindexfile'])
+        snapshot_path = os.path.join(
+            repo_dir, etpConst['etpdatabasedeltasnapshotfile'])
+        snapshot_rev_path = snapshot_path + ".revision"
+
+        revision = self._entropy.local_repository_revision(
+            self._repository_id)
+        snapshot_revision = None
+        if os.path.isfile(snapshot_path):
+            try:
+                with codecs.open(snapshot_rev_path, "r",
+                                 encoding=enc) as rev_f:
+                    snapshot_revision = int(rev_f.readline().strip())
+            except (OSError, IOError, ValueError):
+                snapshot_revision = None
+
+        entries = self._read_repository_delta_index(index_path)
+        light_dbconn = self._entropy.open_generic_repository(
+            light_dbfile, indexing_override = False, xcache = False)
+        try:
+            checksum = light_dbconn.dataChecksum()
+
+            if snapshot_revision is not None and \
+                    snapshot_revision < revision:
+                delta_name = etpConst['etpdatabasedeltafile'] % (
+                    snapshot_revision, revision, db_format)
+                delta_path = os.path.join(repo_dir, delta_name)
+
+                self._entropy.output(
+                    "[repo:%s|%s] %s: %s" % (
+                        blue(self._repository_id),
+                        darkgreen(_("upload")),
+                        darkgreen(_("creating repository delta")),
+                        brown(delta_name),
+                    ),
+                    importance = 0,
+                    level = "info",
+                    header = darkgreen(" * ")
+                )
+
+                f_out = cmethod[0](delta_path, "wb")
+                try:
+                    generated = light_dbconn.exportRepositoryDelta(
+                        snapshot_path, f_out)
+                finally:
+                    f_out.close()
+
+                if generated:
+                    entries.append((snapshot_revision, revision, db_format,
+                        delta_name, entropy.tools.md5sum(delta_path),
+                        checksum))
+                else:
+                    # repository schema changed, clients must
+                    # download the whole repository
+                    os.remove(delta_path)
+                    entries = []
+
+            elif snapshot_revision == revision:
+                if entries and entries[-1][5] != checksum:
+                    # published again without a revision bump
+                    entries = []
+            else:
+                entries = []
+
+        finally:
+            light_dbconn.close()
+
+        # get rid of the old deltas
+        for entry in entries[:-history]:
+            try:
+                os.remove(os.path.join(repo_dir, entry[3]))
+            except OSError as err:
+                if err.errno != errno.ENOENT:
+                    raise
+        entries = entries[-history:]
+
+        tmp_index_path = index_path + ".tmp"
+        with codecs.open(tmp_index_path, "w", encoding=enc) as index_f:
+            for entry in entries:
+                index_f.write("%s\n" % (" ".join([str(x) for x in entry]),))
+            index_f.flush()
+        os.rename(tmp_index_path, index_path)
+
+        tmp_snapshot_path = snapshot_path + ".tmp"
+        shutil.copy2(light_dbfile, tmp_snapshot_path)
+        os.rename(tmp_snapshot_path, snapshot_path)
+        with codecs.open(snapshot_rev_path, "w", encoding=enc) as rev_f:
+            rev_f.write("%s\n" % (revision,))
+            rev_f.flush()
+
+        for entry in entries:
+            delta_path = os.path.join(repo_dir, entry[3])
+            upload_data['database_delta_%s' % (entry[3],)] = delta_path
+            critical.append(delta_path)
+        # "~" makes the index to be uploaded after the deltas
+        upload_data['~database_delta_index'] = index_path
+        critical.append(index_path)
+        gpg_to_sign_files.append(index_path)
+
+    def _get_extra_format_files_to_sync(self, cmethod, disabled_eapis):
+        """
+        Return the compressed repository files for an additional
+        compression format (see "database-extra-formats" in server.conf),
+        published together with those returned by _get_files_to_sync().
+        """
+        repo_dir = self._entropy._get_local_repository_dir(
+            self._repository_id)
+        data = {}
+        if 2 not in disabled_eapis:
+            data['dump_path_light'] = os.path.join(
+                repo_dir, etpConst[cmethod[5]])
+            data['dump_path_digest_light'] = os.path.join(
+                repo_dir, etpConst[cmethod[6]])
+        if 1 not in disabled_eapis:
+            data['compressed_database_path'] = os.path.join(
+                repo_dir, etpConst[cmethod[2]])
+            data['compressed_database_path_light'] = os.path.join(
+                repo_dir, etpConst[cmethod[7]])
+            data['compressed_database_path_digest'] = os.path.join(
+                repo_dir, etpConst[cmethod[2]] + \
+                    etpConst['packagesmd5fileext'])
+            data['compressed_database_path_digest_light'] = os.path.join(
+                repo_dir, etpConst[cmethod[8]])
+        return data
+
+    def _create_cformats_file(self, cformats_path, cformats):
+        """
+        Write the list of compression formats the repository is
+        published with. Entropy Clients read it to pick their
+        preferred one.
+        """
+        enc = etpConst['conf_encoding']
+        with codecs.open(cformats_path, "w", encoding=enc) as f_cf:
+            for cformat in cformats:
+                f_cf.write(cformat)
+                f_cf.write("\n")
+            f_cf.flush()
+
     def _create_upload_gpg_signatures(self, upload_data, to_sign_files):
         """
         This method creates .asc files for every path that is going to be
@@ -1484,6 +1693,20 @@ Name:    %s
         upload_data, critical, text_files, tmp_dirs, gpg_to_sign_files = \
             self._get_files_to_sync(cmethod, disabled_eapis = disabled_eapis)
 
+        # additional compression formats, the primary one is always
+        # published, so that older Entropy Clients keep working.
+        cformats = [db_format]
+        cmethods = [(db_format, cmethod, upload_data)]
+        for extra_format in srv_set['database_extra_file_formats']:
+            extra_cmethod = etpConst['etpdatabasecompressclasses'].get(
+                extra_format)
+            if extra_cmethod is None or extra_format in cformats:
+                continue
+            cformats.append(extra_format)
+            cmethods.append((extra_format, extra_cmethod,
+                self._get_extra_format_files_to_sync(
+                    extra_cmethod, disabled_eapis)))
+
         self._entropy.output(
             "[repo:%s|%s] %s" % (
                 blue(self._repository_id),
@@ -1524,6 +1747,7 @@ Name:    %s
 
         self._shrink_and_close(dbconn)
 
+        light_dbfile = None
         if 2 not in disabled_eapis:
             self._show_eapi2_upload_messages("~all~", database_path,
                 upload_data, cmethod)
@@ -1532,27 +1756,28 @@ Name:    %s
             eapi2_dbfile = self._entropy._get_local_repository_file(
                 self._repository_id)
             temp_eapi2_dbfile = eapi2_dbfile+".light_eapi2.tmp"
-            shutil.copy2(eapi2_dbfile, temp_eapi2_dbfile)
-            # open and remove content table
+            # remove content table
+            self._create_light_repository(temp_eapi2_dbfile)
             eapi2_tmp_dbconn = \
                 self._entropy.open_generic_repository(
                     temp_eapi2_dbfile, indexing_override = False,
                     xcache = False)
-            eapi2_tmp_dbconn.dropContent()
-            eapi2_tmp_dbconn.dropChangelog()
-            eapi2_tmp_dbconn.commit()
 
-            # opener = cmethod[0]
-            f_out = cmethod[0](upload_data['dump_path_light'], "wb")
             try:
-                eapi2_tmp_dbconn.exportRepository(f_out)
+                for c_format, c_method, c_data in cmethods:
+                    # opener = cmethod[0]
+                    f_out = c_method[0](c_data['dump_path_light'], "wb")
+                    try:
+                        eapi2_tmp_dbconn.exportRepository(f_out)
+                    finally:
+                        f_out.close()
+                    self._create_file_checksum(c_data['dump_path_light'],
+                        c_data['dump_path_digest_light'])
             finally:
-                f_out.close()
                 eapi2_tmp_dbconn.close()
 
-            os.remove(temp_eapi2_dbfile)
-            self._create_file_checksum(upload_data['dump_path_light'],
-                upload_data['dump_path_digest_light'])
+            # kept for the repository delta generation
+            light_dbfile = temp_eapi2_dbfile
 
         if 1 not in disabled_eapis:
 
@@ -1561,15 +1786,15 @@ Name:    %s
 
             # compress the database and create uncompressed
             # database checksum -- DEPRECATED
-            self._compress_file(database_path,
-                upload_data['compressed_database_path'], cmethod[0])
             self._create_file_checksum(database_path,
                 upload_data['database_path_digest'])
-
-            # create compressed database checksum
-            self._create_file_checksum(
-                upload_data['compressed_database_path'],
-                upload_data['compressed_database_path_digest'])
+            for c_format, c_method, c_data in cmethods:
+                self._compress_file(database_path,
+                    c_data['compressed_database_path'], c_method[0])
+                # create compressed database checksum
+                self._create_file_checksum(
+                    c_data['compressed_database_path'],
+                    c_data['compressed_database_path_digest'])
 
             # create light version of the compressed db
             eapi1_dbfile = self._entropy._get_local_repository_file(
@@ -1587,15 +1812,40 @@ Name:    %s
             eapi1_tmp_dbconn.vacuum()
             eapi1_tmp_dbconn.close()
 
-            # compress
-            self._compress_file(temp_eapi1_dbfile,
-                upload_data['compressed_database_path_light'], cmethod[0])
+            for c_format, c_method, c_data in cmethods:
+                # compress
+                self._compress_file(temp_eapi1_dbfile,
+                    c_data['compressed_database_path_light'], c_method[0])
+                # create compressed light database checksum
+                self._create_file_checksum(
+                    c_data['compressed_database_path_light'],
+                    c_data['compressed_database_path_digest_light'])
             # go away, we don't need you anymore
             os.remove(temp_eapi1_dbfile)
-            # create compressed light database checksum
-            self._create_file_checksum(
-                upload_data['compressed_database_path_light'],
-                upload_data['compressed_database_path_digest_light'])
+
+        if srv_set['database_delta_history'] > 0:
+            if light_dbfile is None:
+                light_dbfile = database_path + ".light_delta.tmp"
+                self._create_light_repository(light_dbfile)
+            self._update_repository_deltas(light_dbfile, upload_data,
+                critical, gpg_to_sign_files, cmethod)
+        if light_dbfile is not None:
+            os.remove(light_dbfile)
+
+        for c_format, c_method, c_data in cmethods[1:]:
+            for item_id, item_path in c_data.items():
+                item_id = "%s_%s" % (item_id, c_format)
+                upload_data[item_id] = item_path
+                critical.append(item_path)
+                gpg_to_sign_files.append(item_path)
+
+        # tell Entropy Clients which compression formats are available
+        cformats_path = os.path.join(
+            self._entropy._get_local_repository_dir(self._repository_id),
+            etpConst['etpdatabasecformatsfile'])
+        self._create_cformats_file(cformats_path, cformats)
+        upload_data['database_cformats_file'] = cformats_path
+        gpg_to_sign_files.append(cformats_path)
 
         # always upload metafile, it's cheap and also used by EAPI1,2
         self._create_metafiles_file(upload_data['metafiles_path'],
@@ -10,9 +10,13 @@
 
 """
 import codecs
+import collections
 import copy
 import errno
+import functools
 import hashlib
+import itertools
+import multiprocessing
 import os
 import re
 import shutil
@@ -22,12 +26,12 @@ import sys
 import time
 
 from entropy.exceptions import OnlineMirrorError, PermissionDenied, \
-    SystemDatabaseError, RepositoryError
+    SystemDatabaseError, RepositoryError, EntropyPackageException
 from entropy.const import etpConst, etpSys, const_setup_perms, \
     const_create_working_dirs, const_convert_to_unicode, \
     const_setup_file, const_get_stringtype, const_debug_write, \
     const_debug_enabled, const_convert_to_rawstring, const_mkdtemp, \
-    const_mkstemp, const_file_readable
+    const_mkstemp, const_file_readable, const_get_cpus
 from entropy.output import purple, red, darkgreen, \
     bold, brown, blue, darkred, teal
 from entropy.cache import EntropyCacher
@@ -57,6 +61,28 @@ import entropy.dump
 
 SERVER_QA_PLUGIN = "ServerQAInterfacePlugin"
 
+# function called by the worker processes spawned by
+# Server._parallel_map(), inherited through fork().
+_parallel_worker_function = None
+
+def _parallel_worker_init(function):
+    """
+    Worker process initializer, setup the function to call.
+    """
+    global _parallel_worker_function
+    _parallel_worker_function = function
+
+def _parallel_worker_run(item):
+    """
+    Worker process function, call the setup function on item.
+    Return None in case of failure, after having printed the traceback.
+    """
+    try:
+        return _parallel_worker_function(item)
+    except Exception:
+        entropy.tools.print_traceback()
+        return None
+
 
 class ServerEntropyRepositoryPlugin(EntropyRepositoryPlugin):
 
@@ -1121,7 +1147,9 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             'packages_expiration_days': etpConst['packagesexpirationdays'],
             'database_file_format': const_convert_to_unicode(
                 etpConst['etpdatabasefileformat']),
+            'database_extra_file_formats': [],
             'disabled_eapis': set(),
+            'database_delta_history': etpConst['etpdatabasedeltahistory'],
             'broken_revdeps_qa_check': True,
             'exp_based_scope': etpConst['expiration_based_scope'],
             # disabled by default for now
@@ -1230,6 +1258,21 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             if setting in etpConst['etpdatabasesupportedcformats']:
                 data['database_file_format'] = setting
 
+        def _database_extra_formats(line, setting):
+            for cformat in setting.split():
+                if cformat not in etpConst['etpdatabasesupportedcformats']:
+                    continue
+                if cformat not in data['database_extra_file_formats']:
+                    data['database_extra_file_formats'].append(cformat)
+
+        def _database_delta_history(line, setting):
+            try:
+                history = int(setting)
+            except ValueError:
+                return
+            if history >= 0:
+                data['database_delta_history'] = history
+
         def _syncspeedlimit(line, setting):
             try:
                 speed_limit = int(setting)
@@ -1298,6 +1341,8 @@ class ServerSystemSettingsPlugin(SystemSettingsPlugin):
             'server-basic-languages': _server_basic_lang,
             'repository': _repository_func,
             'database-format': _database_format,
+            'database-extra-formats': _database_extra_formats,
+            'database-delta-history': _database_delta_history,
             # backward compatibility
             'sync-speed-limit': _syncspeedlimit,
             'syncspeedlimit': _syncspeedlimit,
@@ -3414,64 +3459,47 @@ class Server(Client):
             if orig_fd is not None:
                 os.close(orig_fd)
 
+        injection_data = list(injection_data)
+        injector = functools.partial(self._inject_database_into_package,
+            repository_id, repo_sec, treeupdates_actions,
+            tmp_repo_orig_path)
+
+        def _injection_items():
+            for idpackage, package_path in injection_data:
+                yield package_path, dbconn.getPackageData(idpackage)
+
+        # package files are filled, signed and hashed in parallel,
+        # while repository changes are made here, in order.
+        injected = self._parallel_map(injector, _injection_items())
         try:
             for idpackage, package_path in injection_data:
 
-                tmp_repo_file = None
-                tmp_fd = None
-                try:
-                    tmp_fd, tmp_repo_file = const_mkstemp(
-                        prefix="entropy.server._inject_for")
-                    with os.fdopen(tmp_fd, "wb") as tmp_f:
-                        with open(tmp_repo_orig_path, "rb") as empty_f:
-                            shutil.copyfileobj(empty_f, tmp_f)
+                self.output(
+                    "[%s|%s] %s: %s" % (
+                        darkgreen(repository_id),
+                        brown(str(idpackage)),
+                        blue(_("injecting entropy metadata")),
+                        darkgreen(os.path.basename(package_path)),
+                    ),
+                    importance = 1,
+                    level = "info",
+                    header = blue(" @@ "),
+                    back = True
+                )
+                injection = next(injected)
+                if injection is None:
+                    # package file might have been modified, cannot retry
+                    raise EntropyPackageException(
+                        "cannot inject entropy metadata into %s" % (
+                            package_path,))
+                digest, signatures = injection
 
-                    self.output(
-                        "[%s|%s] %s: %s" % (
-                            darkgreen(repository_id),
-                            brown(str(idpackage)),
-                            blue(_("injecting entropy metadata")),
-                            darkgreen(os.path.basename(package_path)),
-                        ),
-                        importance = 1,
-                        level = "info",
-                        header = blue(" @@ "),
-                        back = True
-                    )
-                    data = dbconn.getPackageData(idpackage)
-                    self._inject_entropy_database_into_package(
-                        package_path, data,
-                        treeupdates_actions = treeupdates_actions,
-                        initialized_repository_path = tmp_repo_file)
-                finally:
-                    if tmp_fd is not None:
-                        try:
-                            os.close(tmp_fd)
-                        except OSError as err:
-                            if err.errno != errno.EBADF:
-                                raise
-                    if tmp_repo_file is not None:
-                        os.remove(tmp_repo_file)
-
-                # GPG-sign package if GPG signature is set
-                gpg_sign = None
-                if repo_sec is not None:
-                    gpg_sign = self._get_gpg_signature(repo_sec, repository_id,
-                        package_path)
-
-                digest = entropy.tools.md5sum(package_path)
                 # update digest
                 dbconn.setDigest(idpackage, digest)
                 # update signatures
-                signatures = data['signatures'].copy()
-                for hash_key in sorted(signatures):
-                    if hash_key == "gpg": # gpg already created
-                        continue
-                    hash_func = getattr(entropy.tools, hash_key)
-                    signatures[hash_key] = hash_func(package_path)
                 dbconn.setSignatures(idpackage, signatures['sha1'],
                     signatures['sha256'], signatures['sha512'],
-                    gpg_sign)
+                    signatures['gpg'])
 
                 # recompute the package file name and download url
                 # to match the final SHA1.
@@ -3498,8 +3526,75 @@ class Server(Client):
                     header = red(" @@ ")
                 )
         finally:
+            injected.close()
             os.remove(tmp_repo_orig_path)
 
+    def _inject_database_into_package(self, repository_id, repo_sec,
+        treeupdates_actions, tmp_repo_orig_path, injection_item):
+        """
+        Inject the entropy metadata into a package file, using a copy of
+        the given empty repository, then GPG-sign it (if repo_sec is
+        not None) and compute its new checksums.
+        This method is called by the worker processes of
+        _inject_database_into_packages().
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param repo_sec: RepositorySecurity instance or None
+        @type repo_sec: entropy.security.Repository
+        @param treeupdates_actions: repository treeupdates actions
+        @type treeupdates_actions: list
+        @param tmp_repo_orig_path: path to the empty repository to copy
+        @type tmp_repo_orig_path: string
+        @param injection_item: tuple composed by package file path and
+            package metadata
+        @type injection_item: tuple
+        @return: tuple composed by the new package file md5 and the
+            new package signatures dict (sha1, sha256, sha512, gpg)
+        @rtype: tuple
+        """
+        package_path, data = injection_item
+
+        tmp_repo_file = None
+        tmp_fd = None
+        try:
+            tmp_fd, tmp_repo_file = const_mkstemp(
+                prefix="entropy.server._inject_for")
+            with os.fdopen(tmp_fd, "wb") as tmp_f:
+                with open(tmp_repo_orig_path, "rb") as empty_f:
+                    shutil.copyfileobj(empty_f, tmp_f)
+
+            self._inject_entropy_database_into_package(
+                package_path, data,
+                treeupdates_actions = treeupdates_actions,
+                initialized_repository_path = tmp_repo_file)
+        finally:
+            if tmp_fd is not None:
+                try:
+                    os.close(tmp_fd)
+                except OSError as err:
+                    if err.errno != errno.EBADF:
+                        raise
+            if tmp_repo_file is not None:
+                os.remove(tmp_repo_file)
+
+        # GPG-sign package if GPG signature is set
+        gpg_sign = None
+        if repo_sec is not None:
+            gpg_sign = self._get_gpg_signature(repo_sec, repository_id,
+                package_path)
+
+        digest = entropy.tools.md5sum(package_path)
+        signatures = data['signatures'].copy()
+        for hash_key in sorted(signatures):
+            if hash_key == "gpg": # gpg already created
+                continue
+            hash_func = getattr(entropy.tools, hash_key)
+            signatures[hash_key] = hash_func(package_path)
+        signatures['gpg'] = gpg_sign
+
+        return digest, signatures
+
     def remove_packages(self, repository_id, package_ids):
         """
         Remove packages from given repository.
@@ -3615,12 +3710,21 @@ class Server(Client):
             txc.set_verbosity(False)
             with txc as handler:
 
+                pkgfiles = {}
+                for idpackage in idpackages:
+                    pkgfile = dbconn.retrieveDownloadURL(idpackage)
+                    pkgfiles[idpackage] = \
+                        self.complete_remote_package_relative_path(
+                            pkgfile, repository_id)
+                # ask for many checksums at once, with a single remote
+                # command, if supported.
+                remote_md5s = handler.get_md5_many(
+                    list(pkgfiles.values()))
+
                 for idpackage in idpackages:
 
                     currentcounter += 1
-                    pkgfile = dbconn.retrieveDownloadURL(idpackage)
-                    pkgfile = self.complete_remote_package_relative_path(
-                        pkgfile, repository_id)
+                    pkgfile = pkgfiles[idpackage]
                     pkghash = dbconn.retrieveDigest(idpackage)
 
                     self.output(
@@ -3636,7 +3740,7 @@ class Server(Client):
                         count = (currentcounter, totalcounter,)
                     )
 
-                    ck_remote = handler.get_md5(pkgfile)
+                    ck_remote = remote_md5s.get(pkgfile)
                     if ck_remote is None:
                         self.output(
                             "[%s] %s: %s %s" % (
@@ -5957,10 +6061,11 @@ class Server(Client):
                 return False
         return True
 
-    def _package_injector(self, repository_id, package_files, inject = False):
-
-        srv_set = self._settings[Server.SYSTEM_SETTINGS_PLG_ID]['server']
-
+    def _package_injector_callbacks(self, repository_id):
+        """
+        Return the license and restricted packages callbacks used during
+        package metadata extraction.
+        """
         def _package_injector_check_license(pkg_data):
             licenses = pkg_data['license'].split()
             return self._is_pkg_free(repository_id, licenses)
@@ -5972,6 +6077,112 @@ class Server(Client):
             return self._is_pkg_restricted(repository_id,
                 pkgatom, pkg_data['slot'])
 
+        return _package_injector_check_license, \
+            _package_injector_check_restricted
+
+    def _extract_package_metadata(self, repository_id, package_file):
+        """
+        Extract the metadata of package_file, which is going to be added
+        to the given repository.
+        """
+        license_cb, restricted_cb = self._package_injector_callbacks(
+            repository_id)
+        return self.Spm().extract_package_metadata(package_file,
+            license_callback = license_cb,
+            restricted_callback = restricted_cb)
+
+    def _parallel_map(self, function, items):
+        """
+        Call function on every item using a pool of worker processes, one
+        per CPU. Results are yielded in the same order of items, which
+        are consumed lazily. None is yielded if function raised an
+        exception (its traceback is printed) or if the result could not
+        be sent back, it's up to callers to retry or bail out.
+        Worker processes are forked, so function does not need to be
+        picklable, items and results do. If just one CPU is available,
+        or there is just one item, function is called in this process,
+        with the same error handling.
+
+        @param function: the function to call
+        @type function: callable
+        @param items: the function arguments
+        @type items: iterable
+        @return: generator yielding function results or None
+        @rtype: generator
+        """
+        processes = const_get_cpus()
+        items = iter(items)
+        # spawning a pool is not worth it for just one item
+        head = list(itertools.islice(items, 2))
+        items = itertools.chain(head, items)
+        if processes < 2 or len(head) < 2:
+            for item in items:
+                try:
+                    result = function(item)
+                except Exception:
+                    entropy.tools.print_traceback()
+                    result = None
+                yield result
+            return
+
+        try:
+            # inherit the function, bound methods cannot be pickled
+            mp_ctx = multiprocessing.get_context("fork")
+        except AttributeError:
+            # Python 2, always fork()
+            mp_ctx = multiprocessing
+
+        pool = mp_ctx.Pool(processes = processes,
+            initializer = _parallel_worker_init,
+            initargs = (function,))
+        try:
+            pending = collections.deque()
+            exhausted = False
+            while True:
+                # keep the workers busy, without queueing everything
+                while not exhausted and len(pending) < processes * 2:
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    pending.append(
+                        pool.apply_async(_parallel_worker_run, (item,)))
+                if not pending:
+                    break
+
+                result = pending.popleft()
+                try:
+                    yield result.get()
+                except Exception:
+                    # result could not be sent back
+                    yield None
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _extract_packages_metadata(self, repository_id, package_files):
+        """
+        Extract the metadata of the given package files in parallel,
+        see _parallel_map(). None is yielded for packages that are
+        going to be handled serially, by _package_injector().
+        """
+        if len(package_files) < 2 or const_get_cpus() < 2:
+            return (None for x in package_files)
+        # make workers inherit an already initialized Spm instance
+        self.Spm()
+        extractor = functools.partial(self._extract_package_metadata,
+                                      repository_id)
+        return self._parallel_map(extractor, package_files)
+
+    def _package_injector(self, repository_id, package_files, inject = False,
+        package_metadata = None):
+
+        srv_set = self._settings[Server.SYSTEM_SETTINGS_PLG_ID]['server']
+
+        _package_injector_check_license, _package_injector_check_restricted = \
+            self._package_injector_callbacks(repository_id)
+
         dbconn = self.open_server_repository(repository_id, read_only = False,
             no_upload = True)
         package_file = package_files[0]
@@ -5986,9 +6197,10 @@ class Server(Client):
             header = brown(" * "),
             back = True
         )
-        mydata = self.Spm().extract_package_metadata(package_file,
-            license_callback = _package_injector_check_license,
-            restricted_callback = _package_injector_check_restricted)
+        mydata = package_metadata
+        if mydata is None:
+            mydata = self._extract_package_metadata(
+                repository_id, package_file)
         is_licensed_ugly = not _package_injector_check_license(mydata)
         is_restricted = _package_injector_check_restricted(mydata)
 
@@ -6716,13 +6928,47 @@ class Server(Client):
         @return: list (set) of package identifiers added
         @rtype: set
         """
-        mycount = 0
-        maxcount = len(packages_data)
         idpackages_added = set()
         to_be_injected = set()
 
+        # metadata extraction is done in parallel, while repository
+        # changes are made here, in order.
+        packages_metadata = self._extract_packages_metadata(
+            repository_id, [x[0][0] for x in packages_data])
+        try:
+            self._add_packages_to_repository(repository_id, packages_data,
+                packages_metadata, idpackages_added, to_be_injected, ask)
+        finally:
+            packages_metadata.close()
+
+        # make sure packages are really available, it can happen
+        # after a previous failure to have garbage here
+        dbconn = self.open_server_repository(repository_id, just_reading = True)
+        idpackages_added = set((x for x in idpackages_added if \
+            dbconn.isPackageIdAvailable(x)))
+
+        if idpackages_added:
+            self._add_packages_qa_tests(
+                [(x, repository_id) for x in idpackages_added], ask = ask)
+
+        # inject database into packages
+        self._inject_database_into_packages(repository_id, to_be_injected)
+
+        return idpackages_added
+
+    def _add_packages_to_repository(self, repository_id, packages_data,
+        packages_metadata, idpackages_added, to_be_injected, ask):
+        """
+        Add package files to given repository, using the package metadata
+        yielded by packages_metadata, see add_packages_to_repository().
+        """
+        mycount = 0
+        maxcount = len(packages_data)
+
         for package_filepaths, inject in packages_data:
 
+            package_metadata = next(packages_metadata)
+
             mycount += 1
             for package_filepath in package_filepaths:
                 header = blue(" @@ ")
@@ -6764,7 +7010,8 @@ class Server(Client):
             try:
                 # add to database
                 idpackage, destination_paths = self._package_injector(
-                    repository_id, package_filepaths, inject = inject)
+                    repository_id, package_filepaths, inject = inject,
+                    package_metadata = package_metadata)
                 idpackages_added.add(idpackage)
                 to_be_injected.add((idpackage, destination_paths[0]))
             except Exception as err:
@@ -6791,21 +7038,6 @@ class Server(Client):
                 self.close_repositories()
                 raise
 
-        # make sure packages are really available, it can happen
-        # after a previous failure to have garbage here
-        dbconn = self.open_server_repository(repository_id, just_reading = True)
-        idpackages_added = set((x for x in idpackages_added if \
-            dbconn.isPackageIdAvailable(x)))
-
-        if idpackages_added:
-            self._add_packages_qa_tests(
-                [(x, repository_id) for x in idpackages_added], ask = ask)
-
-        # inject database into packages
-        self._inject_database_into_packages(repository_id, to_be_injected)
-
-        return idpackages_added
-
     def _taint_database(self, repository_id):
 
         # taint the database status
@@ -17,6 +17,8 @@ import threading
 import multiprocessing
 import socket
 import codecs
+import hashlib
+import random
 
 from entropy.exceptions import EntropyPackageException
 from entropy.output import red, darkgreen, bold, brown, blue, darkred, \
@@ -27,8 +29,10 @@ from entropy.cache import EntropyCacher
 from entropy.i18n import _
 from entropy.misc import RSS, ParallelTask
 from entropy.transceivers import EntropyTransceiver
+from entropy.transceivers.exceptions import TransceiverConnectionError
 from entropy.transceivers.uri_handlers.skel import EntropyUriHandler
 from entropy.core.settings.base import SystemSettings
+from entropy.security import Repository as RepositorySecurity
 from entropy.server.interfaces.db import ServerPackagesRepository
 
 import entropy.tools
@@ -38,6 +42,12 @@ class Server(object):
 
     SYSTEM_SETTINGS_PLG_ID = etpConst['system_settings_plugins_ids']['server_plugin']
 
+    # remote packages manifest file header, bump it if the format changes
+    _MANIFEST_HEADER = "# entropy packages manifest 1"
+    # number of manifest entries verified against the mirror before
+    # trusting the manifest
+    _MANIFEST_SPOT_CHECKS = 8
+
     def __init__(self, server, repository_id):
 
         from entropy.server.transceivers import TransceiverServerHandler
@@ -50,6 +60,12 @@ class Server(object):
         self.TransceiverServerHandler = TransceiverServerHandler
         self.Cacher = EntropyCacher()
         self._settings = SystemSettings()
+        # (repository_id, uri) => remote packages manifest data, as
+        # calculated by _calculate_remote_package_files()
+        self._remote_manifests = {}
+        # (repository_id, uri) whose manifest data has been rebuilt from
+        # a full listing and must be published again
+        self._listed_manifests = set()
 
 
     def _show_interface_status(self, repository_id):
@@ -1106,6 +1122,268 @@ class Server(object):
             header = blue(" @@ ")
         )
 
+    def _get_remote_manifest_path(self, repository_id):
+        """
+        Return the remote path of the packages manifest file of the
+        given repository, for the current arch and branch.
+        """
+        manifest_name = etpConst['etpdatabasepkgmanifestfile'] % (
+            etpConst['currentarch'], self._settings['repositories']['branch'])
+        return self._entropy.complete_remote_package_relative_path(
+            manifest_name, repository_id)
+
+    def _get_local_manifest_path(self, repository_id, uri):
+        """
+        Return the path of the local copy of the packages manifest file
+        of the given packages mirror.
+        """
+        manifest_name = os.path.basename(
+            self._get_remote_manifest_path(repository_id))
+        uri_hash = hashlib.md5(uri.encode("utf-8")).hexdigest()
+        return os.path.join(
+            self._entropy._get_local_repository_dir(repository_id),
+            "%s.%s" % (manifest_name, uri_hash[:16]))
+
+    def _get_manifest_security(self, repository_id):
+        """
+        Return a RepositorySecurity instance if the manifest can be
+        GPG signed and verified, None otherwise.
+        """
+        try:
+            repo_sec = RepositorySecurity()
+            if not repo_sec.is_keypair_available(repository_id):
+                return None
+        except RepositorySecurity.GPGError:
+            # also catches KeyExpired
+            return None
+        return repo_sec
+
+    def _read_manifest(self, manifest_path):
+        """
+        Read a packages manifest file, returning a dict composed by
+        relative path as key and (size, md5, mtime) as value, or None if
+        the file is not a valid manifest. md5 is None if unknown, which
+        is the case of the entries coming from a full mirror listing, whose
+        mtime is the listing time rather than the upload time.
+        """
+        enc = etpConst['conf_encoding']
+        data = {}
+        try:
+            with codecs.open(manifest_path, "r", encoding=enc) as man_f:
+                if man_f.readline().rstrip("\n") != self._MANIFEST_HEADER:
+                    return None
+                for line in man_f:
+                    md5, size, mtime, path = line.rstrip("\n").split(" ", 3)
+                    if md5 == "-":
+                        md5 = None
+                    data[path] = (int(size), md5, int(mtime))
+        except (IOError, OSError, ValueError, UnicodeDecodeError):
+            return None
+        return data
+
+    def _write_manifest(self, manifest_path, data):
+        """
+        Atomically write a packages manifest file, see _read_manifest().
+        """
+        enc = etpConst['conf_encoding']
+        tmp_path = manifest_path + ".tmp"
+        with codecs.open(tmp_path, "w", encoding=enc) as man_f:
+            man_f.write(self._MANIFEST_HEADER + "\n")
+            for path in sorted(data):
+                size, md5, mtime = data[path]
+                if md5 is None:
+                    md5 = "-"
+                man_f.write("%s %d %d %s\n" % (md5, size, mtime, path))
+        os.rename(tmp_path, manifest_path)
+
+    def _fetch_remote_manifest(self, repository_id, uri, txc_handler):
+        """
+        Fetch the packages manifest from the given packages mirror (unless
+        the local copy is still current), verify its GPG signature, if
+        repository keys are available, and spot check some of its entries
+        against the mirror content.
+
+        @return: the manifest data (see _read_manifest()) or None if the
+            manifest is not available or cannot be trusted
+        @rtype: dict or None
+        """
+        remote_path = self._get_remote_manifest_path(repository_id)
+        local_path = self._get_local_manifest_path(repository_id, uri)
+        sign_ext = etpConst['etpgpgextension']
+        repo_sec = self._get_manifest_security(repository_id)
+
+        remote_md5 = txc_handler.get_md5(remote_path)
+        if remote_md5 is None:
+            if not txc_handler.is_file(remote_path):
+                return None
+
+        cached = remote_md5 is not None and os.path.isfile(local_path) \
+            and entropy.tools.md5sum(local_path) == remote_md5
+        if cached and repo_sec is not None:
+            cached = os.path.isfile(local_path + sign_ext)
+
+        if not cached:
+            tmp_dir = const_mkdtemp(prefix = "entropy.server")
+            try:
+                tmp_path = os.path.join(tmp_dir,
+                    os.path.basename(remote_path))
+                if not txc_handler.download(remote_path, tmp_path):
+                    return None
+                if repo_sec is not None:
+                    if not txc_handler.download(remote_path + sign_ext,
+                        tmp_path + sign_ext):
+                        return None
+                    valid, err_msg = repo_sec.verify_file(repository_id,
+                        tmp_path, tmp_path + sign_ext)
+                    if not valid:
+                        self._entropy.output(
+                            "[%s] %s: %s" % (
+                                brown(repository_id),
+                                darkred(_("invalid packages manifest")),
+                                err_msg,
+                            ),
+                            importance = 1,
+                            level = "warning",
+                            header = darkred(" !!! ")
+                        )
+                        return None
+                    shutil.move(tmp_path + sign_ext, local_path + sign_ext)
+                shutil.move(tmp_path, local_path)
+            finally:
+                shutil.rmtree(tmp_dir, True)
+
+        data = self._read_manifest(local_path)
+        if data is None:
+            return None
+
+        # spot check some package files against the mirror, to catch
+        # changes not recorded into the manifest. Entries without md5
+        # (coming from a full listing) are only checked for existence.
+        pkg_ext = etpConst['packagesext']
+        candidates = [x for x in data if x.endswith(pkg_ext)]
+        candidates = random.sample(candidates,
+            min(self._MANIFEST_SPOT_CHECKS, len(candidates)))
+        remote_paths = dict((x, self._entropy.\
+            complete_remote_package_relative_path(x, repository_id)) \
+                for x in candidates)
+        remote_md5s = txc_handler.get_md5_many(
+            list(remote_paths.values()))
+        for package_rel in candidates:
+            package_path = remote_paths[package_rel]
+            package_md5 = remote_md5s.get(package_path)
+            if package_md5 is None:
+                if not txc_handler.is_file(package_path):
+                    return None
+            elif data[package_rel][1] not in (None, package_md5):
+                return None
+        return data
+
+    def _publish_remote_manifest(self, repository_id, uri, data):
+        """
+        Write the given manifest data locally and upload it, GPG signed
+        if possible, to the given packages mirror.
+
+        @return: True, if the upload succeeded
+        @rtype: bool
+        """
+        remote_path = self._get_remote_manifest_path(repository_id)
+        local_path = self._get_local_manifest_path(repository_id, uri)
+        sign_ext = etpConst['etpgpgextension']
+        self._entropy._ensure_dir_path(os.path.dirname(local_path))
+        self._write_manifest(local_path, data)
+
+        sign_path = None
+        repo_sec = self._get_manifest_security(repository_id)
+        if repo_sec is not None:
+            sign_path = repo_sec.sign_file(repository_id, local_path)
+            if sign_path != local_path + sign_ext:
+                shutil.move(sign_path, local_path + sign_ext)
+            sign_path = local_path + sign_ext
+
+        txc = self._entropy.Transceiver(uri)
+        with txc as handler:
+            # upload the signature first, a manifest newer than its
+            # signature is rejected by _fetch_remote_manifest().
+            if sign_path is not None:
+                if not handler.upload(sign_path, remote_path + sign_ext):
+                    return False
+            return handler.upload(local_path, remote_path)
+
+    def _drop_remote_manifest(self, repository_id, uri):
+        """
+        Remove the packages manifest from the given packages mirror, forcing
+        a full listing at the next synchronization.
+        """
+        self._remote_manifests.pop((repository_id, uri), None)
+        self._listed_manifests.discard((repository_id, uri))
+        local_path = self._get_local_manifest_path(repository_id, uri)
+        if os.path.isfile(local_path):
+            os.remove(local_path)
+
+        try:
+            txc = self._entropy.Transceiver(uri)
+            with txc as handler:
+                remote_path = self._get_remote_manifest_path(repository_id)
+                if handler.is_file(remote_path):
+                    handler.delete(remote_path)
+        except TransceiverConnectionError:
+            # unreachable mirror, at least the local copy is gone
+            entropy.tools.print_traceback()
+
+    def _update_remote_manifest(self, repository_id, uri, uploaded = None,
+        removed = None):
+        """
+        Update the packages manifest of the given packages mirror, using
+        the remote state calculated by _calculate_remote_package_files(),
+        or the local copy of the manifest, if the remote state is not known.
+        The manifest is only published if its data changed, that is, if
+        it has been rebuilt from a full listing or files have been
+        uploaded or removed.
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param uri: packages mirror uri
+        @type uri: string
+        @keyword uploaded: list of (local path, relative path, size) of
+            the files uploaded to the mirror
+        @type uploaded: list
+        @keyword removed: list of relative paths of the files removed
+            from the mirror
+        @type removed: list
+        """
+        data = self._remote_manifests.pop((repository_id, uri), None)
+        listed = (repository_id, uri) in self._listed_manifests
+        self._listed_manifests.discard((repository_id, uri))
+        if not (listed or uploaded or removed):
+            # the mirror manifest is still current, nothing to publish
+            return
+        if data is None:
+            data = self._read_manifest(
+                self._get_local_manifest_path(repository_id, uri))
+        if data is None:
+            # cannot tell, make sure that no stale manifest is around
+            self._drop_remote_manifest(repository_id, uri)
+            return
+
+        mtime = int(time.time())
+        for local_path, package_rel, size in (uploaded or []):
+            data[package_rel] = (entropy.tools.get_file_size(local_path),
+                entropy.tools.md5sum(local_path), mtime)
+        for package_rel in (removed or []):
+            data.pop(package_rel, None)
+
+        if not self._publish_remote_manifest(repository_id, uri, data):
+            self._entropy.output(
+                "[%s] %s: %s" % (
+                    brown(repository_id),
+                    darkred(_("cannot upload packages manifest to")),
+                    red(EntropyTransceiver.get_uri_name(uri)),
+                ),
+                importance = 1,
+                level = "warning",
+                header = darkred(" !!! ")
+            )
+
     def _calculate_remote_package_files(self, repository_id, uri, txc_handler):
 
         remote_files = 0
@@ -1113,6 +1391,20 @@ class Server(object):
         remote_packages = []
         branch = self._settings['repositories']['branch']
 
+        # try with the packages manifest first, avoiding the full listing
+        manifest = self._fetch_remote_manifest(repository_id, uri,
+            txc_handler)
+        if manifest is not None:
+            self._remote_manifests[(repository_id, uri)] = manifest
+            self._listed_manifests.discard((repository_id, uri))
+            for package_rel, (size, md5, mtime) in manifest.items():
+                remote_packages.append(package_rel)
+                remote_packages_data[package_rel] = size
+                if package_rel.endswith(etpConst['packagesext']):
+                    remote_files += 1
+            return remote_files, remote_packages, remote_packages_data
+
+        remote_dirs = []
         pkgs_dir_types = self._entropy._get_pkg_dir_names()
         for pkg_dir_type in pkgs_dir_types:
 
@@ -1122,24 +1414,36 @@ class Server(object):
                 branch)
             only_dir = self._entropy.complete_remote_package_relative_path("",
                 repository_id)
-            db_url_dir = remote_dir[len(only_dir):]
+            remote_dirs.append((remote_dir, remote_dir[len(only_dir):]))
 
             # create path to lock file if it doesn't exist
             if not txc_handler.is_dir(remote_dir):
                 txc_handler.makedirs(remote_dir)
 
-            remote_packages_info = txc_handler.list_content_metadata(remote_dir)
+        # list all the directories at once
+        remote_dirs_info = txc_handler.list_content_metadata_many(
+            [x for x, _y in remote_dirs])
+        for remote_dir, db_url_dir in remote_dirs:
+
+            remote_packages_info = remote_dirs_info[remote_dir]
             remote_packages += [os.path.join(db_url_dir, x[0]) for x \
                 in remote_packages_info]
 
-            for pkg in remote_packages:
-                if pkg.endswith(etpConst['packagesext']):
-                    remote_files += 1
-
             my_remote_pkg_data = dict((os.path.join(db_url_dir, x[0]),
                 int(x[1])) for x in remote_packages_info)
             remote_packages_data.update(my_remote_pkg_data)
 
+        for pkg in remote_packages:
+            if pkg.endswith(etpConst['packagesext']):
+                remote_files += 1
+
+        # full listing does not carry md5 checksums, nor upload times,
+        # the listing time is used instead
+        mtime = int(time.time())
+        self._remote_manifests[(repository_id, uri)] = dict(
+            (x, (y, None, mtime)) for x, y in remote_packages_data.items())
+        self._listed_manifests.add((repository_id, uri))
+
         return remote_files, remote_packages, remote_packages_data
 
     def _calculate_packages_to_sync(self, repository_id, uri):
@@ -1482,6 +1786,7 @@ class Server(object):
         errors = False
         m_fine_uris = set()
         m_broken_uris = set()
+        uploaders = []
         for rel_path, myqueue in queue_map.items():
 
             remote_dir = self._entropy.complete_remote_package_relative_path(
@@ -1495,8 +1800,12 @@ class Server(object):
                 myqueue, critical_files = myqueue,
                 txc_basedir = remote_dir, copy_herustic_support = True,
                 handlers_data = handlers_data, repo = repository_id)
+            uploaders.append(uploader)
 
-            xerrors, xm_fine_uris, xm_broken_uris = uploader.go()
+        # upload to the remote directories at the same time
+        results = self.TransceiverServerHandler.thread_map(
+            lambda x: x.go(), uploaders)
+        for xerrors, xm_fine_uris, xm_broken_uris in results:
             if xerrors:
                 errors = True
             m_fine_uris.update(xm_fine_uris)
@@ -1548,6 +1857,7 @@ class Server(object):
         errors = False
         m_fine_uris = set()
         m_broken_uris = set()
+        downloaders = []
         for rel_path, myqueue in queue_map.items():
 
             remote_dir = self._entropy.complete_remote_package_relative_path(
@@ -1568,8 +1878,12 @@ class Server(object):
                 txc_basedir = remote_dir, local_basedir = local_basedir,
                 handlers_data = handlers_data, download = True,
                 repo = repository_id)
+            downloaders.append(downloader)
 
-            xerrors, xm_fine_uris, xm_broken_uris = downloader.go()
+        # download from the remote directories at the same time
+        results = self.TransceiverServerHandler.thread_map(
+            lambda x: x.go(), downloaders)
+        for xerrors, xm_fine_uris, xm_broken_uris in results:
             if xerrors:
                 errors = True
             m_fine_uris.update(xm_fine_uris)
@@ -1767,6 +2081,8 @@ class Server(object):
                     level = "info",
                     header = darkgreen(" * ")
                 )
+                if not pretend:
+                    self._update_remote_manifest(repository_id, uri)
                 successfull_mirrors.add(uri)
                 continue
 
@@ -1800,6 +2116,8 @@ class Server(object):
                     header = darkgreen(" @@ ")
                 )
 
+                if not pretend:
+                    self._update_remote_manifest(repository_id, uri)
                 successfull_mirrors.add(uri)
                 continue
 
@@ -1849,9 +2167,14 @@ class Server(object):
                     if d_errors:
                         mirror_errors = True
                 if not mirror_errors:
+                    self._update_remote_manifest(repository_id, uri,
+                        uploaded = upload)
                     successfull_mirrors.add(uri)
                 else:
                     mirrors_errors = True
+                    # the mirror content is unknown, force a full
+                    # listing at the next synchronization
+                    self._drop_remote_manifest(repository_id, uri)
 
             except KeyboardInterrupt:
                 self._entropy.output(
@@ -1974,59 +2297,6 @@ class Server(object):
                     raise
                 shutil.move(source_pkg, dest_pkg)
 
-    def _is_package_expired(self, repository_id, package_rel, days):
-
-        pkg_path = self._entropy.complete_local_package_path(package_rel,
-            repository_id)
-        exp_pkg_path = pkg_path + etpConst['packagesexpirationfileext']
-        weak_pkg_path = pkg_path + etpConst['packagesweakfileext']
-
-        # it is assumed that weakened package files are always marked
-        # as expired first. So, if a .expired file exists, a .weak
-        # does as well. However, we must also be fault tolerant and
-        # cope with the situation in where .weak files exist but not
-        # their .expired counterpart.
-        # So, if a .weak file exists, we won't return straight away.
-        # At the same time, if a .expired file exists, we will use that.
-
-        expired_exists = os.path.lexists(exp_pkg_path)
-        weak_exists = os.path.lexists(weak_pkg_path)
-
-        test_pkg_path = None
-        if expired_exists:
-            test_pkg_path = exp_pkg_path
-        elif weak_exists:
-            # deal with corruption
-            test_pkg_path = weak_pkg_path
-        else:
-            # package file not expired, return straight away
-            return False
-
-        mtime = os.path.getmtime(test_pkg_path)
-        delta = days * 24 * 3600
-        currmtime = time.time()
-        file_delta = currmtime - mtime
-
-        if file_delta > delta:
-            return True
-        return False
-
-    def _expiration_file_exists(self, repository_id, package_rel):
-        """
-        Return whether the expiration file exists for the given package.
-
-        @param repository_id: repository identifier
-        @type repository_id: string
-        @param package_rel: package relative url, as returned by
-            EntropyRepository.retrieveDownloadURL
-        @type package_rel: string
-        """
-        pkg_path = self._entropy.complete_local_package_path(package_rel,
-            repository_id)
-
-        pkg_path += etpConst['packagesexpirationfileext']
-        return os.path.lexists(pkg_path)
-
     def _weaken_file_exists(self, repository_id, package_rel):
         """
         Return whether the weaken file exists for the given package.
@@ -2077,8 +2347,61 @@ class Server(object):
         with open(pkg_path, "w") as f_exp:
             f_exp.flush()
 
-    def _collect_expiring_packages(self, repository_id, branch):
+    def _get_expiration_index_path(self, repository_id):
+        """
+        Return the path of the local packages expiration index file.
+        """
+        return os.path.join(
+            self._entropy._get_local_repository_base_directory(
+                repository_id),
+            etpConst['packagesexpirationindexfile'])
 
+    def _read_expiration_index(self, repository_id):
+        """
+        Read the local packages expiration index, returning a dict composed
+        by package relative url as key and expiration timestamp as value.
+        """
+        index_path = self._get_expiration_index_path(repository_id)
+        enc = etpConst['conf_encoding']
+        index = {}
+        try:
+            with codecs.open(index_path, "r", encoding=enc) as index_f:
+                for line in index_f:
+                    exp_time, package_rel = line.rstrip("\n").split(" ", 1)
+                    index[package_rel] = float(exp_time)
+        except (IOError, OSError) as err:
+            if getattr(err, "errno", None) != errno.ENOENT:
+                raise
+        except ValueError:
+            # corrupted, .expired files are used instead
+            return {}
+        return index
+
+    def _write_expiration_index(self, repository_id, index):
+        """
+        Atomically write the local packages expiration index,
+        see _read_expiration_index().
+        """
+        index_path = self._get_expiration_index_path(repository_id)
+        tmp_path = index_path + ".tmp"
+        enc = etpConst['conf_encoding']
+        with codecs.open(tmp_path, "w", encoding=enc) as index_f:
+            for package_rel in sorted(index):
+                index_f.write("%f %s\n" % (index[package_rel], package_rel))
+        os.rename(tmp_path, index_path)
+
+    def _collect_expiring_packages(self, repository_id, branch):
+        """
+        Collect the package files of the given branch that are no longer
+        referenced by the repository, scanning the local packages
+        directories in one pass.
+
+        @return: tuple composed by the set of expiring package files, the
+            set of expiring extra package files, a dict mapping expired
+            package files to their expiration timestamp and a set of
+            weakened package files
+        @rtype: tuple
+        """
         repo = self._entropy.open_repository(repository_id)
 
         database_bins = set(repo.listAllDownloads(do_sort = False,
@@ -2087,40 +2410,57 @@ class Server(object):
 
         repo_basedir = self._entropy._get_local_repository_base_directory(
             repository_id)
+        index = self._read_expiration_index(repository_id)
 
-        repo_bins = set(self._entropy._get_basedir_pkg_listing(repo_basedir,
-            etpConst['packagesext'], branch = branch))
-        extra_repo_bins = set(self._entropy._get_basedir_pkg_listing(
-            repo_basedir, etpConst['packagesextraext'], branch = branch))
-
-        # scan .weak files. This is part of the weak-package-files support.
+        pkg_ext = etpConst['packagesext']
+        extra_ext = etpConst['packagesextraext']
+        exp_ext = etpConst['packagesexpirationfileext']
+        # scan .weak files too. This is part of the weak-package-files
+        # support.
         weak_ext = etpConst['packagesweakfileext']
-        weak_ext_len = len(weak_ext)
 
-        def _map_weak_ext(path):
-            return path[:-weak_ext_len]
+        repo_bins = set()
+        extra_repo_bins = set()
+        expired = {}
+        weak = set()
 
-        repo_bins |= set(
-            map(
-                _map_weak_ext,
-                self._entropy._get_basedir_pkg_listing(
-                    repo_basedir,
-                    etpConst['packagesext'] + weak_ext,
-                    branch = branch))
-            )
-        extra_repo_bins |= set(
-            map(
-                _map_weak_ext,
-                self._entropy._get_basedir_pkg_listing(
-                    repo_basedir,
-                    etpConst['packagesextraext'] + weak_ext,
-                    branch = branch))
-            )
+        def _account(package_rel):
+            if package_rel.endswith(pkg_ext):
+                repo_bins.add(package_rel)
+            elif package_rel.endswith(extra_ext):
+                extra_repo_bins.add(package_rel)
+
+        for pkg_dir in self._entropy._get_pkg_dir_names():
+            pkg_dir_path = os.path.join(repo_basedir, pkg_dir)
+            if not os.path.isdir(pkg_dir_path):
+                continue
+            # packages/<arch>/<branch>/
+            for arch in os.listdir(pkg_dir_path):
+                branch_path = os.path.join(pkg_dir_path, arch, branch)
+                if not os.path.isdir(branch_path):
+                    continue
+                for cur_dir, subdirs, files in os.walk(branch_path):
+                    rel_dir = os.path.relpath(cur_dir, repo_basedir)
+                    for name in files:
+                        package_rel = os.path.join(rel_dir, name)
+                        if package_rel.endswith(exp_ext):
+                            package_rel = package_rel[:-len(exp_ext)]
+                            exp_time = index.get(package_rel)
+                            if exp_time is None:
+                                # not indexed yet, use the file mtime
+                                exp_time = os.path.getmtime(
+                                    os.path.join(cur_dir, name))
+                            expired[package_rel] = exp_time
+                        elif package_rel.endswith(weak_ext):
+                            package_rel = package_rel[:-len(weak_ext)]
+                            weak.add(package_rel)
+                            _account(package_rel)
+                        else:
+                            _account(package_rel)
 
-        # convert to set, so that we can do fast thingszzsd
         repo_bins -= database_bins
         extra_repo_bins -= extra_database_bins
-        return repo_bins, extra_repo_bins
+        return repo_bins, extra_repo_bins, expired, weak
 
     def _weaken_package_file(self, repository_id, package_rel):
         """
@@ -2205,6 +2545,46 @@ class Server(object):
                 header = brown(" @@ ")
             )
 
+    def _remove_remote_packages(self, repository_id, uri, package_rels):
+        """
+        Remove the given package files from the given packages mirror,
+        using batched removals.
+
+        @param repository_id: repository identifier
+        @type repository_id: string
+        @param uri: packages mirror uri
+        @type uri: string
+        @param package_rels: list of package relative urls, as returned by
+            EntropyRepository.retrieveDownloadURL
+        @type package_rels: list
+        @return: list of package relative urls that could not be removed
+        @rtype: list
+        """
+        batch_size = 100
+        failed = []
+        try:
+            txc = self._entropy.Transceiver(uri)
+            with txc as handler:
+                for idx in range(0, len(package_rels), batch_size):
+                    batch = package_rels[idx:idx + batch_size]
+                    remote_paths = [
+                        self._entropy.complete_remote_package_relative_path(
+                            x, repository_id) for x in batch]
+                    if handler.delete_many(remote_paths):
+                        continue
+                    # find out what went wrong, some files may have been
+                    # removed already
+                    for package_rel, remote_path in zip(batch,
+                                                        remote_paths):
+                        if handler.is_file(remote_path) and \
+                                not handler.delete(remote_path):
+                            failed.append(package_rel)
+        except TransceiverConnectionError:
+            # broken mirror, do not abort the other ones
+            entropy.tools.print_traceback()
+            return list(package_rels)
+        return failed
+
     def tidy_mirrors(self, repository_id, ask = True, pretend = False,
         expiration_days = None):
         """
@@ -2264,8 +2644,9 @@ class Server(object):
         )
 
         # collect removed packages
-        expiring_packages, extra_expiring_packages = \
-            self._collect_expiring_packages(repository_id, branch)
+        expiring_packages, extra_expiring_packages, expired_packages, \
+            weak_packages = self._collect_expiring_packages(
+                repository_id, branch)
         if expiring_packages:
 
             # filter expired packages used by other branches
@@ -2306,31 +2687,35 @@ class Server(object):
         expire = []
         weaken = []
 
-        for package_rel in expiring_packages:
-            expired = self._is_package_expired(repository_id, package_rel,
-                expiration_days)
-            if expired:
+        expiration_delta = expiration_days * 24 * 3600
+        current_time = time.time()
+        all_expiring_packages = sorted(expiring_packages) + \
+            sorted(extra_expiring_packages)
+
+        for package_rel in all_expiring_packages:
+
+            # it is assumed that weakened package files are always marked
+            # as expired first. So, if a .expired file exists, a .weak
+            # does as well. However, we must also be fault tolerant and
+            # cope with the situation in where .weak files exist but not
+            # their .expired counterpart.
+            exp_time = expired_packages.get(package_rel)
+            if exp_time is None and package_rel in weak_packages:
+                # deal with corruption
+                exp_time = os.path.getmtime(
+                    self._entropy.complete_local_package_path(
+                        package_rel, repository_id) + \
+                    etpConst['packagesweakfileext'])
+
+            if exp_time is not None and \
+                    (current_time - exp_time) > expiration_delta:
                 remove.append(package_rel)
             else:
-                if not self._expiration_file_exists(repository_id, package_rel):
+                if package_rel not in expired_packages:
                     expire.append(package_rel)
-                if weak_package_files and not self._weaken_file_exists(
-                    repository_id, package_rel):
+                if weak_package_files and package_rel not in weak_packages:
                     weaken.append(package_rel)
 
-        for extra_package_rel in extra_expiring_packages:
-            expired = self._is_package_expired(repository_id, extra_package_rel,
-                expiration_days)
-            if expired:
-                remove.append(extra_package_rel)
-            else:
-                if not self._expiration_file_exists(
-                    repository_id, extra_package_rel):
-                    expire.append(extra_package_rel)
-                if weak_package_files and not self._weaken_file_exists(
-                    repository_id, extra_package_rel):
-                    weaken.append(extra_package_rel)
-
         if not (remove or weaken or expire):
             self._entropy.output(
                 "[%s] %s" % (
@@ -2420,69 +2805,56 @@ class Server(object):
 
         for package_rel in expire:
             self._create_expiration_file(repository_id, package_rel)
-
-        # split queue by remote directories to work on
-        removal_map = {}
-        dbconn = self._entropy.open_server_repository(repository_id,
-            just_reading = True)
+            expired_packages[package_rel] = current_time
+
+        # update the expiration index, in one go. Entries of this branch
+        # without an .expired file anymore are dropped.
+        index = dict((x, y) for x, y in \
+            self._read_expiration_index(repository_id).items() if \
+                self._entropy._get_branch_from_download_relative_uri(x) \
+                    != branch)
+        index.update(expired_packages)
         for package_rel in remove:
-            rel_path = self._entropy.complete_remote_package_relative_path(
-                package_rel, repository_id)
-            rel_dir = os.path.dirname(rel_path)
-            obj = removal_map.setdefault(rel_dir, [])
-            base_pkg = os.path.basename(package_rel)
-            obj.append(base_pkg)
+            index.pop(package_rel, None)
+        self._write_expiration_index(repository_id, index)
 
-        for uri in self._entropy.remote_packages_mirrors(repository_id):
-
-            ##
-            # remove remotely
-            ##
+        uris = self._entropy.remote_packages_mirrors(repository_id)
+        if remove:
+            self._entropy.output(
+                "[%s] %s..." % (
+                    brown(branch),
+                    blue(_("removing packages remotely")),
+                ),
+                importance = 1,
+                level = "info",
+                header = blue(" @@ ")
+            )
+            # remove from all the mirrors at the same time
+            results = self.TransceiverServerHandler.thread_map(
+                lambda x: self._remove_remote_packages(repository_id, x,
+                    remove), uris)
+        else:
+            results = [[] for x in uris]
 
-            uri_done = True
-            m_fine_uris = set()
-            m_broken_uris = set()
-            for remote_dir, myqueue in removal_map.items():
+        for uri, failed in zip(uris, results):
 
-                self._entropy.output(
-                    "[%s] %s..." % (
-                        brown(branch),
-                        blue(_("removing packages remotely")),
-                    ),
-                    importance = 1,
-                    level = "info",
-                    header = blue(" @@ ")
-                )
+            if remove:
+                # keep the packages manifest in sync with the mirror
+                if not failed:
+                    self._update_remote_manifest(repository_id, uri,
+                        removed = remove)
+                else:
+                    self._drop_remote_manifest(repository_id, uri)
 
-                destroyer = self.TransceiverServerHandler(
-                    self._entropy,
-                    [uri],
-                    myqueue,
-                    critical_files = [],
-                    txc_basedir = remote_dir,
-                    remove = True,
-                    repo = repository_id
-                )
-                xerrors, xm_fine_uris, xm_broken_uris = destroyer.go()
-                if xerrors:
-                    uri_done = False
-                m_fine_uris.update(xm_fine_uris)
-                m_broken_uris.update(xm_broken_uris)
-
-            if not uri_done:
-                my_broken_uris = [
-                    (EntropyTransceiver.get_uri_name(x_uri), x_uri_rc) \
-                        for x_uri, x_uri_rc in m_broken_uris]
-
-                reason = my_broken_uris[0][1]
+            if failed:
                 crippled_uri = EntropyTransceiver.get_uri_name(uri)
                 self._entropy.output(
                     "[%s] %s: %s, %s: %s" % (
                         brown(branch),
                         blue(_("remove errors")),
                         red(crippled_uri),
-                        blue(_("reason")),
-                        reason,
+                        blue(_("cannot remove")),
+                        ", ".join(failed),
                     ),
                     importance = 1,
                     level = "warning",
@@ -2490,15 +2862,15 @@ class Server(object):
                 )
                 done = False
 
-            self._entropy.output(
-                "[%s] %s..." % (
-                    brown(branch),
-                    blue(_("removing packages locally")),
-                ),
-                importance = 1,
-                level = "info",
-                header = blue(" @@ ")
-            )
+        self._entropy.output(
+            "[%s] %s..." % (
+                brown(branch),
+                blue(_("removing packages locally")),
+            ),
+            importance = 1,
+            level = "info",
+            header = blue(" @@ ")
+        )
 
         ##
         # remove locally
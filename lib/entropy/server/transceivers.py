@@ -10,6 +10,8 @@
 
 """
 import os
+import collections
+import threading
 
 from entropy.const import const_isstring, const_isnumber, etpConst
 from entropy.output import darkred, blue, brown, darkgreen, red, bold
@@ -17,11 +19,79 @@ from entropy.transceivers.exceptions import TransceiverConnectionError
 from entropy.i18n import _
 from entropy.client.interfaces.db import InstalledPackagesRepository
 from entropy.core.settings.base import SystemSettings
+from entropy.misc import ParallelTask
 from entropy.transceivers import EntropyTransceiver
 from entropy.tools import print_traceback, is_valid_md5, compare_md5, md5sum
 
 class TransceiverServerHandler:
 
+    # maximum number of mirrors (or remote directories) handled
+    # at the same time.
+    MAX_PARALLEL_WORKERS = 4
+    # thread_map() calls can be nested (remote directories, then mirrors),
+    # this caps the number of transceiver connections open at any time.
+    _CONNECTION_SEMAPHORE = threading.BoundedSemaphore(MAX_PARALLEL_WORKERS)
+
+    @staticmethod
+    def thread_map(function, items, max_workers = None):
+        """
+        Call function on every item in items, using at most max_workers
+        threads, and return the list of results, in the same order of items.
+        Since threads are used, function must be thread-safe.
+        If function raises an exception, its traceback is printed, no
+        further items are started and, once all the running threads are
+        done, the exception of the first failed item (in items order) is
+        re-raised in the calling thread.
+
+        @param function: the function to call, taking one argument
+        @type function: callable
+        @param items: list of function arguments
+        @type items: list
+        @keyword max_workers: maximum number of threads, defaults to
+            MAX_PARALLEL_WORKERS
+        @type max_workers: int
+        @return: list of results
+        @rtype: list
+        """
+        if max_workers is None:
+            max_workers = TransceiverServerHandler.MAX_PARALLEL_WORKERS
+        items = list(items)
+        if len(items) < 2 or max_workers < 2:
+            return [function(x) for x in items]
+
+        results = [None] * len(items)
+        errors = []
+        queue = collections.deque(enumerate(items))
+
+        def _worker():
+            while not errors:
+                try:
+                    idx, item = queue.popleft()
+                except IndexError:
+                    break
+                try:
+                    results[idx] = function(item)
+                except Exception as err:
+                    print_traceback()
+                    errors.append((idx, err))
+
+        workers = []
+        for x in range(min(max_workers, len(items))):
+            task = ParallelTask(_worker)
+            task.daemon = True
+            task.start()
+            workers.append(task)
+        for task in workers:
+            # join() with a timeout keeps the main thread
+            # responsive to KeyboardInterrupt
+            while task.is_alive():
+                task.join(1.0)
+
+        if errors:
+            _idx, err = min(errors, key = lambda x: x[0])
+            raise err
+        return results
+
     def __init__(self, entropy_interface, uris, files_to_upload,
         download = False, remove = False, txc_basedir = None,
         local_basedir = None, critical_files = None,
@@ -157,11 +227,15 @@ class TransceiverServerHandler:
         return valid_remote_md5 # always valid
 
     def _transceive(self, uri):
+        # limit the connections open at the same time, see thread_map()
+        with TransceiverServerHandler._CONNECTION_SEMAPHORE:
+            return self._transceive_uri(uri)
+
+    def _transceive_uri(self, uri):
 
         fine = set()
         broken = set()
         fail = False
-        crippled_uri = EntropyTransceiver.get_uri_name(uri)
         action = 'push'
         if self.download:
             action = 'pull'
@@ -179,9 +253,12 @@ class TransceiverServerHandler:
 
         maxcount = len(self.myfiles)
         counter = 0
+        verify = not (self.download or self.remove)
 
         with txc as handler:
 
+            # uploads are verified all at once, once every file is sent
+            uploaded = []
             for mypath in self.myfiles:
 
                 base_dir = self.txc_basedir
@@ -208,6 +285,7 @@ class TransceiverServerHandler:
                     myargs = (remote_path,)
 
                 fallback_syncer, fallback_args = None, None
+                file_action = action
                 # upload -> remote copy herustic support
                 # if a package file might have been already uploaded
                 # to remote mirror, try to look in other repositories'
@@ -222,114 +300,165 @@ class TransceiverServerHandler:
                     if new_syncer is not None:
                         fallback_syncer, fallback_args = syncer, myargs
                         syncer, myargs = new_syncer, new_args
-                        action = "copy"
+                        file_action = "copy"
 
                 counter += 1
-                tries = 0
-                done = False
-                lastrc = None
-
-                while tries < 5:
-                    tries += 1
-                    self._entropy.output(
-                        "[%s|#%s|(%s/%s)] %s: %s" % (
+                sync_data = (mypath, remote_path, counter, file_action,
+                    syncer, myargs, fallback_syncer, fallback_args)
+                done, lastrc = self._sync_file(handler, uri, maxcount,
+                    sync_data)
+                if done:
+                    fine.add(uri)
+                    if verify:
+                        uploaded.append(sync_data)
+                    continue
+
+                if self._sync_failed(uri, maxcount, sync_data, lastrc):
+                    fail = True
+                    broken.add((uri, lastrc))
+                    # next mirror
+                    return fail, fine, broken
+
+            remote_md5s = {}
+            if uploaded:
+                remote_md5s = handler.get_md5_many(
+                    [x[1] for x in uploaded])
+            for sync_data in uploaded:
+                mypath, remote_path, counter = sync_data[:3]
+                if self.handler_verify_upload(mypath, uri, counter,
+                        maxcount, 1, remote_md5 = remote_md5s.get(
+                            remote_path)):
+                    continue
+
+                # bad upload, try again, verifying every time
+                done, lastrc = self._sync_file(handler, uri, maxcount,
+                    sync_data, verify = True, tries = 1)
+                if done:
+                    continue
+
+                if self._sync_failed(uri, maxcount, sync_data, lastrc):
+                    fail = True
+                    broken.add((uri, lastrc))
+                    # next mirror
+                    break
+
+        return fail, fine, broken
+
+    def _sync_file(self, handler, uri, maxcount, sync_data, verify = False,
+        tries = 0):
+        """
+        Upload, download or remove a file, see _transceive_uri(), retrying
+        up to 5 times. If verify is True, uploads are verified using
+        handler_verify_upload().
+        Return a tuple composed by a boolean telling if the file has been
+        handled and the last syncer return value.
+        """
+        crippled_uri = EntropyTransceiver.get_uri_name(uri)
+        (mypath, remote_path, counter, action, syncer, myargs,
+            fallback_syncer, fallback_args) = sync_data
+
+        lastrc = None
+        while tries < 5:
+            tries += 1
+            self._entropy.output(
+                "[%s|#%s|(%s/%s)] %s: %s" % (
+                    blue(crippled_uri),
+                    darkgreen(str(tries)),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(action),
+                    red(os.path.basename(mypath)),
+                ),
+                importance = 0,
+                level = "info",
+                header = red(" @@ ")
+            )
+            rc = syncer(*myargs)
+            if (not rc) and (fallback_syncer is not None):
+                # if we have a fallback syncer, try it first
+                # before giving up.
+                rc = fallback_syncer(*fallback_args)
+
+            if rc and verify:
+                remote_md5 = handler.get_md5(remote_path)
+                rc = self.handler_verify_upload(mypath, uri,
+                    counter, maxcount, tries, remote_md5 = remote_md5)
+            if rc:
+                self._entropy.output(
+                    "[%s|#%s|(%s/%s)] %s %s: %s" % (
+                                blue(crippled_uri),
+                                darkgreen(str(tries)),
+                                blue(str(counter)),
+                                bold(str(maxcount)),
+                                blue(action),
+                                _("successful"),
+                                red(os.path.basename(mypath)),
+                    ),
+                    importance = 0,
+                    level = "info",
+                    header = darkgreen(" @@ ")
+                )
+                return True, rc
+
+            self._entropy.output(
+                "[%s|#%s|(%s/%s)] %s %s: %s" % (
                             blue(crippled_uri),
                             darkgreen(str(tries)),
                             blue(str(counter)),
                             bold(str(maxcount)),
                             blue(action),
+                            brown(_("failed, retrying")),
                             red(os.path.basename(mypath)),
-                        ),
-                        importance = 0,
-                        level = "info",
-                        header = red(" @@ ")
-                    )
-                    rc = syncer(*myargs)
-                    if (not rc) and (fallback_syncer is not None):
-                        # if we have a fallback syncer, try it first
-                        # before giving up.
-                        rc = fallback_syncer(*myargs)
-
-                    if rc and not (self.download or self.remove):
-                        remote_md5 = handler.get_md5(remote_path)
-                        rc = self.handler_verify_upload(mypath, uri,
-                            counter, maxcount, tries, remote_md5 = remote_md5)
-                    if rc:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        _("successful"),
-                                        red(os.path.basename(mypath)),
-                            ),
-                            importance = 0,
-                            level = "info",
-                            header = darkgreen(" @@ ")
-                        )
-                        done = True
-                        fine.add(uri)
-                        break
-                    else:
-                        self._entropy.output(
-                            "[%s|#%s|(%s/%s)] %s %s: %s" % (
-                                        blue(crippled_uri),
-                                        darkgreen(str(tries)),
-                                        blue(str(counter)),
-                                        bold(str(maxcount)),
-                                        blue(action),
-                                        brown(_("failed, retrying")),
-                                        red(os.path.basename(mypath)),
-                                ),
-                            importance = 0,
-                            level = "warning",
-                            header = brown(" @@ ")
-                        )
-                        lastrc = rc
-                        continue
+                    ),
+                importance = 0,
+                level = "warning",
+                header = brown(" @@ ")
+            )
+            lastrc = rc
 
-                if not done:
+        return False, lastrc
 
-                    self._entropy.output(
-                        "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
-                                blue(crippled_uri),
-                                blue(str(counter)),
-                                bold(str(maxcount)),
-                                blue(action),
-                                darkred("failed, giving up"),
-                                red(os.path.basename(mypath)),
-                                _("error"),
-                                lastrc,
-                        ),
-                        importance = 1,
-                        level = "error",
-                        header = darkred(" !!! ")
-                    )
-
-                    if mypath not in self.critical_files:
-                        self._entropy.output(
-                            "[%s|(%s/%s)] %s: %s, %s..." % (
-                                blue(crippled_uri),
-                                blue(str(counter)),
-                                bold(str(maxcount)),
-                                blue(_("not critical")),
-                                os.path.basename(mypath),
-                                blue(_("continuing")),
-                            ),
-                            importance = 1,
-                            level = "warning",
-                            header = brown(" @@ ")
-                        )
-                        continue
+    def _sync_failed(self, uri, maxcount, sync_data, lastrc):
+        """
+        Report a file that could not be handled by _sync_file().
+        Return True if the file is critical and the mirror must be
+        considered broken.
+        """
+        crippled_uri = EntropyTransceiver.get_uri_name(uri)
+        mypath, _remote_path, counter, action = sync_data[:4]
 
-                    fail = True
-                    broken.add((uri, lastrc))
-                    # next mirror
-                    break
+        self._entropy.output(
+            "[%s|(%s/%s)] %s %s: %s - %s: %s" % (
+                    blue(crippled_uri),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(action),
+                    darkred("failed, giving up"),
+                    red(os.path.basename(mypath)),
+                    _("error"),
+                    lastrc,
+            ),
+            importance = 1,
+            level = "error",
+            header = darkred(" !!! ")
+        )
 
-        return fail, fine, broken
+        if mypath not in self.critical_files:
+            self._entropy.output(
+                "[%s|(%s/%s)] %s: %s, %s..." % (
+                    blue(crippled_uri),
+                    blue(str(counter)),
+                    bold(str(maxcount)),
+                    blue(_("not critical")),
+                    os.path.basename(mypath),
+                    blue(_("continuing")),
+                ),
+                importance = 1,
+                level = "warning",
+                header = brown(" @@ ")
+            )
+            return False
+        return True
 
     def _copy_herustic_support(self, handler, local_path,
             txc_basedir, remote_path):
@@ -371,20 +500,23 @@ class TransceiverServerHandler:
         test_repositories.sort()
 
         local_path_filename = os.path.basename(local_path)
-        local_md5 = None
+        test_remote_paths = []
         for repository_id in test_repositories:
             repo_txc_basedir = \
                 self._entropy.complete_remote_package_relative_path(
                     pkg_download, repository_id)
-            test_remote_path = repo_txc_basedir + "/" + local_path_filename
-            if not handler.is_file(test_remote_path):
-                # not found on this packages mirror
-                continue
-            # then check md5 and compare
-            remote_md5 = handler.get_md5(test_remote_path)
+            test_remote_paths.append(
+                repo_txc_basedir + "/" + local_path_filename)
+
+        # check md5 of all the candidates at once, files that are
+        # not found on this packages mirror get a None checksum
+        remote_md5s = handler.get_md5_many(test_remote_paths)
+        local_md5 = None
+        for test_remote_path in test_remote_paths:
+            remote_md5 = remote_md5s.get(test_remote_path)
             if not const_isstring(remote_md5):
-                # transceiver or remote server doesn't support md5sum()
-                # so cannot verify the integrity
+                # not found, or transceiver or remote server doesn't
+                # support md5sum() so cannot verify the integrity
                 continue
             if local_md5 is None:
                 local_md5 = md5sum(local_path)
@@ -405,8 +537,7 @@ class TransceiverServerHandler:
         elif self.remove:
             action = 'remove'
 
-        for uri in self.uris:
-
+        def _go(uri):
             crippled_uri = EntropyTransceiver.get_uri_name(uri)
             self._entropy.output(
                 "[%s|%s] %s..." % (
@@ -431,7 +562,10 @@ class TransceiverServerHandler:
                 header = blue(" @@ ")
             )
 
-            fail, fine, broken = self._transceive(uri)
+            return self._transceive(uri)
+
+        # mirrors are independent, handle them at the same time
+        for fail, fine, broken in self.thread_map(_go, self.uris):
             fine_uris |= fine
             broken_uris |= broken
             if fail:
@@ -31,12 +31,14 @@ import gzip
 import bz2
 import mmap
 import codecs
+import struct
+import collections
 
 from entropy.output import print_generic
 from entropy.const import etpConst, const_kill_threads, const_islive, \
     const_isunicode, const_convert_to_unicode, const_convert_to_rawstring, \
     const_israwstring, const_secure_config_file, const_is_python3, \
-    const_mkstemp, const_file_readable
+    const_mkstemp, const_file_readable, const_xz_open, const_zstd_open
 from entropy.exceptions import FileNotFound, InvalidAtom, DirectoryNotFound
 
 
@@ -997,11 +999,76 @@ def compress_file(file_path, destination_path, opener, compress_level = None):
             f_out.flush()
         f_out.close()
 
+# compressors not natively supported by tarfile, magic, file opener
+_TARFILE_EXTRA_COMPRESSORS = {
+    "xz": (b"\xfd7zXZ\x00", const_xz_open),
+    "zst": (b"\x28\xb5\x2f\xfd", const_zstd_open),
+}
+
+class _CompressedTarFile(tarfile.TarFile):
+    """
+    tarfile.TarFile working on top of a compressed file object, which
+    is closed together with the archive, see open_tarfile().
+    """
+
+    compressed_fileobj = None
+
+    def close(self):
+        try:
+            tarfile.TarFile.close(self)
+        finally:
+            if self.compressed_fileobj is not None:
+                self.compressed_fileobj.close()
+
+def open_tarfile(file_path, mode = "r"):
+    """
+    Open a tarball like tarfile.open() does, with additional support for
+    xz and zstd compressed tarballs ("r" autodetection, "w:xz", "w:zst").
+
+    @param file_path: path to tarball
+    @type file_path: string
+    @keyword mode: tarfile.open() mode
+    @type mode: string
+    @return: tarfile.TarFile object
+    @rtype: tarfile.TarFile
+    @raise tarfile.ReadError: if the tarball cannot be read
+    @raise AttributeError: if the compression method is unsupported
+    """
+    opener = None
+    if mode == "r":
+        max_magic = max(len(x) for x, y in \
+            _TARFILE_EXTRA_COMPRESSORS.values())
+        with open(file_path, "rb") as tar_f:
+            header = tar_f.read(max_magic)
+        for magic, c_opener in _TARFILE_EXTRA_COMPRESSORS.values():
+            if header.startswith(magic):
+                opener = c_opener
+                break
+    elif mode.startswith("w:"):
+        c_data = _TARFILE_EXTRA_COMPRESSORS.get(mode[2:])
+        if c_data is not None:
+            opener = c_data[1]
+
+    if opener is None:
+        return tarfile.open(file_path, mode)
+
+    fileobj = opener(file_path, mode[0] + "b")
+    try:
+        tar = _CompressedTarFile.open(fileobj = fileobj, mode = mode[0] + ":")
+    except:
+        fileobj.close()
+        raise
+    # let tar.close() close fileobj, like tarfile does with its own
+    # compressed file objects.
+    tar.compressed_fileobj = fileobj
+    return tar
+
 def compress_files(dest_file, files_to_compress, compressor = "bz2"):
     """
     Compress file paths listed inside files_to_compress into dest_file using
     given compression type "compressor". Supported compression types are
-    "bz2" and "gz".
+    "bz2", "gz", "xz" and "zst" (the latter two, if available, see
+    etpConst['etpdatabasesupportedcformats']).
 
     @param dest_file: path where to save compressed file
     @type dest_file: string
@@ -1012,13 +1079,13 @@ def compress_files(dest_file, files_to_compress, compressor = "bz2"):
     @raise AttributeError: if compressor value is unsupported
     """
 
-    if compressor not in ("bz2", "gz",):
-        AttributeError("invalid compressor specified")
+    if compressor not in etpConst['etpdatabasesupportedcformats']:
+        raise AttributeError("invalid compressor specified")
 
     id_strings = {}
     tar = None
     try:
-        tar = tarfile.open(dest_file, "w:%s" % (compressor,))
+        tar = open_tarfile(dest_file, "w:%s" % (compressor,))
         for path in files_to_compress:
             exist = os.lstat(path)
             tarinfo = tar.gettarinfo(path, os.path.basename(path))
@@ -1056,7 +1123,7 @@ def universal_uncompress(compressed_file, dest_path, catch_empty = False):
     try:
 
         try:
-            tar = tarfile.open(compressed_file, "r")
+            tar = open_tarfile(compressed_file)
         except tarfile.ReadError:
             if catch_empty:
                 return True
@@ -1139,7 +1206,7 @@ def get_uncompressed_size(compressed_file):
     try:
 
         try:
-            tar = tarfile.open(compressed_file, "r")
+            tar = open_tarfile(compressed_file)
         except tarfile.ReadError:
             return accounted_size
         except EOFError:
@@ -1180,6 +1247,50 @@ def unpack_gzip(gzipfilepath):
     os.rename(tmp_path, filepath)
     return filepath
 
+def unpack_xz(xzfilepath):
+    """
+    Unpack .xz file.
+
+    @param xzfilepath: path to .xz file
+    @type xzfilepath: string
+    @return: path to uncompressed file
+    @rtype: string
+    """
+    filepath = xzfilepath[:-3] # remove .xz
+    fd, tmp_path = const_mkstemp(dir=os.path.dirname(filepath))
+    with os.fdopen(fd, "wb") as item:
+        filexz = const_xz_open(xzfilepath, "rb")
+        chunk = filexz.read(_READ_SIZE)
+        while chunk:
+            item.write(chunk)
+            chunk = filexz.read(_READ_SIZE)
+        filexz.close()
+        item.flush()
+    os.rename(tmp_path, filepath)
+    return filepath
+
+def unpack_zstd(zstdfilepath):
+    """
+    Unpack .zst file.
+
+    @param zstdfilepath: path to .zst file
+    @type zstdfilepath: string
+    @return: path to uncompressed file
+    @rtype: string
+    """
+    filepath = zstdfilepath[:-4] # remove .zst
+    fd, tmp_path = const_mkstemp(dir=os.path.dirname(filepath))
+    with os.fdopen(fd, "wb") as item:
+        filezst = const_zstd_open(zstdfilepath, "rb")
+        chunk = filezst.read(_READ_SIZE)
+        while chunk:
+            item.write(chunk)
+            chunk = filezst.read(_READ_SIZE)
+        filezst.close()
+        item.flush()
+    os.rename(tmp_path, filepath)
+    return filepath
+
 def unpack_bzip2(bzip2filepath):
     """
     Unpack .bz2 file.
@@ -1244,15 +1355,42 @@ def _delta_extract_gzip(gzip_path, new_path_fd):
         item.flush()
         item.close()
 
+def _delta_extract_xz(xz_path, new_path_fd):
+    with os.fdopen(new_path_fd, "wb") as item:
+        file_xz = const_xz_open(xz_path, "rb")
+        chunk = file_xz.read(_READ_SIZE)
+        while chunk:
+            item.write(chunk)
+            chunk = file_xz.read(_READ_SIZE)
+        file_xz.close()
+        item.flush()
+        item.close()
+
+def _delta_extract_zstd(zstd_path, new_path_fd):
+    with os.fdopen(new_path_fd, "wb") as item:
+        file_zst = const_zstd_open(zstd_path, "rb")
+        chunk = file_zst.read(_READ_SIZE)
+        while chunk:
+            item.write(chunk)
+            chunk = file_zst.read(_READ_SIZE)
+        file_zst.close()
+        item.flush()
+        item.close()
+
 _BSDIFF_EXEC = "/usr/bin/bsdiff"
 _BSPATCH_EXEC = "/usr/bin/bspatch"
 _DELTA_DECOMPRESSION_MAP = {
     "bz2": _delta_extract_bz2,
     "gz": _delta_extract_gzip,
+    "xz": _delta_extract_xz,
+    "zst": _delta_extract_zstd,
 }
 _DELTA_COMPRESSION_MAP = {
-    "bz2": "bz2.BZ2File",
-    "gzip": "gzip.GzipFile",
+    "bz2": bz2.BZ2File,
+    "gz": gzip.GzipFile,
+    "gzip": gzip.GzipFile,
+    "xz": const_xz_open,
+    "zst": const_zstd_open,
 }
 _DEFAULT_PKG_COMPRESSION = "bz2"
 
@@ -1283,8 +1421,8 @@ def generate_entropy_delta(pkg_path_a, pkg_path_b, hash_tag,
     @type pkg_path_a: string
     @param hash_tag: hash tag to append to Entropy package delta file name
     @type hash_tag: string
-    @keyword pkg_compression: default package compression, can be "bz2" or "gz".
-        if None, "bz2" is selected.
+    @keyword pkg_compression: default package compression, can be "bz2",
+        "gz", "xz" or "zst". if None, "bz2" is selected.
     @type: string
     @return: path to newly created delta file, return None if error
     @rtype: string or None
@@ -1371,8 +1509,8 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
     @type delta_path: string
     @param new_pkg_path_b: path where to store newly created package B
     @type new_pkg_path_b: string
-    @keyword pkg_compression: default package compression, can be "bz2" or "gz".
-        if None, "bz2" is selected.
+    @keyword pkg_compression: default package compression, can be "bz2",
+        "gz", "xz" or "zst". if None, "bz2" is selected.
     @type: string
     @raise IOError: if delta cannot be generated.
     """
@@ -1423,7 +1561,7 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
         # extract entropy metadata
         dump_entropy_metadata(delta_path, tmp_metadata_path)
         compress_file(new_pkg_path_b_tmp, new_pkg_path_b_tmp_compressed,
-            eval(used_compression), compress_level = 9)
+            used_compression, compress_level = 9)
 
         # add spm metadata
         get_spm_class().aggregate_package_metadata(
@@ -1447,9 +1585,35 @@ def apply_entropy_delta(pkg_path_a, delta_path, new_pkg_path_b,
             if err.errno != errno.EBADF:
                 raise
 
+# entropy database trailer: offset and length (unsigned 64bit, big endian)
+# and md5 digest of the entropy database, followed by databasetrailertag
+_EDB_TRAILER_FORMAT = ">QQ16s"
+_EDB_TRAILER_SIZE = struct.calcsize(_EDB_TRAILER_FORMAT) + \
+    len(etpConst['databasetrailertag'])
+
+def _is_edb_trailer_safe(edb_header):
+    """
+    Return whether the entropy database (given its SQLite header) can be
+    followed by the trailer without confusing older Entropy versions, which
+    read the entropy database up to the end of the package file.
+    This holds if the in-header database size is valid (SQLite >= 3.7.0),
+    so that SQLite ignores any trailing data.
+    """
+    if len(edb_header) < 100:
+        return False
+    sqlite_magic = const_convert_to_rawstring("SQLite format 3\0")
+    if not edb_header.startswith(sqlite_magic):
+        return False
+    change_counter, db_pages = struct.unpack(">II", edb_header[24:32])
+    version_valid_for = struct.unpack(">I", edb_header[92:96])[0]
+    return db_pages > 0 and change_counter == version_valid_for
+
 def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
     """
     Add Entropy metadata dump file to given Entropy package file.
+    A fixed size trailer, pointing to the metadata, is appended as well
+    (when safe), so that it can be located without scanning the whole
+    package file.
 
     @param entropy_package_file: path to Entropy package file
     @type entropy_package_file: string
@@ -1459,8 +1623,12 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
     mmap_size_th = 4096000 # 4mb threshold
     with open(entropy_package_file, "ab") as f:
         f.write(const_convert_to_rawstring(etpConst['databasestarttag']))
+        start_position = f.tell()
+        edb_md5 = hashlib.md5()
         with open(entropy_metadata_file, "rb") as g:
             f_size = os.lstat(entropy_metadata_file).st_size
+            write_trailer = _is_edb_trailer_safe(g.read(100))
+            g.seek(0)
             mmap_f = None
             try:
                 if f_size > mmap_size_th:
@@ -1478,12 +1646,20 @@ def aggregate_entropy_metadata(entropy_package_file, entropy_metadata_file):
                         chunk = g.read(_READ_SIZE)
                     if not chunk:
                         break
+                    edb_md5.update(chunk)
                     f.write(chunk)
-                f.flush()
             finally:
                 if mmap_f is not None:
                     mmap_f.close()
 
+        if write_trailer:
+            edb_length = f.tell() - start_position
+            f.write(struct.pack(_EDB_TRAILER_FORMAT, start_position,
+                edb_length, edb_md5.digest()))
+            f.write(const_convert_to_rawstring(
+                etpConst['databasetrailertag']))
+        f.flush()
+
 def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
     """
     Dump Entropy package metadata from Entropy package file to
@@ -1506,7 +1682,7 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 return False
             # avoid security flaw caused by file size growing race condition
             # we conside the file size static
-            start_position = None
+            edb_range = None
             if f_size < mmap_size_th:
                 # use mmap
                 try:
@@ -1516,31 +1692,108 @@ def dump_entropy_metadata(entropy_package_file, entropy_metadata_file):
                 except MemoryError:
                     old_mmap = None
                 if old_mmap is not None:
-                    start_position = _locate_edb(old_mmap)
+                    edb_range = _locate_edb_range(old_mmap)
 
             if old_mmap is None:
-                start_position = _locate_edb(old)
-            if start_position is None:
+                edb_range = _locate_edb_range(old)
+            if edb_range is None:
                 return False
 
+            start_position, edb_length, edb_digest = edb_range
+            edb_md5 = hashlib.md5()
             with open(entropy_metadata_file, "wb") as db:
-                while True:
+                while edb_length is None or edb_length > 0:
+                    read_size = _READ_SIZE
+                    if edb_length is not None:
+                        read_size = min(read_size, edb_length)
                     if old_mmap is None:
-                        data = old.read(_READ_SIZE)
+                        data = old.read(read_size)
                     else:
-                        data = old_mmap.read(_READ_SIZE)
+                        data = old_mmap.read(read_size)
                     if not data:
                         break
+                    if edb_length is not None:
+                        edb_length -= len(data)
+                    edb_md5.update(data)
                     db.write(data)
                 db.flush()
+
+            if edb_digest is not None and edb_md5.digest() != edb_digest:
+                # corrupted package file
+                return False
         finally:
             if old_mmap is not None:
                 old_mmap.close()
 
     return True
 
+def _read_edb_trailer(fileobj):
+    """
+    Read the entropy database trailer at the end of fileobj, if any.
+    Return a tuple composed by entropy database offset, length and md5
+    digest, or None if the trailer is missing or invalid.
+    """
+    fileobj.seek(0, os.SEEK_END)
+    f_size = fileobj.tell()
+    if f_size < _EDB_TRAILER_SIZE:
+        return None
+
+    fileobj.seek(f_size - _EDB_TRAILER_SIZE)
+    trailer = fileobj.read(_EDB_TRAILER_SIZE)
+    raw_trailer_tag = const_convert_to_rawstring(
+        etpConst['databasetrailertag'])
+    if not trailer.endswith(raw_trailer_tag):
+        return None
+
+    start_position, edb_length, edb_digest = struct.unpack(
+        _EDB_TRAILER_FORMAT, trailer[:-len(raw_trailer_tag)])
+    if start_position + edb_length + _EDB_TRAILER_SIZE != f_size:
+        return None
+
+    # the database start tag must be right before the database
+    raw_db_tag = const_convert_to_rawstring(etpConst['databasestarttag'])
+    if start_position < len(raw_db_tag):
+        return None
+    fileobj.seek(start_position - len(raw_db_tag))
+    if fileobj.read(len(raw_db_tag)) != raw_db_tag:
+        return None
+
+    return start_position, edb_length, edb_digest
+
+def _locate_edb_range(fileobj):
+    """
+    Locate the entropy database inside fileobj, returning a tuple composed
+    by its offset, length and md5 digest (the last two are None for legacy
+    package files without trailer), or None if not found.
+    fileobj is positioned at the beginning of the entropy database.
+    """
+    trailer = _read_edb_trailer(fileobj)
+    if trailer is not None:
+        fileobj.seek(trailer[0])
+        return trailer
+
+    start_position = _scan_edb(fileobj)
+    if start_position is None:
+        return None
+    return start_position, None, None
+
 def _locate_edb(fileobj):
+    """
+    Locate the entropy database inside fileobj, returning its offset or
+    None, if not found. fileobj is positioned at the returned offset.
+    """
+    trailer = _read_edb_trailer(fileobj)
+    if trailer is not None:
+        start_position = trailer[0]
+        fileobj.seek(start_position)
+        return start_position
+    return _scan_edb(fileobj)
 
+def _scan_edb(fileobj):
+    """
+    Locate the entropy database inside legacy package files (without
+    trailer), scanning fileobj backwards for the database start tag.
+    """
     # position old to the end
     fileobj.seek(0, os.SEEK_END)
     # read backward until we find
@@ -2009,7 +2262,7 @@ def apply_tarball_ownership(filepath, prefix_path):
     tar = None
     try:
         try:
-            tar = tarfile.open(filepath, "r")
+            tar = open_tarfile(filepath)
         except tarfile.ReadError:
             return
         except EOFError:
@@ -2096,7 +2349,7 @@ def uncompress_tarball(filepath, extract_path = None, catch_empty = False):
     try:
 
         try:
-            tar = tarfile.open(filepath, "r")
+            tar = open_tarfile(filepath)
         except tarfile.ReadError:
             if catch_empty:
                 return 0
@@ -2563,6 +2816,310 @@ def is_valid_md5(string):
         return True
     return False
 
+# ELF parsing constants, see elf(5)
+_ELF_MAGIC = const_convert_to_rawstring("\x7fELF")
+_ELF_CLASS_32 = 1
+_ELF_CLASS_64 = 2
+_ELF_DATA_LSB = 1
+_ELF_DATA_MSB = 2
+_ELF_PT_LOAD = 1
+_ELF_PT_DYNAMIC = 2
+_ELF_SHT_DYNSYM = 11
+_ELF_SHN_UNDEF = 0
+_ELF_DT_NULL = 0
+_ELF_DT_NEEDED = 1
+_ELF_DT_STRTAB = 5
+_ELF_DT_STRSZ = 10
+_ELF_DT_SONAME = 14
+_ELF_DT_RPATH = 15
+_ELF_DT_RUNPATH = 29
+_ELF_STB_GLOBAL = 1
+_ELF_STB_WEAK = 2
+_ELF_STB_GNU_UNIQUE = 10
+# ELF class => (header, program header, section header, dynamic entry,
+# symbol) struct formats (without byte order)
+_ELF_FORMATS = {
+    _ELF_CLASS_32: ("HHIIIIIHHHHHH", "IIIIIIII", "IIIIIIIIII", "iI",
+                    "IIIBBH"),
+    _ELF_CLASS_64: ("HHIQQQIHHHHHH", "IIQQQQQQ", "IIQQQQIIQQ", "qQ",
+                    "IBBHQQ"),
+}
+
+# ELF metadata cache, path => (stat signature, metadata, cost), least
+# recently used first, see _elf_cached(). Symbol sets of big libraries
+# take megabytes, so the cache is bounded by (estimated) memory usage.
+_ELF_CACHE = collections.OrderedDict()
+_ELF_CACHE_MAX_COST = 64 * 1024 * 1024
+_ELF_CACHE_COST = [0]
+
+def _elf_cache_cost(data):
+    """
+    Roughly estimate the memory used by the given ELF metadata, in bytes.
+    """
+    if isinstance(data, dict):
+        data = list(data.values())
+    if isinstance(data, (list, tuple, set, frozenset)):
+        return 64 + sum(_elf_cache_cost(x) for x in data)
+    if const_israwstring(data) or const_isunicode(data):
+        return 64 + len(data)
+    return 16
+
+def _elf_cached(elf_file, reader):
+    """
+    Return the metadata produced by reader(elf_file), caching it until the
+    file at elf_file changes (device, inode, mtime and size are compared).
+    """
+    try:
+        st = os.stat(elf_file)
+    except OSError:
+        # let reader raise the proper exception
+        return reader(elf_file)
+
+    sig = (st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+    key = (elf_file, reader)
+    cached = _ELF_CACHE.pop(key, None)
+    if cached is not None:
+        if cached[0] == sig:
+            # most recently used
+            _ELF_CACHE[key] = cached
+            return cached[1]
+        _ELF_CACHE_COST[0] -= cached[2]
+
+    data = reader(elf_file)
+    cost = _elf_cache_cost(data)
+    if cost > _ELF_CACHE_MAX_COST:
+        return data
+    while _ELF_CACHE and _ELF_CACHE_COST[0] + cost > _ELF_CACHE_MAX_COST:
+        _old_key, old_cached = _ELF_CACHE.popitem(last = False)
+        _ELF_CACHE_COST[0] -= old_cached[2]
+    _ELF_CACHE[key] = (sig, data, cost)
+    _ELF_CACHE_COST[0] += cost
+    return data
+
+def _read_elf_ident(elf_file):
+    """
+    Read the ELF identification bytes (magic, class and data encoding).
+    """
+    with open(elf_file, "rb") as f:
+        return f.read(6)
+
+def _read_elf_header(f):
+    """
+    Read the ELF header from the given file object. Return a tuple composed
+    by byte order prefix, struct formats (see _ELF_FORMATS) and unpacked
+    header, or None if the file is not a supported ELF object.
+    """
+    f.seek(0)
+    ident = f.read(16)
+    if len(ident) != 16 or not ident.startswith(_ELF_MAGIC):
+        return None
+    elf_class, elf_data = struct.unpack("BB", ident[4:6])
+    formats = _ELF_FORMATS.get(elf_class)
+    if formats is None:
+        return None
+    if elf_data == _ELF_DATA_LSB:
+        order = "<"
+    elif elf_data == _ELF_DATA_MSB:
+        order = ">"
+    else:
+        return None
+
+    header_fmt = order + formats[0]
+    data = f.read(struct.calcsize(header_fmt))
+    if len(data) != struct.calcsize(header_fmt):
+        return None
+    return order, formats, struct.unpack(header_fmt, data)
+
+def _read_elf_table(f, order, fmt, offset, entsize, count):
+    """
+    Read a table of count entries of given struct format, each entsize bytes
+    long, starting at offset.
+    """
+    fmt = order + fmt
+    size = struct.calcsize(fmt)
+    if entsize < size or count < 1:
+        return []
+    f.seek(offset)
+    data = f.read(entsize * count)
+    return [struct.unpack(fmt, data[x:x + size]) for x in \
+        range(0, len(data) - size + 1, entsize)]
+
+def _elf_string(strtab, offset):
+    """
+    Return the NUL terminated string at offset in the given string table,
+    as native string (like readelf output would be).
+    """
+    end = strtab.find(const_convert_to_rawstring("\0"), offset)
+    if end == -1:
+        end = len(strtab)
+    name = strtab[offset:end]
+    if const_is_python3():
+        name = const_convert_to_unicode(name)
+    return name
+
+def _read_elf_dynamic(elf_file):
+    """
+    Read the dynamic section of the ELF file at path, through its program
+    headers (like "readelf -d" does). Return a dict containing "needed"
+    (list), "soname" (string or None), "rpath" and "runpath" (lists of
+    raw strings), or None if the file is not a dynamic ELF object.
+    """
+    with open(elf_file, "rb") as f:
+        try:
+            header = _read_elf_header(f)
+            if header is None:
+                return None
+            order, formats, elf_header = header
+            phoff, phentsize, phnum = elf_header[4], elf_header[8], \
+                elf_header[9]
+            prog_headers = _read_elf_table(f, order, formats[1], phoff,
+                phentsize, phnum)
+
+            if formats is _ELF_FORMATS[_ELF_CLASS_32]:
+                # p_type, p_offset, p_vaddr, p_filesz
+                segments = [(x[0], x[1], x[2], x[4]) for x in prog_headers]
+            else:
+                segments = [(x[0], x[2], x[3], x[5]) for x in prog_headers]
+
+            dynamic = [x for x in segments if x[0] == _ELF_PT_DYNAMIC]
+            if not dynamic:
+                return None
+            _p_type, dyn_offset, _dyn_vaddr, dyn_size = dynamic[0]
+            dyn_fmt = order + formats[3]
+            dyn_entsize = struct.calcsize(dyn_fmt)
+            entries = []
+            for d_tag, d_val in _read_elf_table(f, order, formats[3],
+                dyn_offset, dyn_entsize, dyn_size // dyn_entsize):
+                if d_tag == _ELF_DT_NULL:
+                    break
+                entries.append((d_tag, d_val))
+
+            strtab_addr = None
+            strtab_size = None
+            for d_tag, d_val in entries:
+                if d_tag == _ELF_DT_STRTAB:
+                    strtab_addr = d_val
+                elif d_tag == _ELF_DT_STRSZ:
+                    strtab_size = d_val
+            if strtab_addr is None or strtab_size is None:
+                return None
+
+            # map the string table virtual address to a file offset
+            strtab_offset = None
+            for p_type, p_offset, p_vaddr, p_filesz in segments:
+                if p_type != _ELF_PT_LOAD:
+                    continue
+                if p_vaddr <= strtab_addr < p_vaddr + p_filesz:
+                    strtab_offset = p_offset + strtab_addr - p_vaddr
+                    break
+            if strtab_offset is None:
+                return None
+            f.seek(strtab_offset)
+            strtab = f.read(strtab_size)
+
+        except struct.error:
+            # truncated or corrupted ELF file
+            return None
+
+    metadata = {
+        'needed': [],
+        'soname': None,
+        'rpath': [],
+        'runpath': [],
+    }
+    for d_tag, d_val in entries:
+        if d_tag == _ELF_DT_NEEDED:
+            metadata['needed'].append(_elf_string(strtab, d_val))
+        elif d_tag == _ELF_DT_SONAME:
+            metadata['soname'] = _elf_string(strtab, d_val)
+        elif d_tag == _ELF_DT_RPATH:
+            metadata['rpath'].append(_elf_string(strtab, d_val))
+        elif d_tag == _ELF_DT_RUNPATH:
+            metadata['runpath'].append(_elf_string(strtab, d_val))
+    return metadata
+
+def _read_elf_symbols(elf_file):
+    """
+    Read the dynamic symbol table of the ELF file at path. Return a tuple
+    composed by the frozenset of defined (exported) symbol names and the
+    frozenset of undefined (non weak) symbol names.
+    """
+    defined = set()
+    undefined = set()
+    with open(elf_file, "rb") as f:
+        try:
+            header = _read_elf_header(f)
+            if header is None:
+                return frozenset(), frozenset()
+            order, formats, elf_header = header
+            shoff, shentsize, shnum = elf_header[5], elf_header[10], \
+                elf_header[11]
+            sections = _read_elf_table(f, order, formats[2], shoff,
+                shentsize, shnum)
+
+            is_32 = formats is _ELF_FORMATS[_ELF_CLASS_32]
+            for section in sections:
+                # sh_type, sh_offset, sh_size, sh_link, sh_entsize
+                sh_type, sh_offset, sh_size, sh_link, sh_entsize = \
+                    section[1], section[4], section[5], section[6], \
+                    section[9]
+                if sh_type != _ELF_SHT_DYNSYM or sh_entsize < 1:
+                    continue
+                if sh_link >= len(sections):
+                    continue
+                strtab_section = sections[sh_link]
+                f.seek(strtab_section[4])
+                strtab = f.read(strtab_section[5])
+
+                for sym in _read_elf_table(f, order, formats[4], sh_offset,
+                    sh_entsize, sh_size // sh_entsize):
+                    if is_32:
+                        st_name, st_info, st_shndx = sym[0], sym[3], sym[5]
+                    else:
+                        st_name, st_info, st_shndx = sym[0], sym[1], sym[3]
+                    if not st_name:
+                        continue
+                    binding = st_info >> 4
+                    if st_shndx == _ELF_SHN_UNDEF:
+                        if binding != _ELF_STB_WEAK:
+                            undefined.add(_elf_string(strtab, st_name))
+                    elif binding in (_ELF_STB_GLOBAL, _ELF_STB_WEAK,
+                        _ELF_STB_GNU_UNIQUE):
+                        defined.add(_elf_string(strtab, st_name))
+
+        except struct.error:
+            # truncated or corrupted ELF file
+            pass
+
+    return frozenset(defined), frozenset(undefined)
+
+def _resolve_elf_dependencies(elf_file):
+    """
+    Walk the shared object dependency graph of the ELF file at path,
+    like the dynamic linker does. Return a list of (soname, resolved path)
+    tuples, in breadth first order. Resolved path is None if the soname
+    cannot be found.
+    """
+    ld_paths = collect_linker_paths()
+    resolved = []
+    seen = set()
+    queue = [elf_file]
+    while queue:
+        requiring = queue.pop(0)
+        try:
+            needed = read_elf_dynamic_libraries(requiring)
+        except (OSError, IOError):
+            continue
+        for soname in sorted(needed):
+            if soname in seen:
+                continue
+            seen.add(soname)
+            lib_path = _resolve_dynamic_library(soname, requiring, ld_paths)
+            resolved.append((soname, lib_path))
+            if lib_path is not None:
+                queue.append(lib_path)
+    return resolved
+
 def read_elf_class(elf_file):
     """
     Read ELF class metadatum from ELF file.
@@ -2572,12 +3129,8 @@ def read_elf_class(elf_file):
     @return: ELF class metadatum value
     @rtype: int
     """
-    import struct
-    with open(elf_file, "rb") as f:
-        f.seek(4)
-        elf_class = f.read(1)
-    elf_class = struct.unpack('B', elf_class)[0]
-    return elf_class
+    elf_ident = _elf_cached(elf_file, _read_elf_ident)
+    return struct.unpack('B', elf_ident[4:5])[0]
 
 def is_elf_file(elf_file):
     """
@@ -2588,29 +3141,13 @@ def is_elf_file(elf_file):
     @return: True, if file at path is ELF file
     @rtype: bool
     """
-    import struct
-    with open(elf_file, "rb") as f:
-        data = f.read(4)
-    try:
-        data = struct.unpack('BBBB', data)
-    except struct.error:
-        return False
-    if data == (127, 69, 76, 70):
-        return True
-    return False
+    elf_ident = _elf_cached(elf_file, _read_elf_ident)
+    return elf_ident.startswith(_ELF_MAGIC)
 
-def resolve_dynamic_library(library, requiring_executable):
+def _resolve_dynamic_library(library, requiring_executable, ld_paths):
     """
-    Resolve given library name (as contained into ELF metadata) to
-    a library path.
-
-    @param library: library name (as contained into ELF metadata)
-    @type library: string
-    @param requiring_executable: path to ELF object that contains the given
-        library name
-    @type requiring_executable: string
-    @return: resolved library path
-    @rtype: string
+    Resolve given library name to a library path, looking into the given
+    linker paths first. See resolve_dynamic_library().
     """
     def do_resolve(mypaths, elf_class):
         found_path = None
@@ -2620,16 +3157,16 @@ def resolve_dynamic_library(library, requiring_executable):
                 continue
             if not const_file_readable(mypath):
                 continue
-            if not is_elf_file(mypath):
+            elf_ident = _elf_cached(mypath, _read_elf_ident)
+            if not elf_ident.startswith(_ELF_MAGIC):
                 continue
-            elif read_elf_class(mypath) != elf_class:
+            elif struct.unpack('B', elf_ident[4:5])[0] != elf_class:
                 continue
             found_path = mypath
             break
         return found_path
 
     elf_class = read_elf_class(requiring_executable)
-    ld_paths = collect_linker_paths()
     found_path = do_resolve(ld_paths, elf_class)
 
     if not found_path:
@@ -2638,8 +3175,22 @@ def resolve_dynamic_library(library, requiring_executable):
 
     return found_path
 
-readelf_avail_check = False
-ldd_avail_check = False
+def resolve_dynamic_library(library, requiring_executable):
+    """
+    Resolve given library name (as contained into ELF metadata) to
+    a library path.
+
+    @param library: library name (as contained into ELF metadata)
+    @type library: string
+    @param requiring_executable: path to ELF object that contains the given
+        library name
+    @type requiring_executable: string
+    @return: resolved library path
+    @rtype: string
+    """
+    return _resolve_dynamic_library(library, requiring_executable,
+        collect_linker_paths())
+
 def read_elf_dynamic_libraries(elf_file):
     """
     Extract NEEDED metadatum from ELF file at path.
@@ -2649,60 +3200,66 @@ def read_elf_dynamic_libraries(elf_file):
     @return: list (set) of strings in NEEDED metadatum
     @rtype: set
     """
-    global readelf_avail_check
-    if not readelf_avail_check:
-        if not const_file_readable("/usr/bin/readelf"):
-            FileNotFound('FileNotFound: no readelf')
-        readelf_avail_check = True
-    return set([x.strip().split()[-1][1:-1] for x in \
-        getstatusoutput('/usr/bin/readelf -d %s' % (elf_file,))[1].split("\n") \
-            if (x.find("(NEEDED)") != -1)])
+    try:
+        metadata = _elf_cached(elf_file, _read_elf_dynamic)
+    except (OSError, IOError):
+        return set()
+    if metadata is None:
+        return set()
+    return set(metadata['needed'])
 
+_elf_dynamic_linker_re = re.compile(r"^ld[-\w]*\.so(\.\d+)*$")
 def read_elf_real_dynamic_libraries(elf_file):
     """
-    This function is similar to read_elf_dynamic_libraries but uses ldd to
-    retrieve a list of "real" .so library dependencies used by the ELF file.
+    This function is similar to read_elf_dynamic_libraries but walks the
+    whole .so dependency graph, like ldd does, and returns the .so library
+    dependencies (direct or indirect) used by the ELF file that cannot be
+    found, like those reported by ldd as "not found".
     This is useful to ensure that there are no .so libraries missing in the
-    dependencies, because ldd expands and resolves the .so dependency graph.
-    This is anyway dangerous because the output returned by ldd is somehow
-    environment-dependent, so make sure this function is only used for
-    informative purposes, and not for adding real dependencies to a package.
+    dependencies. This is anyway dangerous because the graph is somehow
+    environment-dependent (ld.so.conf), so make sure this function is only
+    used for informative purposes, and not for adding real dependencies to
+    a package.
 
     @param elf_file: path to ELF file
     @type elf_file: string
-    @return: list (set) of strings in NEEDED metadatum
+    @return: list (set) of missing .so library dependencies
     @rtype: set
-    @raise FileNotFound: if ldd is not found
-    """
-    global ldd_avail_check
-    if not ldd_avail_check:
-        if not const_file_readable("/usr/bin/ldd"):
-            FileNotFound('FileNotFound: no ldd')
-    sts, output = getstatusoutput('/usr/bin/ldd "%s"' % (elf_file,))
-    if sts != 0:
-        # garbage file
-        # non-dynamic executables cause this
-        return []
-    return set((x.split()[0].strip() for x in output.split("\n") if "=>" in x \
-        and not x.split()[-1].startswith("(")))
+    """
+    # the dynamic linker itself is not reported, like ldd does
+    return set((soname for soname, lib_path in \
+        _resolve_elf_dependencies(elf_file) \
+            if lib_path is None and not _elf_dynamic_linker_re.match(soname)))
 
 def read_elf_broken_symbols(elf_file):
     """
-    Extract broken symbols from ELF file.
+    Extract broken symbols from ELF file, that is, undefined symbols that
+    are not exported by any of the shared objects it depends on.
 
     @param elf_file: path to ELF file
     @type elf_file: string
     @return: list of broken symbols in ELF file.
     @rtype: set
     """
-    global ldd_avail_check
-    if not ldd_avail_check:
-        if not const_file_readable("/usr/bin/ldd"):
-            FileNotFound('FileNotFound: no ldd')
-        ldd_avail_check = True
-    return set([x.strip().split("\t")[0].split()[-1] for x in \
-        getstatusoutput('/usr/bin/ldd -r "%s"' % (elf_file,))[1].split("\n") \
-            if (x.find("undefined symbol:") != -1)])
+    try:
+        _defined, undefined = _elf_cached(elf_file, _read_elf_symbols)
+    except (OSError, IOError):
+        return set()
+    if not undefined:
+        return set()
+
+    broken = set(undefined)
+    for soname, lib_path in _resolve_elf_dependencies(elf_file):
+        if lib_path is None:
+            continue
+        try:
+            lib_defined, _undefined = _elf_cached(lib_path, _read_elf_symbols)
+        except (OSError, IOError):
+            continue
+        broken -= lib_defined
+        if not broken:
+            break
+    return broken
 
 def read_elf_linker_paths(elf_file):
     """
@@ -2713,17 +3270,15 @@ def read_elf_linker_paths(elf_file):
     @return: list of extracted built-in linker paths.
     @rtype: list
     """
-    global readelf_avail_check
-    if not readelf_avail_check:
-        if not const_file_readable("/usr/bin/readelf"):
-            FileNotFound('FileNotFound: no readelf')
-        readelf_avail_check = True
-    data = [x.strip().split()[-1][1:-1].split(":") for x in \
-        getstatusoutput('readelf -d %s' % (elf_file,))[1].split("\n") if not \
-            ((x.find("(RPATH)") == -1) and (x.find("(RUNPATH)") == -1))]
+    try:
+        metadata = _elf_cached(elf_file, _read_elf_dynamic)
+    except (OSError, IOError):
+        return []
+    if metadata is None:
+        return []
     mypaths = []
-    for mypath in data:
-        for xpath in mypath:
+    for mypath in metadata['rpath'] + metadata['runpath']:
+        for xpath in mypath.split(":"):
             xpath = xpath.replace("$ORIGIN", os.path.dirname(elf_file))
             xpath = xpath.replace("${ORIGIN}", os.path.dirname(elf_file))
             mypaths.append(xpath)
@@ -16,6 +16,7 @@ import grp
 import shutil
 import errno
 import fcntl
+import hashlib
 
 from entropy.const import const_setup_perms, etpConst, const_debug_write
 from entropy.transceivers.uri_handlers.skel import EntropyUriHandler
@@ -148,10 +149,40 @@ class EntropyFileUriHandler(EntropyUriHandler):
     def upload(self, load_path, remote_path):
         remote_str = self._setup_remote_path(remote_path)
         tmp_remote_str = remote_str + EntropyUriHandler.TMP_TXC_FILE_EXT
-        shutil.copyfile(load_path, tmp_remote_str)
+
+        offset = 0
+        if os.path.isfile(tmp_remote_str):
+            # resume an interrupted upload
+            offset = self._get_upload_resume_offset(load_path,
+                os.path.getsize(tmp_remote_str),
+                remote_md5 = lambda x: self.__md5_head(tmp_remote_str, x))
+
+        if offset:
+            with open(load_path, "rb") as load_f:
+                with open(tmp_remote_str, "r+b") as tmp_f:
+                    load_f.seek(offset)
+                    tmp_f.truncate(offset)
+                    tmp_f.seek(offset)
+                    shutil.copyfileobj(load_f, tmp_f)
+        else:
+            shutil.copyfile(load_path, tmp_remote_str)
         os.rename(tmp_remote_str, remote_str)
         return True
 
+    def __md5_head(self, path, length):
+        """
+        Return the md5 hexdigest of the first length bytes of path.
+        """
+        md5 = hashlib.md5()
+        with open(path, "rb") as path_f:
+            while length > 0:
+                data = path_f.read(min(length, 65536))
+                if not data:
+                    break
+                md5.update(data)
+                length -= len(data)
+        return md5.hexdigest()
+
     def lock(self, remote_path):
         remote_str = self._setup_remote_path(remote_path)
         remote_str_lock = os.path.join(
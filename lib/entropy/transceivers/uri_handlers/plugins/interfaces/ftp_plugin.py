@@ -416,6 +416,7 @@ class EntropyFtpUriHandler(EntropyUriHandler):
 
         tmp_path = path + EntropyUriHandler.TMP_TXC_FILE_EXT
         tries = 0
+        resume = True
 
         def updater(buf):
             self._commit_buffer_update(len(buf))
@@ -427,6 +428,7 @@ class EntropyFtpUriHandler(EntropyUriHandler):
 
             tries += 1
             self._init_vars()
+            offset = 0
 
             try:
 
@@ -434,9 +436,25 @@ class EntropyFtpUriHandler(EntropyUriHandler):
                 self.__filesize = round(float(file_size)/ 1024, 1)
                 self.__filekbcount = 0
 
-                with open(load_path, "r") as f:
+                # resume an interrupted upload, if any. SITE MD5 can only
+                # checksum the partial file as a whole, so resume from its
+                # end, if it is a prefix of load_path.
+                if resume:
+                    remote_size = self.__get_size(tmp_path)
+                    offset = self._get_upload_resume_offset(load_path,
+                        remote_size, chunked = False,
+                        remote_md5 = lambda x: self.__site_md5(tmp_path))
+                if offset:
+                    self._commit_buffer_update(offset)
+
+                with open(load_path, "rb") as f:
+                    f.seek(offset)
                     rc = self.__ftpconn.storbinary("STOR " + tmp_path, f,
-                        8192, updater)
+                        8192, updater, offset or None)
+
+                if offset and self.__get_size(tmp_path) != file_size:
+                    # REST has been ignored by the server
+                    raise TransceiverError("resumed upload size mismatch")
 
                 self._update_progress(force = True)
                 # now we can rename the file with its original name
@@ -461,9 +479,40 @@ class EntropyFtpUriHandler(EntropyUriHandler):
                     header = "  "
                     )
                 self._reconnect() # reconnect
-                self.delete(tmp_path)
+                if offset:
+                    # REST may be unsupported or broken, start from scratch
+                    resume = False
+                    self.delete(tmp_path)
+                # otherwise tmp_path is kept, the next try resumes from it
                 self.delete(path)
 
+    def __site_md5(self, path):
+        """
+        Return the md5 hexdigest of the given remote file, or None if the
+        server does not support the SITE MD5 command.
+        """
+        try:
+            rc_data = self.__ftpconn.sendcmd("SITE MD5 %s" % (path,))
+        except self.ftplib.error_perm:
+            return None # not supported
+
+        try:
+            return rc_data.split("\n")[0].split("\t")[0].split("-")[1]
+        except (IndexError, TypeError,): # wrong output
+            return None
+
+    def __get_size(self, path):
+        """
+        Return the size of the given remote file, or None if it does not
+        exist or the server does not support the SIZE command.
+        """
+        try:
+            # SIZE is not reliable in ASCII mode
+            self.__ftpconn.voidcmd("TYPE I")
+            return self.__ftpconn.size(path)
+        except (self.ftplib.error_perm, self.ftplib.error_reply):
+            return None
+
     def lock(self, remote_path):
         # The only atomic operation on FTP seems to be mkdir()
         # But there is no actual guarantee because it really depends
@@ -601,16 +650,31 @@ class EntropyFtpUriHandler(EntropyUriHandler):
         # PROFTPD with mod_md5 supports it!
         self.__connect_if_not()
         path = os.path.join(self.__ftpdir, remote_path)
+        return self.__site_md5(path)
 
-        try:
-            rc_data = self.__ftpconn.sendcmd("SITE MD5 %s" % (path,))
-        except self.ftplib.error_perm:
-            return None # not supported
-
-        try:
-            return rc_data.split("\n")[0].split("\t")[0].split("-")[1]
-        except (IndexError, TypeError,): # wrong output
-            return None
+    def get_md5_many(self, remote_paths):
+        md5s = {}
+        supported = True
+        for remote_path in remote_paths:
+            md5s[remote_path] = None
+            if not supported:
+                continue
+            self.__connect_if_not()
+            path = os.path.join(self.__ftpdir, remote_path)
+            try:
+                rc_data = self.__ftpconn.sendcmd("SITE MD5 %s" % (path,))
+            except self.ftplib.error_perm as err:
+                # do not bother the server again if SITE MD5 is
+                # not supported at all, rather than file not found
+                if str(err)[:3] in ("500", "501", "502", "504"):
+                    supported = False
+                continue
+            try:
+                md5s[remote_path] = rc_data.split(
+                    "\n")[0].split("\t")[0].split("-")[1]
+            except (IndexError, TypeError,): # wrong output
+                continue
+        return md5s
 
     def list_content(self, remote_path):
         self.__connect_if_not()
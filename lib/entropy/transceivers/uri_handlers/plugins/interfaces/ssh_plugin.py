@@ -12,12 +12,13 @@
 import re
 import os
 import errno
-import time
 import shutil
 import codecs
+import select
+import threading
 
 from entropy.const import const_isnumber, const_debug_write, \
-    const_mkdtemp, const_mkstemp, etpConst
+    const_mkdtemp, const_mkstemp, const_convert_to_unicode, etpConst
 from entropy.output import brown, darkgreen, teal
 from entropy.i18n import _
 from entropy.transceivers.exceptions import TransceiverConnectionError
@@ -35,6 +36,14 @@ class EntropySshUriHandler(EntropyUriHandler):
     _DEFAULT_PORT = 22
     _TXC_CMD = "/usr/bin/scp"
     _SSH_CMD = "/usr/bin/ssh"
+    # share a single SSH connection (ControlMaster) among all the
+    # commands executed during the handler lifetime.
+    _MULTIPLEXING = True
+    # max seconds between child process exit checks, if it keeps
+    # the pty quiet.
+    _PROGRESS_TIMEOUT = 0.5
+    # max paths passed to a single remote command by *_many() methods.
+    _MANY_CHUNK_SIZE = 256
 
     @staticmethod
     def approve_uri(uri):
@@ -62,6 +71,9 @@ class EntropySshUriHandler(EntropyUriHandler):
         self.__host = EntropySshUriHandler.get_uri_name(self._uri)
         self.__user, self.__port, self.__dir = self.__extract_scp_data(
             self._uri)
+        self.__control_mutex = threading.Lock()
+        self.__control_dir = None
+        self.__control_path = None
 
     def __enter__(self):
         pass
@@ -69,6 +81,85 @@ class EntropySshUriHandler(EntropyUriHandler):
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
+    def _remote_str(self):
+        """
+        Return the remote host string ([user@]host) used by ssh.
+        """
+        remote_str = ""
+        if self.__user:
+            remote_str += self.__user + "@"
+        remote_str += self.__host
+        return remote_str
+
+    def _setup_control_args(self):
+        """
+        Return the ssh/scp arguments required to reuse the master
+        connection, which is started if not running yet.
+        An empty list is returned if connection multiplexing is disabled
+        or the master connection could not be started, in this case
+        every command will open its own connection.
+        """
+        if not self._MULTIPLEXING:
+            return []
+
+        with self.__control_mutex:
+            if self.__control_dir is None:
+                self.__control_dir = const_mkdtemp(
+                    prefix="entropy.transceivers.ssh_cm")
+                # keep it short, unix socket paths are limited
+                control_path = os.path.join(self.__control_dir, "cm")
+                if self.__start_master(control_path):
+                    self.__control_path = control_path
+                else:
+                    const_debug_write(__name__,
+                        "_setup_control_args: cannot start master, "
+                        "not multiplexing: %s" % (self._remote_str(),))
+
+        if self.__control_path is None:
+            return []
+        return ["-o", "ControlPath=%s" % (self.__control_path,)]
+
+    def __start_master(self, control_path):
+        """
+        Start the master connection, going to background once connected.
+        """
+        args = [EntropySshUriHandler._SSH_CMD, "-p", str(self.__port)]
+        if const_isnumber(self._timeout):
+            args += ["-o", "ConnectTimeout=%s" % (self._timeout,),
+                "-o", "ServerAliveCountMax=4", # hardcoded
+                "-o", "ServerAliveInterval=15"] # hardcoded
+        args += ["-o", "ControlMaster=yes",
+                 "-o", "ControlPath=%s" % (control_path,),
+                 "-M", "-N", "-f", self._remote_str()]
+
+        with open(os.devnull, "r+b") as null_f:
+            try:
+                proc = self._subprocess.Popen(args, stdin = null_f,
+                    stdout = null_f, stderr = null_f)
+            except OSError as err:
+                const_debug_write(__name__,
+                    "__start_master: cannot execute ssh: %s" % (err,))
+                return False
+            return proc.wait() == os.EX_OK
+
+    def __stop_master(self):
+        """
+        Stop the master connection, if any.
+        """
+        with self.__control_mutex:
+            control_dir = self.__control_dir
+            control_path = self.__control_path
+            self.__control_dir = None
+            self.__control_path = None
+
+        if control_path is not None:
+            args = [EntropySshUriHandler._SSH_CMD, "-p", str(self.__port),
+                    "-o", "ControlPath=%s" % (control_path,),
+                    "-O", "exit", self._remote_str()]
+            self._exec_cmd(args)
+        if control_dir is not None:
+            shutil.rmtree(control_dir, True)
+
     def __extract_scp_data(self, uri):
 
         no_ssh_split = uri.split("ssh://")[-1]
@@ -117,22 +208,20 @@ class EntropySshUriHandler(EntropyUriHandler):
 
         self.output(current_txt, back = True, header = "    ")
 
-    def _update_progress(self, std_r):
+    def _update_progress(self, read_buf, data):
+        """
+        Parse the progress lines (terminated by carriage returns) found in
+        data, read_buf is the partial line returned by the previous call.
+        Return the new partial line.
+        """
         if self._silent:
             # stfu !
-            return
-        read_buf = ""
-        try:
-            char = std_r.read(1)
-            while char:
-                if (char == "\r") and read_buf:
-                    self._parse_progress_line(read_buf)
-                    read_buf = ""
-                elif (char != "\r"):
-                    read_buf += char
-                char = std_r.read(1)
-        except IOError:
-            return
+            return ""
+        lines = (read_buf + data).split("\r")
+        for line in lines[:-1]:
+            if line:
+                self._parse_progress_line(line)
+        return lines[-1]
 
     def _fork_cmd(self, args):
 
@@ -145,24 +234,53 @@ class EntropySshUriHandler(EntropyUriHandler):
             raise TransceiverConnectionError("cannot forkpty()")
         else:
             dead = False
+            eof = False
             return_code = 1
-            std_r = os.fdopen(fd, "r")
-            while not dead:
-
-                try:
-                    dead, return_code = os.waitpid(pid, os.WNOHANG)
-                except OSError as e:
-                    if e.errno != errno.ECHILD:
-                        raise
-                    dead = True
-
-                time.sleep(0.5)
-                self._update_progress(std_r)
-            std_r.close()
+            read_buf = ""
+            try:
+                while not dead:
+
+                    if not eof:
+                        try:
+                            ready = select.select([fd], [], [],
+                                self._PROGRESS_TIMEOUT)[0]
+                        except select.error as err:
+                            if err.args[0] != errno.EINTR:
+                                raise
+                            continue
+
+                        if ready:
+                            try:
+                                data = os.read(fd, 4096)
+                            except OSError as err:
+                                # EIO is returned once the child is gone
+                                if err.errno != errno.EIO:
+                                    raise
+                                data = None
+                            if data:
+                                read_buf = self._update_progress(read_buf,
+                                    const_convert_to_unicode(data))
+                                continue
+                            eof = True
+
+                    # on EOF, just wait for the child to terminate,
+                    # otherwise check whether it's gone while
+                    # something else keeps the pty open.
+                    try:
+                        dead_pid, status = os.waitpid(pid,
+                            0 if eof else os.WNOHANG)
+                    except OSError as err:
+                        if err.errno != errno.ECHILD:
+                            raise
+                        break
+                    if dead_pid:
+                        dead, return_code = True, status
+            finally:
+                os.close(fd)
 
             return return_code
 
-    def _exec_cmd(self, args):
+    def _exec_cmd(self, args, stdin = None):
 
         fd, tmp_path = const_mkstemp(prefix="entropy.transceivers.ssh_plug")
         fd_err, tmp_path_err = const_mkstemp(
@@ -171,7 +289,7 @@ class EntropySshUriHandler(EntropyUriHandler):
             with os.fdopen(fd, "wb") as std_f:
                 with os.fdopen(fd_err, "wb") as std_f_err:
                     proc = self._subprocess.Popen(args, stdout = std_f,
-                        stderr = std_f_err)
+                        stderr = std_f_err, stdin = stdin)
                     exec_rc = proc.wait()
             enc = etpConst['conf_encoding']
             with codecs.open(tmp_path, "r", encoding=enc) as std_f:
@@ -185,7 +303,7 @@ class EntropySshUriHandler(EntropyUriHandler):
         return exec_rc, output, error
 
     def _setup_common_args(self, remote_path):
-        args = []
+        args = self._setup_control_args()
         if const_isnumber(self._timeout):
             args += ["-o", "ConnectTimeout=%s" % (self._timeout,),
                 "-o", "ServerAliveCountMax=4", # hardcoded
@@ -193,10 +311,7 @@ class EntropySshUriHandler(EntropyUriHandler):
         if self._speed_limit:
             args += ["-l", str(self._speed_limit*8)] # scp wants kbits/sec
         remote_ptr = os.path.join(self.__dir, remote_path)
-        remote_str = ""
-        if self.__user:
-            remote_str += self.__user + "@"
-        remote_str += self.__host + ":" + remote_ptr
+        remote_str = self._remote_str() + ":" + remote_ptr
 
         return args, remote_str
 
@@ -258,20 +373,72 @@ class EntropySshUriHandler(EntropyUriHandler):
 
     def upload(self, load_path, remote_path):
 
-        args = [EntropySshUriHandler._TXC_CMD]
         tmp_remote_path = remote_path + EntropyUriHandler.TMP_TXC_FILE_EXT
-        c_args, remote_str = self._setup_common_args(tmp_remote_path)
-        args.extend(c_args)
-        args += ["-B", "-P", str(self.__port), load_path, remote_str]
+        offset = self._get_upload_resume_offset(load_path,
+            self.__get_size(tmp_remote_path),
+            remote_md5 = lambda x: self.__get_md5_head(tmp_remote_path, x))
+
+        if offset:
+            # resume an interrupted upload, sending the missing bytes only
+            upload_sts = self.__append(load_path, tmp_remote_path, offset)
+        else:
+            args = [EntropySshUriHandler._TXC_CMD]
+            c_args, remote_str = self._setup_common_args(tmp_remote_path)
+            args.extend(c_args)
+            args += ["-B", "-P", str(self.__port), load_path, remote_str]
+            upload_sts = self._fork_cmd(args) == os.EX_OK
 
-        upload_sts = self._fork_cmd(args) == os.EX_OK
         if not upload_sts:
-            self.delete(tmp_remote_path)
+            # keep the partial file, the next upload() resumes from it
             return False
 
         # atomic rename
         return self.rename(tmp_remote_path, remote_path)
 
+    def __get_size(self, remote_path):
+        """
+        Return the size of the remote file, or None if it does not exist.
+        """
+        args, remote_str = self._setup_fs_args()
+        remote_ptr = os.path.join(self.__dir, remote_path)
+        args += [remote_str, "test", "-f", remote_ptr, "&&",
+            "wc", "-c", "<", remote_ptr]
+        exec_rc, output, error = self._exec_cmd(args)
+        if exec_rc:
+            return None
+        try:
+            return int(output.strip())
+        except ValueError:
+            return None
+
+    def __get_md5_head(self, remote_path, length):
+        """
+        Return the md5 hexdigest of the first length bytes of the remote
+        file, or None.
+        """
+        args, remote_str = self._setup_fs_args()
+        remote_ptr = os.path.join(self.__dir, remote_path)
+        args += [remote_str, "head", "-c", str(length), remote_ptr,
+            "|", "md5sum"]
+        exec_rc, output, error = self._exec_cmd(args)
+        if exec_rc or not output.strip():
+            return None
+        return output.strip().split()[0]
+
+    def __append(self, load_path, remote_path, offset):
+        """
+        Truncate the remote file at offset and append the content of
+        load_path starting from offset to it.
+        """
+        args, remote_str = self._setup_fs_args()
+        remote_ptr = os.path.join(self.__dir, remote_path)
+        args += [remote_str, "truncate", "-s", str(offset), remote_ptr,
+            "&&", "cat", ">>", remote_ptr]
+        with open(load_path, "rb") as load_f:
+            load_f.seek(offset)
+            exec_rc, output, error = self._exec_cmd(args, stdin = load_f)
+        return exec_rc == os.EX_OK
+
     valid_lock_path = re.compile("^([A-Za-z0-9/\.:\-_~]+)$")
     def lock(self, remote_path):
 
@@ -361,11 +528,8 @@ class EntropySshUriHandler(EntropyUriHandler):
 
     def _setup_fs_args(self):
         args = [EntropySshUriHandler._SSH_CMD, "-p", str(self.__port)]
-        remote_str = ""
-        if self.__user:
-            remote_str += self.__user + "@"
-        remote_str += self.__host
-        return args, remote_str
+        args += self._setup_control_args()
+        return args, self._remote_str()
 
     def rename(self, remote_path_old, remote_path_new):
         args, remote_str = self._setup_fs_args()
@@ -414,6 +578,56 @@ class EntropySshUriHandler(EntropyUriHandler):
             return None
         return output.strip().split()[0]
 
+    def get_md5_many(self, remote_paths):
+        md5s = dict((x, None) for x in remote_paths)
+        remote_paths = list(md5s.keys())
+        # keep the remote command line within sane limits
+        chunk_size = self._MANY_CHUNK_SIZE
+        for idx in range(0, len(remote_paths), chunk_size):
+            # paths are printed as passed, run from self.__dir
+            # so that they are not mangled by shell expansion
+            args, remote_str = self._setup_fs_args()
+            args += [remote_str, "cd", self.__dir, "&&", "md5sum"]
+            args += [self._shell_quote(x) for x in
+                     sorted(remote_paths[idx:idx + chunk_size])]
+            # md5sum fails if any file is missing, parse output anyway
+            exec_rc, output, error = self._exec_cmd(args)
+            for remote_path, md5 in self._parse_md5sum(
+                    output.split("\n")).items():
+                if remote_path in md5s:
+                    md5s[remote_path] = md5
+        return md5s
+
+    @staticmethod
+    def _shell_quote(string):
+        """
+        Quote string so that it is passed verbatim to the remote shell.
+        """
+        return "'" + string.replace("'", "'\\''") + "'"
+
+    def _parse_md5sum(self, lines):
+        """
+        Parse the given "md5sum" output lines, see get_md5_many().
+        Return a dict composed by path as key and MD5 checksum as value.
+        """
+        md5s = {}
+        for line in lines:
+            # file names containing backslashes or newlines are escaped
+            # and the line is prefixed with a backslash.
+            escaped = line.startswith("\\")
+            if escaped:
+                line = line[1:]
+            # <md5><space><space or *><path>
+            md5, sep, path = line.partition(" ")
+            if not sep or len(path) < 2:
+                continue
+            path = path[1:]
+            if escaped:
+                path = re.sub(r"\\(.)", lambda m: {"n": "\n",
+                    "\\": "\\"}.get(m.group(1), m.group(0)), path)
+            md5s[path] = md5
+        return md5s
+
     def list_content(self, remote_path):
         args, remote_str = self._setup_fs_args()
         remote_ptr = os.path.join(self.__dir, remote_path)
@@ -426,21 +640,64 @@ class EntropySshUriHandler(EntropyUriHandler):
     def list_content_metadata(self, remote_path):
         args, remote_str = self._setup_fs_args()
         remote_ptr = os.path.join(self.__dir, remote_path)
-        args += [remote_str, "ls", "-1lA", remote_ptr]
+        args += [remote_str, "LC_ALL=C", "ls", "-1lA", remote_ptr]
         exec_rc, output, error = self._exec_cmd(args)
         if exec_rc:
             return []
+        return self._parse_content_metadata(output.split("\n"))
 
+    def _parse_content_metadata(self, lines):
+        """
+        Parse the given "ls -1lA" output lines, see list_content_metadata().
+        ls must run in the C locale, so that dates take three fields.
+        """
         data = []
-        for item in output.split("\n"):
-            item = item.strip().split()
-            if len(item) < 5:
+        for item in lines:
+            # file names can contain spaces
+            item = item.split(None, 8)
+            if len(item) < 9:
                 continue
             perms, owner, group, size, name = item[0], item[2], item[3], \
-                item[4], item[-1]
+                item[4], item[8]
+            if perms.startswith("l"):
+                # symlink, drop "-> target"
+                name = name.split(" -> ", 1)[0]
             data.append((name, size, owner, group, perms,))
         return data
 
+    def list_content_metadata_many(self, remote_paths):
+        contents = dict((x, []) for x in remote_paths)
+        if len(contents) < 2:
+            # no directory headers are printed for a single path
+            for remote_path in contents:
+                contents[remote_path] = self.list_content_metadata(
+                    remote_path)
+            return contents
+
+        # paths are printed as passed, see get_md5_many()
+        args, remote_str = self._setup_fs_args()
+        args += [remote_str, "cd", self.__dir, "&&", "LC_ALL=C", "ls",
+                 "-1lA"]
+        args += [self._shell_quote(x) for x in sorted(contents.keys())]
+        # ls fails if any directory is missing, parse output anyway
+        exec_rc, output, error = self._exec_cmd(args)
+
+        # output is in the form: "<path>:\n<ls -1lA output>\n\n..."
+        remote_path = None
+        lines = []
+        for line in output.split("\n") + [""]:
+            if remote_path is None:
+                if line[:-1] in contents:
+                    remote_path = line[:-1]
+                continue
+            if line:
+                lines.append(line)
+                continue
+            contents[remote_path] = self._parse_content_metadata(lines)
+            remote_path = None
+            lines = []
+        return contents
+
     def is_dir(self, remote_path):
         args, remote_str = self._setup_fs_args()
         remote_ptr = os.path.join(self.__dir, remote_path)
@@ -473,4 +730,4 @@ class EntropySshUriHandler(EntropyUriHandler):
         return
 
     def close(self):
-        return
+        self.__stop_master()
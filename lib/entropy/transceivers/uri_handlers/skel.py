@@ -9,6 +9,9 @@
     B{Entropy Transceivers class prototypes module}.
 
 """
+import os
+import hashlib
+
 from entropy.const import const_isnumber
 from entropy.output import TextInterface
 
@@ -27,6 +30,10 @@ class EntropyUriHandler(TextInterface):
 
     TMP_TXC_FILE_EXT = ".tmp-entropy-txc"
 
+    # interrupted uploads are resumed at chunk boundaries, the trailing
+    # partial chunk of the remote temporary file is sent again
+    UPLOAD_RESUME_CHUNK_SIZE = 4 * 1024 * 1024
+
     def __init__(self, uri):
         """
         EntropyUriHandler constructor.
@@ -205,6 +212,58 @@ class EntropyUriHandler(TextInterface):
         """
         raise NotImplementedError()
 
+    def _get_upload_resume_offset(self, load_path, remote_size,
+        remote_md5 = None, chunked = True):
+        """
+        Return the offset an interrupted upload of load_path can be resumed
+        from, given the size of the partially uploaded (temporary) remote
+        file. The offset is a multiple of UPLOAD_RESUME_CHUNK_SIZE, unless
+        chunked is False.
+
+        @param load_path: path to the local file being uploaded
+        @type load_path: string
+        @param remote_size: size of the partial remote file, or None if
+            it does not exist
+        @type remote_size: int
+        @keyword remote_md5: callable taking a length and returning the
+            md5 hexdigest of the first length bytes of the partial remote
+            file (or None), used to verify that it actually is a prefix of
+            load_path. Without it, the upload is never resumed.
+        @type remote_md5: callable
+        @keyword chunked: if False, resume from the end of the partial
+            remote file, for handlers that can only checksum it as a whole
+        @type chunked: bool
+        @return: resume offset, 0 if the upload has to start from scratch
+        @rtype: int
+        """
+        if not remote_size or remote_md5 is None:
+            return 0
+        chunk_size = EntropyUriHandler.UPLOAD_RESUME_CHUNK_SIZE
+        local_size = os.path.getsize(load_path)
+        if chunked:
+            offset = min(remote_size, local_size)
+            offset -= offset % chunk_size
+        elif remote_size <= local_size:
+            offset = remote_size
+        else:
+            offset = 0
+        if offset <= 0:
+            return 0
+
+        # hash the local file prefix chunk by chunk
+        local_md5 = hashlib.md5()
+        with open(load_path, "rb") as load_f:
+            missing = offset
+            while missing > 0:
+                data = load_f.read(min(chunk_size, missing))
+                if not data:
+                    return 0
+                local_md5.update(data)
+                missing -= len(data)
+        if remote_md5(offset) != local_md5.hexdigest():
+            return 0
+        return offset
+
     def lock(self, remote_path):
         """
         Create remote "lock" file atomically.
@@ -301,6 +360,21 @@ class EntropyUriHandler(TextInterface):
         """
         raise NotImplementedError()
 
+    def get_md5_many(self, remote_paths):
+        """
+        Return MD5 checksums of many files at once, taken from remote_paths.
+        Subclasses should override this, the default implementation just
+        calls get_md5() for every path.
+
+        @param remote_paths: list of remote paths to handle
+        @type remote_paths: list
+        @return: dict composed by remote path as key and MD5 checksum in
+            hexdigest form (or None, if not supported or not available)
+            as value
+        @rtype: dict
+        """
+        return dict((x, self.get_md5(x)) for x in remote_paths)
+
     def list_content(self, remote_path):
         """
         List content of directory referenced at URI.
@@ -327,6 +401,21 @@ class EntropyUriHandler(TextInterface):
         """
         raise NotImplementedError()
 
+    def list_content_metadata_many(self, remote_paths):
+        """
+        List content of many directories at once, taken from remote_paths,
+        see list_content_metadata().
+        Subclasses should override this, the default implementation just
+        calls list_content_metadata() for every path.
+
+        @param remote_paths: list of remote paths to handle
+        @type remote_paths: list
+        @return: dict composed by remote path as key and content as value
+        @rtype: dict
+        @raise ValueError: if any of remote_paths does not exist
+        """
+        return dict((x, self.list_content_metadata(x)) for x in remote_paths)
+
     def is_path_available(self, remote_path):
         """
         Given a remote path (which can point to dir or file), determine whether
@@ -154,6 +154,123 @@ class EntropyClientTest(unittest.TestCase):
         self.Client.clear_cache()
         self.assertEqual(os.listdir(current_dir), [])
 
+    def test_dependency_memo(self):
+        pkg_match = (1, "foo")
+        memo = self.Client._get_dependency_memo()
+        memo[pkg_match] = "data"
+        # nothing changed
+        memo = self.Client._get_dependency_memo()
+        self.assertEqual(memo.get(pkg_match), "data")
+
+        # live masking changes invalidate the map
+        lpm = self._settings['live_packagemasking']
+        lpm['mask_matches'].add(pkg_match)
+        try:
+            memo = self.Client._get_dependency_memo()
+            self.assertEqual(memo, {})
+        finally:
+            lpm['mask_matches'].discard(pkg_match)
+
+        memo = self.Client._get_dependency_memo()
+        memo[pkg_match] = "data"
+        self.Client.clear_cache()
+        self.assertEqual(self.Client._get_dependency_memo(), {})
+
+        # without an installed packages repository checksum, nothing
+        # is memoized
+        inst_repo = self.Client.installed_repository()
+        inst_repo.checksum = lambda *args, **kwargs: None
+        try:
+            memo = self.Client._get_dependency_memo()
+            memo[pkg_match] = "data"
+            self.assertEqual(self.Client._get_dependency_memo(), {})
+        finally:
+            del inst_repo.checksum
+
+    def test_dependency_memo_install_queue(self):
+        from entropy.exceptions import DependenciesNotFound
+        if etpConst['currentarch'] != "amd64":
+            # test packages are amd64 only
+            return
+
+        matches = []
+        for test_pkg in (_misc.get_test_entropy_package(),
+                         _misc.get_test_entropy_package2(),
+                         _misc.get_test_entropy_package3(),
+                         _misc.get_test_entropy_package5(),
+                         _misc.get_test_entropy_package6()):
+            matches += self.Client.add_package_repository(test_pkg)
+
+        def _install_queue(package_matches):
+            try:
+                return self.Client.get_install_queue(package_matches,
+                    False, False, quiet = True)
+            except DependenciesNotFound as err:
+                return err.value
+
+        # the memoized dependency analysis must not change the outcome
+        for package_matches in (matches[:1], matches):
+            self.Client._clear_dependency_memo()
+            cold = _install_queue(package_matches)
+            self.assertNotEqual(self.Client._get_dependency_memo(), {})
+            warm = _install_queue(package_matches)
+            self.assertEqual(cold, warm)
+
+    def test_parallel_repository_update(self):
+        from entropy.client.interfaces.repository import Repository, \
+            _ParallelUpdateClient
+        from entropy.db.skel import EntropyRepositoryBase
+        from entropy.misc import FlockFile
+
+        repo_ids = ["parallel_repo1", "parallel_repo2"]
+        clients = {}
+        global_locked = {}
+        outputs = []
+        lock_path = etpConst['locks']['using_resources']
+
+        def _try_lock():
+            flock_f = FlockFile(lock_path)
+            try:
+                acquired = flock_f.try_acquire_exclusive()
+                if acquired:
+                    flock_f.release()
+                return acquired
+            finally:
+                flock_f.close()
+
+        class FakeRepository(object):
+
+            @staticmethod
+            def update(entropy_client, repository_id, force, gpg):
+                clients[repository_id] = entropy_client
+                global_locked[repository_id] = not _try_lock()
+                entropy_client.output(repository_id)
+                return EntropyRepositoryBase.REPOSITORY_UPDATED_OK
+
+        repo_intf = Repository(self.Client, repo_ids, parallel = True)
+        repo_intf.repo_ids = repo_ids
+        self.Client.get_repository = lambda x: FakeRepository
+        self.Client.output = lambda text, **kwargs: outputs.append(text)
+        self.assertTrue(self.Client.lock_resources())
+        try:
+            statuses = repo_intf._parallel_update_repositories()
+            # the global lock is acquired again afterwards
+            self.assertFalse(_try_lock())
+        finally:
+            self.Client.unlock_resources()
+            del self.Client.get_repository
+            del self.Client.output
+
+        self.assertEqual(statuses, dict((x,
+            EntropyRepositoryBase.REPOSITORY_UPDATED_OK) for x in repo_ids))
+        for repo in repo_ids:
+            self.assertTrue(isinstance(clients[repo], _ParallelUpdateClient))
+            # the global lock is released while updating
+            self.assertFalse(global_locked[repo])
+        self.assertFalse(clients[repo_ids[0]] is clients[repo_ids[1]])
+        # buffered output is flushed through the real client
+        self.assertEqual(sorted(outputs), repo_ids)
+
     def test_contentsafety(self):
         dbconn = self.Client._init_generic_temp_repository(
             self.mem_repoid, self.mem_repo_desc, temp_file = ":memory:")
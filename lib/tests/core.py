@@ -4,11 +4,17 @@ sys.path.insert(0, 'client')
 sys.path.insert(0, '../../client')
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
+import os
+import shutil
+import tempfile
 import unittest
+from entropy.const import etpConst
 from entropy.core import EntropyPluginStore, Singleton
 from entropy.core.settings.base import SystemSettings
 import tests._misc as _misc
 
+import entropy.dump
+
 class CoreTest(unittest.TestCase):
 
     def setUp(self):
@@ -45,6 +51,68 @@ class CoreTest(unittest.TestCase):
         self.assertTrue(isinstance(files, set))
         self.assertTrue(files) # not empty
 
+    def test_settings_snapshot(self):
+
+        def _new_settings():
+            # build a new singleton, with an empty in-RAM cache
+            SystemSettings.__singleton__ = None
+            return SystemSettings()
+
+        # work on a copy of the configuration files and on an empty
+        # dump directory, the real ones are not touched.
+        sys_set = SystemSettings()
+        tmp_dir = tempfile.mkdtemp(prefix = "entropy.tests")
+        orig_conf_dir = etpConst['confdir']
+        orig_dump_dir = etpConst['dumpstoragedir']
+        conf_dir = os.path.join(tmp_dir, "conf")
+        dump_dir = os.path.join(tmp_dir, "dump")
+        shutil.copytree(orig_conf_dir, conf_dir, symlinks = True)
+        os.mkdir(dump_dir)
+        etpConst['confdir'] = conf_dir
+        etpConst['dumpstoragedir'] = dump_dir
+        try:
+            # a new instance parses everything and writes the snapshot
+            new_sys_set = _new_settings()
+            keywords = new_sys_set['keywords'].copy()
+            system_dirs = list(new_sys_set['system_dirs'])
+            system_dirs_conf = new_sys_set.get_setting_files_data(
+                )['system_dirs']
+            self.assertEqual(os.path.dirname(system_dirs_conf), conf_dir)
+            st = os.stat(system_dirs_conf)
+            cache_key = (etpConst['systemroot'], system_dirs_conf)
+
+            orig_snapshot = entropy.dump.loadobj(
+                SystemSettings._SNAPSHOT_ID, dump_dir = dump_dir)
+            self.assertTrue(isinstance(orig_snapshot, dict))
+            self.assertTrue(cache_key in orig_snapshot)
+
+            # tamper the snapshot, to make sure that data comes from there
+            fake_dir = "/snapshot/test/dir"
+            snapshot = orig_snapshot.copy()
+            snapshot[cache_key] = {
+                'signature': orig_snapshot[cache_key]['signature'],
+                'data': list(orig_snapshot[cache_key]['data']) + [fake_dir],
+            }
+            entropy.dump.dumpobj(SystemSettings._SNAPSHOT_ID, snapshot,
+                dump_dir = dump_dir)
+
+            new_sys_set = _new_settings()
+            self.assertEqual(new_sys_set['keywords'], keywords)
+            self.assertEqual(list(new_sys_set['system_dirs']),
+                system_dirs + [fake_dir])
+
+            # a changed mtime must cause the file to be parsed again
+            os.utime(system_dirs_conf, (st.st_atime, st.st_mtime + 10))
+            new_sys_set = _new_settings()
+            self.assertEqual(list(new_sys_set['system_dirs']), system_dirs)
+
+        finally:
+            etpConst['confdir'] = orig_conf_dir
+            etpConst['dumpstoragedir'] = orig_dump_dir
+            shutil.rmtree(tmp_dir, True)
+            SystemSettings.__singleton__ = sys_set
+            sys_set.clear()
+
     def test_core_singleton(self):
         class myself(Singleton):
             def init_singleton(self):
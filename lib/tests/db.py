@@ -865,6 +865,76 @@ class EntropyRepositoryTest(unittest.TestCase):
         os.remove(buf_file)
         os.remove(new_db_path)
 
+    def test_db_delta(self):
+
+        set_mute(True)
+        fd, old_db_path = tempfile.mkstemp()
+        os.close(fd)
+        fd, new_db_path = tempfile.mkstemp()
+        os.close(fd)
+        fd, delta_path = tempfile.mkstemp()
+        os.close(fd)
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+
+        old_db = self.__open_test_db(old_db_path)
+        idpackage = old_db.addPackage(data)
+        old_db.commit()
+
+        new_db = self.__open_test_db(new_db_path)
+        new_db.addPackage(data, package_id = idpackage)
+        idpackage2 = new_db.addPackage(data2)
+        # in-place change, child rows must survive
+        new_db.setSlot(idpackage, "99")
+        new_db.commit()
+
+        with open(delta_path, "wb") as delta_f:
+            self.assertTrue(new_db.exportRepositoryDelta(old_db_path, delta_f))
+
+        self.assertNotEqual(old_db.dataChecksum(), new_db.dataChecksum())
+        with open(delta_path, "rb") as delta_f:
+            old_db.importRepositoryDelta(delta_f)
+        self.assertEqual(old_db.dataChecksum(), new_db.dataChecksum())
+        self.assertEqual(old_db.retrieveSlot(idpackage), "99")
+        self.assertEqual(old_db.getPackageData(idpackage2),
+            new_db.getPackageData(idpackage2))
+
+        # temporary repositories remove their files on close()
+        old_db.close()
+        new_db.close()
+        set_mute(False)
+        os.remove(delta_path)
+
+    def test_db_bulk_add(self):
+
+        test_pkg = _misc.get_test_package()
+        data = self.Spm.extract_package_metadata(test_pkg)
+        test_pkg2 = _misc.get_test_package2()
+        data2 = self.Spm.extract_package_metadata(test_pkg2)
+
+        idpackage = self.test_db2.addPackage(data.copy())
+        idpackage2 = self.test_db2.addPackage(data2.copy())
+
+        self.test_db.setIndexing(True)
+        self.test_db.createAllIndexes()
+        package_ids = self.test_db.addPackagesBulk(
+            [(None, data.copy()), (idpackage2, data2.copy())])
+        self.assertEqual(package_ids, [idpackage, idpackage2])
+        self.assertEqual(self.test_db.dataChecksum(),
+            self.test_db2.dataChecksum())
+        self.assertEqual(self.test_db.getPackageData(idpackage2),
+            self.test_db2.getPackageData(idpackage2))
+
+        # indexes must be back in place
+        cur = self.test_db._cursor().execute("""
+        SELECT name FROM SQLITE_MASTER WHERE type = "index"
+        AND name = "dependenciesindex_idpk_iddp_type"
+        """)
+        self.assertTrue(cur.fetchall())
+
     def test_use_defaults(self):
         test_pkg = _misc.get_test_package()
         data = self.Spm.extract_package_metadata(test_pkg)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import sys
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import unittest
+from entropy.graph import Graph, IndexedGraph
+
+class GraphTest(unittest.TestCase):
+
+    def setUp(self):
+        sys.stdout.write("%s called\n" % (self,))
+        sys.stdout.flush()
+
+    def tearDown(self):
+        """
+        tearDown is run after each test
+        """
+        sys.stdout.write("%s ran\n" % (self,))
+        sys.stdout.flush()
+
+    def _levels(self, sorted_map):
+        levels = {}
+        for level, items in sorted_map.items():
+            for item in items:
+                levels[item] = level
+        return levels
+
+    def _check_order(self, adj_map, sorted_map):
+        # every item must be at a lower level than its dependencies,
+        # unless they are part of the same cycle
+        levels = self._levels(sorted_map)
+        self.assertEqual(set(levels.keys()), set(adj_map.keys()))
+        self.assertEqual(sorted(sorted_map.keys()),
+            list(range(1, len(sorted_map) + 1)))
+        for item, deps in adj_map.items():
+            for dep in deps:
+                self.assertTrue(levels[item] <= levels[dep])
+
+    def test_indexed_graph_solve(self):
+        graph = IndexedGraph()
+        graph.add("app", set(["lib", "tool"]))
+        graph.add("tool", set(["lib"]))
+        graph.add("lib", set(["libc"]))
+        graph.add("cycle_a", set(["cycle_b", "libc"]))
+        graph.add("cycle_b", set(["cycle_a"]))
+        graph.add("self", set(["self"]))
+
+        adj_map = graph.get_adjacency_map()
+        self.assertEqual(adj_map["app"], set(["lib", "tool"]))
+        self.assertEqual(adj_map["libc"], set())
+        self.assertEqual(len(graph), 7)
+        self.assertTrue("libc" in graph)
+        self.assertEqual(sorted(graph.raw()), sorted(adj_map.keys()))
+
+        sorted_map = graph.solve()
+        self._check_order(adj_map, sorted_map)
+        levels = self._levels(sorted_map)
+        self.assertEqual(levels["cycle_a"], levels["cycle_b"])
+        self.assertTrue(levels["app"] < levels["tool"] < levels["lib"])
+        self.assertEqual(levels["libc"], max(sorted_map.keys()))
+        graph.destroy()
+        self.assertEqual(len(graph), 0)
+
+    def test_graph_compat(self):
+        # Graph and IndexedGraph must group items the same way
+        deps = {}
+        for x in range(200):
+            deps[x] = set([(x * 7) % 200, (x + 1) % 200]) if x % 5 \
+                else set([(x * 3) % 200])
+
+        graph = Graph()
+        indexed_graph = IndexedGraph()
+        for item, item_deps in deps.items():
+            graph.add(item, item_deps)
+            indexed_graph.add(item, item_deps)
+
+        sorted_map = graph.solve()
+        indexed_sorted_map = indexed_graph.solve()
+        self._check_order(deps, sorted_map)
+        self._check_order(deps, indexed_sorted_map)
+        self.assertEqual(
+            sorted(sorted(x) for x in sorted_map.values()),
+            sorted(sorted(x) for x in indexed_sorted_map.values()))
+        graph.destroy()
+        indexed_graph.destroy()
+
+    def test_indexed_graph_deep(self):
+        # deeper than the Python recursion limit
+        depth = sys.getrecursionlimit() * 5
+        graph = IndexedGraph()
+        for x in range(depth):
+            graph.add(x, set([x + 1]))
+        # close a giant cycle on the second half
+        graph.add(depth, set([depth // 2]))
+
+        sorted_map = graph.solve()
+        self.assertEqual(len(sorted_map), depth // 2 + 1)
+        self.assertEqual(sorted_map[1], (0,))
+        self.assertEqual(len(sorted_map[len(sorted_map)]), depth // 2 + 1)
+        graph.destroy()
+
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
@@ -5,6 +5,7 @@ sys.path.insert(0, '../')
 import unittest
 import os
 import shutil
+import tempfile
 from entropy.server.interfaces import Server
 from entropy.const import etpConst, initconfig_entropy_constants, etpSys
 from entropy.core.settings.base import SystemSettings
@@ -145,6 +146,209 @@ class EntropyRepositoryTest(unittest.TestCase):
             self.Server.repository())
         self.assertNotEqual(None, dbconn.retrieveAtom(1))
 
+    def test_parallel_map(self):
+        import entropy.server.interfaces.main as server_main
+
+        def _function(item):
+            if item == 3:
+                raise ValueError("item %s" % (item,))
+            return item * 2
+
+        orig_get_cpus = server_main.const_get_cpus
+        try:
+            for cpus in (1, 2):
+                server_main.const_get_cpus = lambda: cpus
+                # results are in order, failures yield None on both paths
+                self.assertEqual(
+                    list(self.Server._parallel_map(_function, range(6))),
+                    [0, 2, 4, None, 8, 10])
+                self.assertEqual(
+                    list(self.Server._parallel_map(_function, iter([3]))),
+                    [None])
+                self.assertEqual(
+                    list(self.Server._parallel_map(_function, [])), [])
+        finally:
+            server_main.const_get_cpus = orig_get_cpus
+
+    def test_extract_packages_metadata(self):
+        import entropy.server.interfaces.main as server_main
+        test_pkgs = [_misc.get_test_entropy_package(),
+            _misc.get_test_entropy_package5()]
+        repository_id = self.Server.repository()
+
+        orig_get_cpus = server_main.const_get_cpus
+        server_main.const_get_cpus = lambda: 2
+        try:
+            metadata = list(self.Server._extract_packages_metadata(
+                repository_id, test_pkgs))
+        finally:
+            server_main.const_get_cpus = orig_get_cpus
+
+        self.assertEqual(len(metadata), len(test_pkgs))
+        for test_pkg, data in zip(test_pkgs, metadata):
+            self.assertTrue(data is not None)
+            serial_data = self.Server._extract_package_metadata(
+                repository_id, test_pkg)
+            for key in ("name", "version", "slot", "digest",
+                        "signatures", "datecreation", "size"):
+                self.assertEqual(data[key], serial_data[key])
+
+    def test_package_injection_signatures(self):
+        import entropy.server.interfaces.main as server_main
+        repository_id = self.Server.repository()
+        tmp_test_pkgs = []
+        for test_pkg in (_misc.get_test_entropy_package(),
+                         _misc.get_test_entropy_package5()):
+            tmp_test_pkg = test_pkg+".tmp"
+            shutil.copy2(test_pkg, tmp_test_pkg)
+            tmp_test_pkgs.append(([tmp_test_pkg], True,))
+
+        # inject through the worker processes
+        orig_get_cpus = server_main.const_get_cpus
+        server_main.const_get_cpus = lambda: 2
+        try:
+            added = self.Server.add_packages_to_repository(
+                repository_id, tmp_test_pkgs, ask = False)
+        finally:
+            server_main.const_get_cpus = orig_get_cpus
+        self.assertEqual(set([1, 2]), added)
+
+        # the checksums computed by the injection workers must match
+        # the final package files
+        dbconn = self.Server.open_server_repository(repository_id)
+        for package_id in added:
+            package_path = self.Server.complete_local_upload_package_path(
+                dbconn.retrieveDownloadURL(package_id), repository_id)
+            self.assertTrue(os.path.isfile(package_path))
+            self.assertEqual(dbconn.retrieveDigest(package_id),
+                entropy.tools.md5sum(package_path))
+            sha1, sha256, sha512, gpg = dbconn.retrieveSignatures(
+                package_id)
+            self.assertEqual(sha1, entropy.tools.sha1(package_path))
+            self.assertEqual(sha256, entropy.tools.sha256(package_path))
+            self.assertEqual(sha512, entropy.tools.sha512(package_path))
+            # the file name must match the final SHA1
+            self.assertTrue(sha1 in os.path.basename(package_path))
+
+    def test_packages_manifest(self):
+        mirrors = self.Server.Mirrors
+        tmp_dir = tempfile.mkdtemp(prefix = "entropy.tests")
+        try:
+            manifest_path = os.path.join(tmp_dir, "manifest")
+            data = {
+                "packages/amd64/5/app-foo:foo-1.0.tbz2": (
+                    1024, "d41d8cd98f00b204e9800998ecf8427e", 1300000000),
+                "packages/amd64/5/app-foo:foo bar-1.0.tbz2": (
+                    2048, None, 1300000001),
+            }
+            mirrors._write_manifest(manifest_path, data)
+            self.assertFalse(os.path.exists(manifest_path + ".tmp"))
+            self.assertEqual(mirrors._read_manifest(manifest_path), data)
+
+            mirrors._write_manifest(manifest_path, {})
+            self.assertEqual(mirrors._read_manifest(manifest_path), {})
+
+            # corrupted header
+            mirrors._write_manifest(manifest_path, data)
+            with open(manifest_path, "r") as man_f:
+                lines = man_f.readlines()
+            with open(manifest_path, "w") as man_f:
+                man_f.write("# entropy packages manifest 0\n")
+                man_f.writelines(lines[1:])
+            self.assertEqual(mirrors._read_manifest(manifest_path), None)
+
+            # corrupted entry
+            with open(manifest_path, "w") as man_f:
+                man_f.writelines(lines[:1])
+                man_f.write("d41d8cd98f00b204e9800998ecf8427e foo\n")
+            self.assertEqual(mirrors._read_manifest(manifest_path), None)
+
+            self.assertEqual(mirrors._read_manifest(
+                os.path.join(tmp_dir, "missing")), None)
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
+    def test_expiration_index(self):
+        mirrors = self.Server.Mirrors
+        index_path = mirrors._get_expiration_index_path(self.default_repo)
+        self.assertEqual(mirrors._read_expiration_index(self.default_repo),
+            {})
+        index = {
+            "packages/amd64/5/app-foo:foo-1.0.tbz2": 1300000000.5,
+            "packages/amd64/5/app-foo:foo bar-1.0.tbz2": 1300000001.0,
+        }
+        mirrors._write_expiration_index(self.default_repo, index)
+        self.assertFalse(os.path.exists(index_path + ".tmp"))
+        self.assertEqual(mirrors._read_expiration_index(self.default_repo),
+            index)
+
+        # corrupted index, .expired files are used instead
+        with open(index_path, "w") as index_f:
+            index_f.write("foo\n")
+        self.assertEqual(mirrors._read_expiration_index(self.default_repo),
+            {})
+        os.remove(index_path)
+
+    def test_collect_expiring_packages(self):
+        mirrors = self.Server.Mirrors
+        repo = self.default_repo
+        branch = self.Server._settings['repositories']['branch']
+        base_dir = self.Server._get_local_repository_base_directory(repo)
+        pkg_dir = self.Server._get_pkg_dir_names()[0]
+        exp_ext = etpConst['packagesexpirationfileext']
+        weak_ext = etpConst['packagesweakfileext']
+        rel_dir = os.path.join(pkg_dir, etpConst['currentarch'], branch)
+        other_rel_dir = os.path.join(pkg_dir, etpConst['currentarch'],
+            branch + "-other")
+
+        def _rel(name):
+            return os.path.join(rel_dir, name)
+
+        def _touch(package_rel, mtime = None):
+            path = os.path.join(base_dir, package_rel)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "w") as f:
+                f.flush()
+            if mtime is not None:
+                os.utime(path, (mtime, mtime))
+
+        try:
+            _touch(_rel("app-foo:foo-1.tbz2"))
+            # expired and indexed
+            _touch(_rel("app-foo:foo-2.tbz2"))
+            _touch(_rel("app-foo:foo-2.tbz2") + exp_ext, mtime = 5000)
+            # expired, not indexed yet
+            _touch(_rel("app-foo:foo-3.tbz2"))
+            _touch(_rel("app-foo:foo-3.tbz2") + exp_ext, mtime = 2000)
+            # weakened
+            _touch(_rel("app-foo:foo-4.tbz2") + weak_ext)
+            # extra download
+            _touch(_rel("app-foo:foo-1.tar.bz2"))
+            # other branches are ignored
+            _touch(os.path.join(other_rel_dir, "app-foo:foo-5.tbz2"))
+            mirrors._write_expiration_index(repo, {
+                _rel("app-foo:foo-2.tbz2"): 1000.0,
+            })
+
+            repo_bins, extra_repo_bins, expired, weak = \
+                mirrors._collect_expiring_packages(repo, branch)
+            self.assertEqual(repo_bins, set([_rel("app-foo:foo-1.tbz2"),
+                _rel("app-foo:foo-2.tbz2"), _rel("app-foo:foo-3.tbz2"),
+                _rel("app-foo:foo-4.tbz2")]))
+            self.assertEqual(extra_repo_bins,
+                set([_rel("app-foo:foo-1.tar.bz2")]))
+            self.assertEqual(expired, {
+                _rel("app-foo:foo-2.tbz2"): 1000.0,
+                _rel("app-foo:foo-3.tbz2"): 2000.0,
+            })
+            self.assertEqual(weak, set([_rel("app-foo:foo-4.tbz2")]))
+        finally:
+            shutil.rmtree(os.path.join(base_dir, pkg_dir), True)
+            index_path = mirrors._get_expiration_index_path(repo)
+            if os.path.isfile(index_path):
+                os.remove(index_path)
+
     def test_constant_backup(self):
         const_key = 'foo_foo_foo'
         const_val = set([1, 2, 3])
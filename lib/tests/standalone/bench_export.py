@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Repository dump benchmark, exports and imports a synthetic repository
+# built out of the metadata of a test package.
+# usage: python bench_export.py [packages]
+import sys
+sys.path.insert(0, '../')
+sys.path.insert(0, '../../')
+import bz2
+import os
+import shutil
+import tempfile
+import time
+
+from entropy.client.interfaces import Client
+from entropy.const import const_convert_to_rawstring
+from entropy.output import set_mute
+import entropy.tools
+import tests._misc as _misc
+
+def _legacy_export(repo, dumpfile):
+    # row by row export, as done before batched inserts
+    toraw = const_convert_to_rawstring
+    cur = repo._cursor().execute("""
+    SELECT name, sql FROM sqlite_master
+    WHERE sql NOT NULL AND type=='table'
+    """)
+    for name, sql in cur.fetchall():
+        if name.startswith("sqlite_"):
+            continue
+        dumpfile.write(toraw("%s;\n" % sql))
+        cols = repo._listTableColumns(name)
+        q = "SELECT 'INSERT INTO \"%(tbl_name)s\" VALUES("
+        q += ", ".join(["'||quote(" + x + ")||'" for x in cols])
+        q += ")' FROM '%(tbl_name)s'"
+        repo._connection().unicode()
+        for row in repo._cursor().execute(q % {'tbl_name': name}):
+            dumpfile.write(toraw("%s;\n" % (row[0],)))
+
+def _template(client):
+    tmp_fd, tmp_path = tempfile.mkstemp()
+    os.close(tmp_fd)
+    entropy.tools.dump_entropy_metadata(
+        _misc.get_test_entropy_package_tag(), tmp_path)
+    repo = client.open_generic_repository(tmp_path)
+    package_id = sorted(repo.listAllPackageIds())[0]
+    data = repo.getPackageData(package_id)
+    repo.close()
+    os.remove(tmp_path)
+    # servers publish repositories without content and changelogs
+    data['changelog'] = None
+    return data
+
+def _timeit(func, *args):
+    t_start = time.time()
+    func(*args)
+    return time.time() - t_start
+
+if __name__ == "__main__":
+
+    packages = 20000
+    if len(sys.argv) > 1:
+        packages = int(sys.argv[1])
+
+    set_mute(True)
+    client = Client(installed_repo = -1, indexing = False, xcache = False,
+        repo_validation = False)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+        data = _template(client)
+        repo_path = os.path.join(tmp_dir, "packages.db")
+        repo = client.open_temp_repository(name = "bench",
+            temp_file = repo_path)
+        t_start = time.time()
+        for count in range(packages):
+            pkg_data = data.copy()
+            pkg_data['name'] = "%s%d" % (data['name'], count)
+            repo.addPackage(pkg_data)
+        repo.commit()
+        print("%d packages generated in %.3fs, %d bytes" % (
+            packages, time.time() - t_start, os.path.getsize(repo_path)))
+
+        for label, func in (("legacy", _legacy_export),
+                            ("batched", repo.exportRepository)):
+            for ext, opener in (("", open), (".bz2", bz2.BZ2File)):
+                dump_path = os.path.join(tmp_dir, "dump." + label + ext)
+                dump_f = opener(dump_path, "wb")
+                try:
+                    if func is _legacy_export:
+                        export_time = _timeit(func, repo, dump_f)
+                    else:
+                        export_time = _timeit(func, dump_f)
+                finally:
+                    dump_f.close()
+                print("export %-8s%-5s %7.3fs %10d bytes" % (
+                    label, ext, export_time, os.path.getsize(dump_path)))
+
+        dump_path = os.path.join(tmp_dir, "dump.batched")
+        new_repo_path = os.path.join(tmp_dir, "imported.db")
+        import_time = _timeit(repo.importRepository, dump_path, new_repo_path)
+        new_repo = client.open_generic_repository(new_repo_path)
+        same = new_repo.dataChecksum() == repo.dataChecksum()
+        new_repo.close()
+        print("import batched       %7.3fs, same data: %s" % (
+            import_time, same))
+        import_time = _timeit(repo.importRepository,
+            dump_path + ".bz2", new_repo_path, {'opener': bz2.BZ2File})
+        print("import batched.bz2   %7.3fs" % (import_time,))
+        repo.close()
+    finally:
+        shutil.rmtree(tmp_dir, True)
+        client.shutdown()
+
+    raise SystemExit(0)
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Graph solver benchmark, compares entropy.graph.Graph and
+# entropy.graph.IndexedGraph on synthetic dependency graphs.
+# usage: python bench_graph.py [nodes [nodes ...]]
+import sys
+sys.path.insert(0, '../../')
+import random
+import time
+from entropy.graph import Graph, IndexedGraph
+
+def _generate_deps(nodes, seed = 1):
+    # package-like graph: few dependencies per node, mostly pointing
+    # to "lower" packages, with a small amount of cycles
+    rnd = random.Random(seed)
+    deps = {}
+    for x in range(nodes):
+        node_deps = set()
+        for _count in range(rnd.randint(0, 8)):
+            if x > 0 and rnd.random() > 0.01:
+                node_deps.add(((x, "repo"), rnd.randint(0, x - 1)))
+            else:
+                node_deps.add(((x, "repo"), rnd.randint(0, nodes - 1)))
+        deps[(x, "repo")] = set(((y, "repo") for _x, y in node_deps))
+    return deps
+
+def _bench(graph_class, deps):
+    t_start = time.time()
+    graph = graph_class()
+    for item, item_deps in deps.items():
+        graph.add(item, item_deps)
+    t_add = time.time()
+    sorted_map = graph.solve()
+    t_solve = time.time()
+    graph.destroy()
+    return t_add - t_start, t_solve - t_add, len(sorted_map)
+
+if __name__ == "__main__":
+
+    sizes = [int(x) for x in sys.argv[1:]] or [5000, 20000]
+    for size in sizes:
+        deps = _generate_deps(size)
+        for graph_class in (Graph, IndexedGraph):
+            add_time, solve_time, levels = _bench(graph_class, deps)
+            print("%6d nodes %-13s add: %7.3fs solve: %7.3fs levels: %d" % (
+                size, graph_class.__name__, add_time, solve_time, levels))
+
+    raise SystemExit(0)
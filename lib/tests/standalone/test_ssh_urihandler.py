@@ -0,0 +1,32 @@
+import sys, os, time, tempfile
+sys.path.insert(0, "../../")
+from entropy.transceivers import EntropyTransceiver
+
+# usage: python test_ssh_urihandler.py ssh://user@host:~/test_dir
+txc = EntropyTransceiver(sys.argv[1])
+txc.set_silent(False)
+txc.set_verbosity(True)
+
+tmp_fd, tmp_path = tempfile.mkstemp()
+os.close(tmp_fd)
+with open(tmp_path, "w") as tmp_f:
+    tmp_f.write("hello"*100)
+
+t_start = time.time()
+with txc as handler:
+    # all the commands below share the same SSH connection
+    print("makedirs", handler.makedirs("entropy_test"))
+    print("is_dir", handler.is_dir("entropy_test"))
+    print("upload", handler.upload(tmp_path, "entropy_test/test.rnd"))
+    print("get_md5", handler.get_md5("entropy_test/test.rnd"))
+    print("listing meta", handler.list_content_metadata("entropy_test"))
+    print("rename", handler.rename("entropy_test/test.rnd",
+        "entropy_test/test.rnd2"))
+    print("download", handler.download("entropy_test/test.rnd2",
+        tmp_path + "_down"))
+    print("delete", handler.delete("entropy_test/test.rnd2"))
+print("elapsed: %.2fs" % (time.time() - t_start,))
+
+os.remove(tmp_path)
+if os.path.isfile(tmp_path + "_down"):
+    os.remove(tmp_path + "_down")
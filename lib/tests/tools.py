@@ -4,12 +4,15 @@ import os
 sys.path.insert(0, '.')
 sys.path.insert(0, '../')
 import unittest
-from entropy.const import const_convert_to_rawstring, const_convert_to_unicode
+from entropy.const import const_convert_to_rawstring, \
+    const_convert_to_unicode, const_xz_open, etpConst
 import entropy.tools as et
 from entropy.client.interfaces import Client
 from entropy.output import print_generic
 import tests._misc as _misc
 import tempfile
+import hashlib
+import sqlite3
 import subprocess
 import shutil
 import stat
@@ -70,6 +73,70 @@ class ToolsTest(unittest.TestCase):
 
         os.remove(tmp_path)
 
+    def test_aggregate_entropy_metadata(self):
+
+        tmp_dir = tempfile.mkdtemp()
+        trailers_found = 0
+        try:
+            # databases written by older SQLite versions do not get
+            # the trailer, a VACUUM refreshes their header.
+            test_items = [(x, y) for x in self.test_pkgs
+                          for y in (False, True)]
+            for test_pkg, refresh_header in test_items:
+                db_path = os.path.join(tmp_dir, "edb")
+                db_path2 = os.path.join(tmp_dir, "edb2")
+                pkg_path = os.path.join(tmp_dir, "pkg")
+                pkg_path2 = os.path.join(tmp_dir, "pkg2")
+
+                self.assertTrue(et.dump_entropy_metadata(test_pkg, db_path))
+                if refresh_header:
+                    conn = sqlite3.connect(db_path)
+                    conn.execute("VACUUM")
+                    conn.close()
+                self.assertTrue(et.remove_entropy_metadata(test_pkg, pkg_path))
+                orig_md5 = et.md5sum(pkg_path)
+
+                pkg_size = os.path.getsize(pkg_path)
+                et.aggregate_entropy_metadata(pkg_path, db_path)
+                self.assertTrue(et.is_entropy_package_file(pkg_path))
+
+                # the trailer points right after the database start tag
+                start_position = pkg_size + len(
+                    etpConst['databasestarttag'])
+                with open(db_path, "rb") as db_f:
+                    db_data = db_f.read()
+                trailer_safe = et._is_edb_trailer_safe(db_data[:100])
+                db_digest = hashlib.md5(db_data).digest()
+                expected = (start_position, os.path.getsize(db_path),
+                    db_digest)
+                with open(pkg_path, "rb") as pkg_f:
+                    pkg_f.seek(-len(etpConst['databasetrailertag']),
+                        os.SEEK_END)
+                    has_tag = pkg_f.read() == const_convert_to_rawstring(
+                        etpConst['databasetrailertag'])
+                    trailer = et._read_edb_trailer(pkg_f)
+                    edb_range = et._locate_edb_range(pkg_f)
+                    edb_offset = pkg_f.tell()
+                if trailer_safe:
+                    trailers_found += 1
+                    self.assertTrue(has_tag)
+                    self.assertEqual(trailer, expected)
+                    self.assertEqual(edb_range, expected)
+                else:
+                    self.assertEqual(trailer, None)
+                    self.assertEqual(edb_range, (start_position, None, None))
+                self.assertEqual(edb_offset, start_position)
+
+                self.assertTrue(et.dump_entropy_metadata(pkg_path, db_path2))
+                self.assertEqual(et.md5sum(db_path), et.md5sum(db_path2))
+
+                self.assertTrue(et.remove_entropy_metadata(pkg_path,
+                    pkg_path2))
+                self.assertEqual(orig_md5, et.md5sum(pkg_path2))
+        finally:
+            shutil.rmtree(tmp_dir, True)
+        self.assertTrue(trailers_found > 0)
+
     def test_tb(self):
         # traceback test
         tb = None
@@ -289,6 +356,45 @@ class ToolsTest(unittest.TestCase):
         os.remove(tmp_path)
         os.remove(new_path)
 
+    def test_unpack_xz(self):
+        if "xz" not in etpConst['etpdatabasesupportedcformats']:
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix = ".xz")
+
+        xz_f = const_xz_open(tmp_path, "wb")
+        xz_f.write(const_convert_to_rawstring("ciao ciao ciao"))
+        xz_f.close()
+
+        new_path = et.unpack_xz(tmp_path)
+        self.assertTrue(os.stat(new_path))
+        orig_md5 = "b40d18c97e6461678f264c4524f6cc7c"
+        self.assertEqual(orig_md5, et.md5sum(new_path))
+
+        os.close(fd)
+        os.remove(tmp_path)
+        os.remove(new_path)
+
+    def test_compress_files_cformats(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            src_path = os.path.join(tmp_dir, "ciao")
+            with open(src_path, "wb") as src_f:
+                src_f.write(const_convert_to_rawstring("ciao ciao ciao"))
+            for cformat in etpConst['etpdatabasesupportedcformats']:
+                tar_path = os.path.join(tmp_dir, "ciao.tar." + cformat)
+                et.compress_files(tar_path, [src_path], compressor = cformat)
+                dest_dir = os.path.join(tmp_dir, cformat)
+                os.mkdir(dest_dir)
+                rc = et.uncompress_tarball(tar_path, extract_path = dest_dir)
+                self.assertEqual(rc, 0)
+                self.assertEqual("b40d18c97e6461678f264c4524f6cc7c",
+                    et.md5sum(os.path.join(dest_dir, "ciao")))
+            self.assertRaises(AttributeError, et.compress_files,
+                os.path.join(tmp_dir, "ciao.tar.foo"), [src_path],
+                compressor = "foo")
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
     def test_remove_entropy_metadata2(self):
         fd, tmp_path = tempfile.mkstemp()
         os.close(fd)
@@ -469,12 +575,79 @@ class ToolsTest(unittest.TestCase):
         metadata = et.read_elf_dynamic_libraries(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_real_dyn_libs(self):
+        elf_obj = _misc.get_dl_so_amd_2()
+        missing = et.read_elf_real_dynamic_libraries(elf_obj)
+        # like ldd, only the libraries that cannot be found are returned
+        for soname in missing:
+            self.assertEqual(et.resolve_dynamic_library(soname, elf_obj),
+                None)
+        for soname in et.read_elf_dynamic_libraries(elf_obj):
+            if et.resolve_dynamic_library(soname, elf_obj) is None:
+                self.assertTrue(soname in missing)
+            else:
+                self.assertFalse(soname in missing)
+
+    def test_elf_cache_cost(self):
+        tmp_dir = tempfile.mkdtemp()
+        orig_max_cost = et._ELF_CACHE_MAX_COST
+        try:
+            elf_objs = []
+            for x in range(4):
+                elf_obj = os.path.join(tmp_dir, "libfoo%d.so" % (x,))
+                shutil.copy2(_misc.get_dl_so_amd_2(), elf_obj)
+                elf_objs.append(elf_obj)
+
+            et.read_elf_dynamic_libraries(elf_objs[0])
+            key = (elf_objs[0], et._read_elf_dynamic)
+            cost = et._ELF_CACHE[key][2]
+            self.assertTrue(cost > 0)
+
+            # room for two entries only, least recently used go first
+            et._ELF_CACHE_MAX_COST = et._ELF_CACHE_COST[0] + cost
+            et.read_elf_dynamic_libraries(elf_objs[1])
+            et.read_elf_dynamic_libraries(elf_objs[0])
+            et.read_elf_dynamic_libraries(elf_objs[2])
+            cached = [x for x in elf_objs if
+                      (x, et._read_elf_dynamic) in et._ELF_CACHE]
+            self.assertEqual(cached, [elf_objs[0], elf_objs[2]])
+            self.assertTrue(et._ELF_CACHE_COST[0] <= et._ELF_CACHE_MAX_COST)
+            self.assertEqual(et._ELF_CACHE_COST[0],
+                sum(x[2] for x in et._ELF_CACHE.values()))
+
+            # entries bigger than the whole cache are not cached
+            et._ELF_CACHE_MAX_COST = cost - 1
+            et.read_elf_dynamic_libraries(elf_objs[3])
+            self.assertFalse((elf_objs[3], et._read_elf_dynamic) in \
+                et._ELF_CACHE)
+        finally:
+            et._ELF_CACHE_MAX_COST = orig_max_cost
+            shutil.rmtree(tmp_dir, True)
+
     def test_read_elf_linker_paths(self):
         elf_obj = _misc.get_dl_so_amd_2()
         known_meta = ['/usr/lib64', '/usr/lib64']
         metadata = et.read_elf_linker_paths(elf_obj)
         self.assertEqual(metadata, known_meta)
 
+    def test_read_elf_not_elf(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            elf_obj = os.path.join(tmp_dir, "libfoo.so")
+            shutil.copy2(_misc.get_dl_so_amd_2(), elf_obj)
+            self.assertTrue(et.is_elf_file(elf_obj))
+            self.assertTrue(et.read_elf_dynamic_libraries(elf_obj))
+
+            # cached metadata must be invalidated
+            with open(elf_obj, "wb") as elf_f:
+                elf_f.write(const_convert_to_rawstring("hello"))
+            self.assertFalse(et.is_elf_file(elf_obj))
+            self.assertEqual(et.read_elf_dynamic_libraries(elf_obj), set())
+            self.assertEqual(et.read_elf_linker_paths(elf_obj), [])
+            self.assertEqual(et.read_elf_broken_symbols(elf_obj), set())
+        finally:
+            shutil.rmtree(tmp_dir, True)
+
     def test_xml_from_dict_extended(self):
         data = {
             "foo": 1,
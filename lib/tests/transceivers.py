@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+import sys
+import os
+sys.path.insert(0, '.')
+sys.path.insert(0, '../')
+import unittest
+import tempfile
+import shutil
+import hashlib
+import threading
+import time
+from entropy.transceivers.uri_handlers.skel import EntropyUriHandler
+from entropy.transceivers.uri_handlers.plugins.interfaces.file_plugin import \
+    EntropyFileUriHandler
+from entropy.transceivers.uri_handlers.plugins.interfaces.ssh_plugin import \
+    EntropySshUriHandler
+from entropy.server.transceivers import TransceiverServerHandler
+
+class TransceiversTest(unittest.TestCase):
+
+    def setUp(self):
+        sys.stdout.write("%s called\n" % (self,))
+        sys.stdout.flush()
+        self._tmp_dir = tempfile.mkdtemp(prefix = "entropy.tests")
+        self._chunk_size = EntropyUriHandler.UPLOAD_RESUME_CHUNK_SIZE
+        EntropyUriHandler.UPLOAD_RESUME_CHUNK_SIZE = 1024
+        self._load_path = os.path.join(self._tmp_dir, "load_file")
+        self._load_data = os.urandom(4096 + 100)
+        with open(self._load_path, "wb") as load_f:
+            load_f.write(self._load_data)
+
+    def tearDown(self):
+        """
+        tearDown is run after each test
+        """
+        EntropyUriHandler.UPLOAD_RESUME_CHUNK_SIZE = self._chunk_size
+        shutil.rmtree(self._tmp_dir, True)
+        sys.stdout.write("%s ran\n" % (self,))
+        sys.stdout.flush()
+
+    def _md5_head(self, data):
+        return lambda x: hashlib.md5(data[:x]).hexdigest()
+
+    def test_upload_resume_offset(self):
+        handler = EntropyUriHandler("file:///")
+        data = self._load_data
+        offset = handler._get_upload_resume_offset
+
+        # nothing to resume from
+        self.assertEqual(offset(self._load_path, None,
+            remote_md5 = self._md5_head(data)), 0)
+        self.assertEqual(offset(self._load_path, 0,
+            remote_md5 = self._md5_head(data)), 0)
+        # without a checksum, the upload is never resumed
+        self.assertEqual(offset(self._load_path, 3000), 0)
+
+        # resume from the last complete chunk
+        self.assertEqual(offset(self._load_path, 3000,
+            remote_md5 = self._md5_head(data)), 2048)
+        self.assertEqual(offset(self._load_path, 1000,
+            remote_md5 = self._md5_head(data)), 0)
+        # a partial file larger than the local one is capped
+        self.assertEqual(offset(self._load_path, 10000,
+            remote_md5 = self._md5_head(data)), 4096)
+
+        # the remote prefix does not match
+        garbage = b"x" * len(data)
+        self.assertEqual(offset(self._load_path, 3000,
+            remote_md5 = self._md5_head(garbage)), 0)
+        self.assertEqual(offset(self._load_path, 3000,
+            remote_md5 = lambda x: None), 0)
+
+        # unchunked, resume from the end of the partial file
+        self.assertEqual(offset(self._load_path, 3000,
+            remote_md5 = self._md5_head(data), chunked = False), 3000)
+        self.assertEqual(offset(self._load_path, 10000,
+            remote_md5 = self._md5_head(data), chunked = False), 0)
+
+    def test_file_upload_resume(self):
+        remote_dir = os.path.join(self._tmp_dir, "remote")
+        os.makedirs(remote_dir)
+        handler = EntropyFileUriHandler("file://" + remote_dir)
+        remote_path = os.path.join(remote_dir, "file")
+        tmp_remote_path = remote_path + EntropyUriHandler.TMP_TXC_FILE_EXT
+
+        offsets = []
+        orig_offset = handler._get_upload_resume_offset
+        def _offset(*args, **kwargs):
+            offsets.append(orig_offset(*args, **kwargs))
+            return offsets[-1]
+        handler._get_upload_resume_offset = _offset
+
+        # valid partial upload, the trailing partial chunk is garbage
+        with open(tmp_remote_path, "wb") as tmp_f:
+            tmp_f.write(self._load_data[:2048] + b"x" * 500)
+        self.assertTrue(handler.upload(self._load_path, "file"))
+        self.assertEqual(offsets, [2048])
+        self.assertFalse(os.path.exists(tmp_remote_path))
+        with open(remote_path, "rb") as remote_f:
+            self.assertEqual(remote_f.read(), self._load_data)
+
+        # corrupted partial upload, start from scratch
+        os.remove(remote_path)
+        with open(tmp_remote_path, "wb") as tmp_f:
+            tmp_f.write(b"x" * 3000)
+        self.assertTrue(handler.upload(self._load_path, "file"))
+        self.assertEqual(offsets, [2048, 0])
+        with open(remote_path, "rb") as remote_f:
+            self.assertEqual(remote_f.read(), self._load_data)
+
+    def _ssh_handler(self, outputs):
+        handler = EntropySshUriHandler("ssh://user@host:/remote/dir")
+        # do not start any ssh connection
+        handler._MULTIPLEXING = False
+        commands = []
+        def _exec_cmd(args, stdin = None):
+            commands.append(args)
+            return outputs.pop(0)
+        handler._exec_cmd = _exec_cmd
+        return handler, commands
+
+    def test_ssh_get_md5_many(self):
+        md5 = hashlib.md5(b"x").hexdigest()
+        output = "\n".join([
+            "%s  a.tbz2" % (md5,),
+            "%s  with spaces.tbz2" % (md5,),
+            "%s *binary.tbz2" % (md5,),
+            "\\%s  back\\\\slash\\nnew line" % (md5,),
+            "",
+        ])
+        handler, commands = self._ssh_handler([
+            (1, output, "md5sum: missing.tbz2: No such file or directory")])
+        paths = ["a.tbz2", "with spaces.tbz2", "binary.tbz2",
+                 "back\\slash\nnew line", "missing.tbz2"]
+        md5s = handler.get_md5_many(paths)
+        self.assertEqual(md5s, {
+            "a.tbz2": md5,
+            "with spaces.tbz2": md5,
+            "binary.tbz2": md5,
+            "back\\slash\nnew line": md5,
+            "missing.tbz2": None,
+        })
+        # a single command, with quoted paths
+        self.assertEqual(len(commands), 1)
+        self.assertTrue("'with spaces.tbz2'" in commands[0])
+
+        self.assertEqual(EntropySshUriHandler._shell_quote("it's"),
+            "'it'\\''s'")
+
+    def test_ssh_parse_content_metadata(self):
+        handler, commands = self._ssh_handler([])
+        lines = [
+            "total 12",
+            "-rw-r--r-- 1 root root 1234 Jan  1 12:00 a.tbz2",
+            "-rw-r--r-- 1 root entropy 42 Jan  1  2011 with  spaces.tbz2",
+            "drwxr-xr-x 2 root root 4096 Jan  1 12:00 dir",
+            "lrwxrwxrwx 1 root root 6 Jan  1 12:00 link -> a.tbz2",
+            "",
+        ]
+        self.assertEqual(handler._parse_content_metadata(lines), [
+            ("a.tbz2", "1234", "root", "root", "-rw-r--r--"),
+            ("with  spaces.tbz2", "42", "root", "entropy", "-rw-r--r--"),
+            ("dir", "4096", "root", "root", "drwxr-xr-x"),
+            ("link", "6", "root", "root", "lrwxrwxrwx"),
+        ])
+
+        # missing directories are not listed, ls fails
+        output = "\n".join([
+            "dir a:",
+            "total 4",
+            "-rw-r--r-- 1 root root 1234 Jan  1 12:00 a file.tbz2",
+            "",
+        ])
+        handler, commands = self._ssh_handler([
+            (2, output, "ls: cannot access 'missing': No such file")])
+        contents = handler.list_content_metadata_many(["dir a", "missing"])
+        self.assertEqual(contents, {
+            "dir a": [("a file.tbz2", "1234", "root", "root", "-rw-r--r--")],
+            "missing": [],
+        })
+        self.assertEqual(len(commands), 1)
+
+        handler, commands = self._ssh_handler([(2, "", "ls: error")])
+        self.assertEqual(handler.list_content_metadata("missing"), [])
+
+    def test_thread_map(self):
+        thread_map = TransceiverServerHandler.thread_map
+        running = []
+        max_running = [0]
+        lock = threading.Lock()
+
+        def _function(item):
+            with lock:
+                running.append(item)
+                max_running[0] = max(max_running[0], len(running))
+            # finish in reverse order
+            time.sleep(0.01 * (10 - item))
+            with lock:
+                running.remove(item)
+            return item * 2
+
+        items = list(range(10))
+        self.assertEqual(thread_map(_function, items),
+            [x * 2 for x in items])
+        self.assertTrue(max_running[0] <= \
+            TransceiverServerHandler.MAX_PARALLEL_WORKERS)
+        self.assertEqual(thread_map(_function, items, max_workers = 1),
+            [x * 2 for x in items])
+        self.assertEqual(thread_map(_function, []), [])
+
+    def test_thread_map_errors(self):
+        thread_map = TransceiverServerHandler.thread_map
+        called = []
+
+        def _function(item):
+            called.append(item)
+            if item in (1, 2):
+                # the second item fails last
+                time.sleep(0.1 / item)
+                raise ValueError(item)
+            time.sleep(0.01)
+            return item
+
+        try:
+            thread_map(_function, list(range(20)), max_workers = 3)
+        except ValueError as err:
+            self.assertEqual(err.args, (1,))
+        else:
+            self.fail("ValueError not raised")
+        # no further items are started after a failure
+        self.assertTrue(len(called) < 20)
+
+        self.assertRaises(ValueError, thread_map, _function, [2])
+
+if __name__ == '__main__':
+    unittest.main()
+    raise SystemExit(0)
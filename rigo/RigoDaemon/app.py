@@ -1250,7 +1250,7 @@ class RigoDaemonService(dbus.service.Object):
                             repositories,), debug=True)
 
                     updater = self._entropy.Repositories(
-                        repositories, force = force)
+                        repositories, force = force, parallel = True)
                     result = updater.unlocked_sync()
                 finally:
                     self._rwsem.reader_release()